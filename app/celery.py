@@ -1,13 +1,34 @@
-# import os
-# from celery import Celery
+import os
+from celery import Celery
+from kombu import Queue
 
-# # Set default Django settings
-# os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
+# Set default Django settings
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "app.settings")
 
-# app = Celery("app")
+app = Celery("app")
 
-# # Load task modules from all registered Django app configs.
-# app.config_from_object("django.conf:settings", namespace="CELERY")
+# Load task modules from all registered Django app configs.
+app.config_from_object("django.conf:settings", namespace="CELERY")
 
-# # Auto-discover tasks in all apps
-# app.autodiscover_tasks()
+# Side effects are split by kind so a slow media backlog cannot delay OTP mail
+app.conf.task_default_queue = "default"
+app.conf.task_queues = (
+    Queue("default"),
+    Queue("balances"),
+    Queue("reminders"),
+    Queue("media"),
+    Queue("email"),
+)
+app.conf.task_routes = {
+    "creditapp.tasks.reconcile_*": {"queue": "balances"},
+    "creditapp.tasks.build_balance_checkpoints": {"queue": "balances"},
+    "creditapp.tasks.settle_*": {"queue": "reminders"},
+    "creditapp.tasks.sweep_*": {"queue": "reminders"},
+    "creditapp.tasks.dispatch_*": {"queue": "reminders"},
+    "creditapp.tasks.delete_media_files": {"queue": "media"},
+    "creditapp.tasks.generate_bill_image_variants": {"queue": "media"},
+    "creditapp.tasks.send_email": {"queue": "email"},
+}
+
+# Auto-discover tasks in all apps
+app.autodiscover_tasks()
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
+from celery.schedules import crontab
 from datetime import timedelta
 import os
 from dotenv import load_dotenv
@@ -52,11 +53,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'creditapp.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'creditapp.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 
@@ -93,8 +96,33 @@ WSGI_APPLICATION = 'app.wsgi.application'
 # By default
 DJANGO_ENV = os.environ.get('DJANGO_ENV', '')
 
+# Connection handling, shared by the PostgreSQL and MySQL setups below.
+# Connections are kept open for DB_CONN_MAX_AGE seconds (0 closes them after
+# every request) and checked before reuse when DB_CONN_HEALTH_CHECKS is on.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_CONN_HEALTH_CHECKS = os.environ.get('DB_CONN_HEALTH_CHECKS', 'True') == 'True'
+# Queries running longer than this are cancelled by the server (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.environ.get('DB_STATEMENT_TIMEOUT_MS', 30000))
+# PostgreSQL only: psycopg 3 connection pool (replaces CONN_MAX_AGE when on)
+DB_POOL = os.environ.get('DB_POOL', 'False') == 'True'
+DB_POOL_MIN_SIZE = int(os.environ.get('DB_POOL_MIN_SIZE', 2))
+DB_POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX_SIZE', 10))
+DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 10))  # seconds to wait for a free connection
+# PostgreSQL only: exports stream through server-side cursors (iterator()).
+# Turn them off behind a transaction-mode pooler such as PgBouncer.
+DB_DISABLE_SERVER_SIDE_CURSORS = os.environ.get('DB_DISABLE_SERVER_SIDE_CURSORS', 'False') == 'True'
+
 if DJANGO_ENV == 'dev':
     # Development: Use PostgreSQL (with pgAdmin as your admin interface)
+    pg_options = {}
+    if DB_STATEMENT_TIMEOUT_MS:
+        pg_options['options'] = f'-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}'
+    if DB_POOL:
+        pg_options['pool'] = {
+            'min_size': DB_POOL_MIN_SIZE,
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': DB_POOL_TIMEOUT,
+        }
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -103,20 +131,33 @@ if DJANGO_ENV == 'dev':
             'PASSWORD': os.environ.get('PG_PASSWORD', '0000'),
             'HOST': os.environ.get('PG_HOST', 'localhost'),  # For local pgAdmin
             'PORT': os.environ.get('PG_PORT', '5432'),  # Default PostgreSQL port
+            # The pool keeps connections itself; Django must not hold on to them too
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
+            'DISABLE_SERVER_SIDE_CURSORS': DB_DISABLE_SERVER_SIDE_CURSORS,
+            'OPTIONS': pg_options,
         }
     }
 elif DJANGO_ENV == 'prod':
     # Production: Use MySQL (on PythonAnywhere)
+    mysql_init = "SET sql_mode='STRICT_TRANS_TABLES'"
+    if DB_STATEMENT_TIMEOUT_MS:
+        # Applies to read-only SELECTs (MySQL 5.7.8+)
+        mysql_init += f", SESSION max_execution_time={DB_STATEMENT_TIMEOUT_MS}"
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.mysql',
-            'NAME': 'bhavincreditbook$default',
-            'USER': 'bhavincreditbook',
-            'PASSWORD': 'Bhavin@123',
-            'HOST': 'bhavincreditbook.mysql.pythonanywhere-services.com',
-            'PORT': '3306',
+            'NAME': os.environ.get('MYSQL_DB_NAME', 'bhavincreditbook$default'),
+            'USER': os.environ.get('MYSQL_USER', 'bhavincreditbook'),
+            'PASSWORD': os.environ.get('MYSQL_PASSWORD', ''),
+            'HOST': os.environ.get('MYSQL_HOST', 'bhavincreditbook.mysql.pythonanywhere-services.com'),
+            'PORT': os.environ.get('MYSQL_PORT', '3306'),
+            # Django has no MySQL pool; persistent connections give the same reuse per worker
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_CONN_HEALTH_CHECKS,
             'OPTIONS': {
-                'init_command': "SET sql_mode='STRICT_TRANS_TABLES'",
+                'init_command': mysql_init,
+                'connect_timeout': int(os.environ.get('MYSQL_CONNECT_TIMEOUT', 10)),
             },
         }
     }
@@ -129,6 +170,32 @@ else:
     }
 }
 
+# Read replicas: GETs of list, summary and export views read from one of
+# DATABASE_REPLICAS (see creditapp/routers.py), everything else from default.
+# DB_REPLICA_HOSTS is a comma-separated list of replica hosts that share the
+# default database's name and credentials.
+DATABASE_REPLICAS = []
+for number, host in enumerate(filter(None, os.environ.get('DB_REPLICA_HOSTS', '').split(',')), start=1):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'], 'HOST': host.strip(), 'ATOMIC_REQUESTS': False, 'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+if DJANGO_ENV == '':
+    # Second SQLite file standing in for a replica (used by the routing tests);
+    # try it locally with DB_REPLICAS=replica after `migrate --database replica`
+    DATABASES['replica'] = {**DATABASES['default'], 'NAME': BASE_DIR / 'db_replica.sqlite3', 'ATOMIC_REQUESTS': False}
+if os.environ.get('DB_REPLICAS'):
+    DATABASE_REPLICAS = os.environ['DB_REPLICAS'].split(',')
+DATABASE_ROUTERS = ['creditapp.routers.ReplicaRouter']
+# Seconds a user's reads stay on the primary after they wrote something
+REPLICA_PIN_SECONDS = int(os.environ.get('REPLICA_PIN_SECONDS', 5))
+
+# ETags of polled views come from per-user ledger versions kept in the cache (creditapp/versions.py).
+# An expired version only costs the client one full response.
+LEDGER_VERSION_TTL_SECONDS = int(os.environ.get('LEDGER_VERSION_TTL_SECONDS', 60 * 60 * 24))
+# Change it on deploys that change response bodies, so clients don't keep the old format
+LEDGER_ETAG_SALT = os.environ.get('LEDGER_ETAG_SALT', '')
+
 
 
 
@@ -136,6 +203,19 @@ else:
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
+PASSWORD_HASHERS = [
+    'creditapp.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+# PBKDF2 work factor (unset: Django's default, 1,000,000 in 5.2). Each login pays for
+# one hash of this cost; tune it with "manage.py benchmark --scenario login" and keep
+# it as high as the login latency budget allows. Changing it rehashes passwords on the
+# next successful login.
+PASSWORD_HASH_ITERATIONS = int(os.environ['PASSWORD_HASH_ITERATIONS']) if os.environ.get('PASSWORD_HASH_ITERATIONS') else None
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -182,29 +262,82 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 MEDIA_URL   = '/media/'
 MEDIA_ROOT  = os.path.join(BASE_DIR,'media')
 
-# CACHES = {
-#     "default": {
-#         "BACKEND": "django.core.cache.backends.redis.RedisCache",
-#         "LOCATION": "redis://localhost:6379/1",
-#     }
-# }
+# Redis when REDIS_CACHE_URL is set (e.g. redis://localhost:6379/1), per-process memory otherwise
+if os.environ.get('REDIS_CACHE_URL'):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ['REDIS_CACHE_URL'],
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Email OTPs (creditapp/otp.py). The cache store needs a cache shared by all processes,
+# so without Redis codes are kept in the EmailOTP table
+OTP_STORE = os.environ.get('OTP_STORE', 'cache' if os.environ.get('REDIS_CACHE_URL') else 'database')
+OTP_TTL_SECONDS = int(os.environ.get('OTP_TTL_SECONDS', 600))
+# Wrong guesses before a code is discarded
+OTP_MAX_ATTEMPTS = 5
+# (requests, window seconds); client IPs come from REST_FRAMEWORK['NUM_PROXIES']
+OTP_RATE_LIMITS = {
+    'send_per_email': (5, 3600),
+    'send_per_ip': (20, 3600),
+    'verify_per_ip': (30, 600),
+}
+
+# Google sign-in (creditapp/google_auth.py): OAuth client IDs ID tokens may be issued to
+GOOGLE_CLIENT_IDS = [client_id for client_id in os.environ.get('GOOGLE_CLIENT_IDS', '').split(',') if client_id]
+# Google's signing keys are refetched this often (and whenever a token names an unknown key)
+GOOGLE_JWKS_CACHE_SECONDS = int(os.environ.get('GOOGLE_JWKS_CACHE_SECONDS', 3600))
+# Connect/read timeout of calls to Google, in seconds
+GOOGLE_HTTP_TIMEOUT = 5
 
 # Token auth
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES':(
-        'rest_framework.authentication.TokenAuthentication',
+        'creditapp.authentication.CachedTokenAuthentication',
     ),
 }
 
-AUTHENTICATION_BACKENDS = [
-    'creditapp.backends.EmailOrMobileBackend',      # <-- add this
-    'django.contrib.auth.backends.ModelBackend',
+# Request instrumentation (creditapp.middleware.PerformanceMiddleware)
+PERFORMANCE_METRICS_ENABLED = os.environ.get('PERFORMANCE_METRICS_ENABLED', 'True') == 'True'
+# Requests slower than this, or running at least this many queries, are logged as slow
+PERFORMANCE_SLOW_REQUEST_MS = int(os.environ.get('PERFORMANCE_SLOW_REQUEST_MS', 500))
+PERFORMANCE_SLOW_QUERY_COUNT = int(os.environ.get('PERFORMANCE_SLOW_QUERY_COUNT', 50))
+# Per-view overrides of PERFORMANCE_SLOW_REQUEST_MS
+PERFORMANCE_SLOW_VIEW_MS = {
+    'UserTransactionSummaryView': 200,
+    'TransactionExportView': 10000,
+    'TransactionBulkImportView': 10000,
+    'CustomerStatementView': 2000,
+}
+# Bearer token Prometheus sends to /api/metrics/; without it only staff users can read metrics
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+# Seconds a token -> user lookup is served from the cache
+AUTH_TOKEN_CACHE_TTL = int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 300))
 
+# Issue a new token on every signin (logging out other devices) instead of reusing the current one
+AUTH_TOKEN_ROTATE_ON_LOGIN = os.environ.get('AUTH_TOKEN_ROTATE_ON_LOGIN', 'False') == 'True'
+
+# EmailOrMobileBackend is a ModelBackend that also accepts mobile numbers; listing
+# ModelBackend as well would hash the password a second time on every failed login
+AUTHENTICATION_BACKENDS = [
+    'creditapp.backends.EmailOrMobileBackend',
 ]
 
 
 # email
-EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+# Set EMAIL_BACKEND to django.core.mail.backends.console.EmailBackend (or .filebased with
+# EMAIL_FILE_PATH) to work offline
+EMAIL_BACKEND = os.environ.get('EMAIL_BACKEND', 'django.core.mail.backends.smtp.EmailBackend')
+EMAIL_FILE_PATH = os.environ.get('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')
+EMAIL_TIMEOUT = 10
 EMAIL_HOST = 'smtp.gmail.com'
 EMAIL_PORT = 587
 EMAIL_USE_TLS = True
@@ -214,6 +347,13 @@ EMAIL_HOST_PASSWORD="tquw dzdf vpfq kjif"
 # EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_PASS')
 DEFAULT_FROM_EMAIL = EMAIL_HOST_USER
 
+# Outgoing mail goes through a bounded queue and is sent in batches over one connection
+EMAIL_DELIVERY_MODE = os.environ.get('EMAIL_DELIVERY_MODE', 'background')  # or "sync"
+EMAIL_DELIVERY_QUEUE_SIZE = 1000
+EMAIL_DELIVERY_BATCH_SIZE = 50
+EMAIL_DELIVERY_MAX_RETRIES = 3
+EMAIL_DELIVERY_RETRY_BACKOFF = 1.0  # seconds, doubled on each retry
+
 
 if DJANGO_ENV == 'prod':
     SESSION_COOKIE_SECURE = True
@@ -255,15 +395,50 @@ if DJANGO_ENV == 'prod':
 # }
 
 
-# Redis as Celery Broker
-# CELERY_BROKER_URL = "redis://172.20.80.1:6379/0"
-# CELERY_BROKER_URL = "redis://127.0.0.1:6379/1"
-# CELERY_ACCEPT_CONTENT = ["json"]
-# CELERY_TASK_SERIALIZER = "json"
+# Celery
+# Locally tasks run in-process (no broker needed); set CELERY_TASK_ALWAYS_EAGER=False and
+# run a worker per queue (default, balances, reminders, media, email) to move them off requests.
+CELERY_BROKER_URL = os.environ.get('CELERY_BROKER_URL', 'redis://127.0.0.1:6379/0')
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_TASK_SERIALIZER = "json"
+CELERY_TASK_ALWAYS_EAGER = os.environ.get('CELERY_TASK_ALWAYS_EAGER', 'True' if DJANGO_ENV == '' else 'False') == 'True'
+CELERY_TASK_EAGER_PROPAGATES = True
+
+# Optional: Store Celery task results in Django DB
+INSTALLED_APPS += ["django_celery_results"]
+CELERY_RESULT_BACKEND = "django-db"
+
+CELERY_BEAT_SCHEDULE = {
+    "reconcile-balances": {
+        "task": "creditapp.tasks.reconcile_all_balances",
+        "schedule": crontab(hour=3, minute=0),
+    },
+    "sweep-payment-reminders": {
+        "task": "creditapp.tasks.sweep_payment_reminders",
+        "schedule": crontab(hour=0, minute=5),
+    },
+    # The 9:00 run sends the day's digests; the later ones resume an interrupted
+    # run and retry digests every channel failed for
+    "dispatch-payment-reminders": {
+        "task": "creditapp.tasks.dispatch_payment_reminders",
+        "schedule": crontab(hour='9-20', minute=0),
+    },
+    "purge-expired-otps": {
+        "task": "creditapp.tasks.purge_expired_otps",
+        "schedule": crontab(minute=15),
+    },
+    "build-balance-checkpoints": {
+        "task": "creditapp.tasks.build_balance_checkpoints",
+        "schedule": crontab(day_of_month=1, hour=2, minute=0),
+    },
+}
 
-# # Optional: Store Celery task results in Django DB
-# INSTALLED_APPS += ["django_celery_results"]
-# CELERY_RESULT_BACKEND = "django-db"
+# Channels for the daily reminder digest: "email", "sms", "whatsapp" (the last two use a local fake gateway)
+REMINDER_NOTIFICATION_CHANNELS = os.environ.get('REMINDER_NOTIFICATION_CHANNELS', 'email').split(',')
+# Sends of a digest before it is given up for the day (only when every channel failed)
+REMINDER_DIGEST_MAX_ATTEMPTS = 5
+# Seconds after which a digest claim is taken to be from a worker that died mid-send, and retried
+REMINDER_DIGEST_CLAIM_TIMEOUT = 30 * 60
 
 
 
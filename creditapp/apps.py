@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class CreditappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'creditapp'
+
+    def ready(self):
+        # Connect the cache invalidation receivers
+        from . import authentication  # noqa: F401
@@ -0,0 +1,131 @@
+import threading
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+TOKEN_CACHE_ALIAS = getattr(settings, 'AUTH_TOKEN_CACHE_ALIAS', 'default')
+TOKEN_CACHE_TTL = getattr(settings, 'AUTH_TOKEN_CACHE_TTL', 300)
+
+
+class TokenCacheStats:
+    """Process-local hit/miss counters for the token cache."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def record(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def snapshot(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache_stats = TokenCacheStats()
+
+
+# After an invalidation the token's entry holds this marker for a while, so a
+# request that read the token just before it was revoked cannot cache it again
+REVOKED = 'revoked'
+REVOKED_TTL = 60
+
+
+def _token_cache_key(key):
+    return f'authtoken:key:{key}'
+
+
+def _user_cache_key(user_id):
+    return f'authtoken:user:{user_id}'
+
+
+def _cached_fields(model):
+    # Everything but the password hash, which is never written to the cache
+    return [field.attname for field in model._meta.concrete_fields if field.name != 'password']
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication that keeps token -> (token, user) in the cache for
+    AUTH_TOKEN_CACHE_TTL seconds, so most requests authenticate without a
+    database query. Entries hold plain field values (no password hash) and
+    are dropped on logout, token deletion and user updates or deletion.
+    """
+
+    def authenticate_credentials(self, key):
+        cache = caches[TOKEN_CACHE_ALIAS]
+        entry = cache.get(_token_cache_key(key))
+        hit = isinstance(entry, dict)
+        token_cache_stats.record(hit=hit)
+
+        if not hit:
+            user, token = super().authenticate_credentials(key)
+            if entry is None:
+                # add(), so a revocation marker written meanwhile stays in place
+                if cache.add(_token_cache_key(key), self.cache_entry(token), TOKEN_CACHE_TTL):
+                    cache.set(_user_cache_key(user.pk), key, TOKEN_CACHE_TTL)
+            return (user, token)
+
+        token = self.from_cache_entry(entry)
+        if not token.user.is_active:
+            raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        return (token.user, token)
+
+    @staticmethod
+    def cache_entry(token):
+        return {
+            'token': {name: getattr(token, name) for name in _cached_fields(type(token))},
+            'user': {name: getattr(token.user, name) for name in _cached_fields(type(token.user))},
+        }
+
+    def from_cache_entry(self, entry):
+        model = self.get_model()
+        user_model = model._meta.get_field('user').related_model
+        # Loaded like a row read with .only(); the password is fetched if ever needed
+        user = user_model.from_db(None, list(entry['user']), list(entry['user'].values()))
+        token = model.from_db(None, list(entry['token']), list(entry['token'].values()))
+        token.user = user
+        return token
+
+
+def invalidate_user_token(user_id, key=None):
+    """Drop the cached token entry of a user, or of the token ``key``."""
+    cache = caches[TOKEN_CACHE_ALIAS]
+    keys = {key, cache.get(_user_cache_key(user_id))} - {None}
+    cache.delete(_user_cache_key(user_id))
+    cache.set_many({_token_cache_key(key): REVOKED for key in keys}, REVOKED_TTL)
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def invalidate_token_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    """The cached entry carries the user's fields, so profile edits must not be served stale."""
+    # Logins write last_login (and a rehashed password), neither of which is cached
+    if not created and not (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        invalidate_user_token(instance.pk)
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def invalidate_token_on_user_delete(sender, instance, **kwargs):
+    invalidate_user_token(instance.pk)
+
+
+@receiver(post_delete, sender=Token)
+def invalidate_token_on_delete(sender, instance, **kwargs):
+    """Logout, rotation and admin or queryset deletes all revoke the token here."""
+    invalidate_user_token(instance.user_id, instance.key)
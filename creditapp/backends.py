@@ -1,31 +1,37 @@
 import logging
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
+from django.db.models import Q
 
 User = get_user_model()
 logger = logging.getLogger(__name__)
 
 class EmailOrMobileBackend(ModelBackend):
+    """Log in with either the email address or the mobile number, looked up in one query."""
+
     def authenticate(self, request, username=None, password=None, **kwargs):
-        print(f"[DEBUG] Trying to authenticate with username: {username}")
-        logger.debug(f"Trying to authenticate with username: {username}")
-        
-        if not username:
+        if not username or not password:
             return None
 
-        try:
-            user = User.objects.get(email=username)
-            print(f"[DEBUG] Found user by email: {user}")
-        except User.DoesNotExist:
-            try:
-                user = User.objects.get(mobile_number=username)
-                print(f"[DEBUG] Found user by mobile number: {user}")
-            except User.DoesNotExist:
-                print("[DEBUG] No user found with email or mobile")
-                return None
+        # An email and someone else's mobile number can't really collide, but
+        # if they ever do the email match wins
+        candidates = list(User._default_manager.filter(Q(email=username) | Q(mobile_number=username))[:2])
+        user = next((candidate for candidate in candidates if candidate.email == username), None)
+        if user is None and candidates:
+            user = candidates[0]
+
+        if user is None:
+            # Hash anyway so unknown usernames take as long as wrong passwords
+            User().set_password(password)
+            logger.info("Login failed: no such user", extra={'event': 'login_failed', 'reason': 'unknown_user'})
+            return None
 
+        # check_password() rehashes and saves the password when the hasher settings changed
         if user.check_password(password) and self.user_can_authenticate(user):
-            print("[DEBUG] Authentication successful")
+            logger.debug("Login succeeded", extra={'event': 'login', 'user_id': user.pk})
             return user
-        print("[DEBUG] Password check failed or user not active")
+        logger.info(
+            "Login failed for user %s", user.pk,
+            extra={'event': 'login_failed', 'reason': 'bad_password' if user.is_active else 'inactive', 'user_id': user.pk},
+        )
         return None
@@ -0,0 +1,295 @@
+"""
+Benchmark harness for the API.
+
+Each scenario issues real requests through Django's test client against the
+configured database (SQLite locally, PostgreSQL/MySQL with DJANGO_ENV), so
+the numbers include middleware, authentication, serialization and the
+database round trips. For every scenario the harness reports p50/p95/p99
+latency and queries per request; ``run_benchmarks`` returns a JSON-ready
+dict that ``compare_results`` can diff against an earlier run.
+
+Run it on data from ``manage.py generate_ledger`` (see creditapp/synthetic.py).
+"""
+import json
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from contextlib import ExitStack
+from datetime import date
+
+import django
+from django.db import connection, connections
+from django.test import Client
+from django.test.utils import override_settings
+from django.utils import timezone
+
+from .metrics import RequestMetrics
+from .models import Customer, EmailOTP, PendingUser, Transaction, User
+from .synthetic import BENCH_EMAIL_DOMAIN, BENCH_PASSWORD
+
+SCENARIOS = (
+    'signup', 'login', 'customer_list', 'transaction_search', 'summary',
+    'reminder_list', 'transaction_create', 'transaction_delete',
+)
+
+
+class Timing:
+    """Latencies (seconds) and query counts collected for one scenario."""
+
+    def __init__(self, after_request=None):
+        self.durations = []
+        self.queries = []
+        self.errors = 0
+        # Runs after each measured request, outside the timing
+        self.after_request = after_request
+
+    def measure(self, send, expected_status):
+        counter = RequestMetrics('BENCH')
+        with ExitStack() as stack:
+            for alias in connections:
+                stack.enter_context(connections[alias].execute_wrapper(counter))
+            start = time.perf_counter()
+            response = send()
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = time.perf_counter() - start
+        if self.after_request is not None:
+            self.after_request()
+        if response.status_code != expected_status:
+            self.errors += 1
+        self.durations.append(elapsed)
+        self.queries.append(counter.queries)
+        return response
+
+    def summary(self):
+        if not self.durations:
+            return {'iterations': 0, 'errors': self.errors}
+        ms = sorted(duration * 1000 for duration in self.durations)
+        return {
+            'iterations': len(ms),
+            'errors': self.errors,
+            'mean_ms': round(statistics.fmean(ms), 3),
+            'p50_ms': round(percentile(ms, 50), 3),
+            'p95_ms': round(percentile(ms, 95), 3),
+            'p99_ms': round(percentile(ms, 99), 3),
+            'max_ms': round(ms[-1], 3),
+            'queries_per_request': round(statistics.fmean(self.queries), 2),
+            'max_queries': max(self.queries),
+        }
+
+
+def percentile(sorted_values, pct):
+    """Linear-interpolated percentile of an already sorted list."""
+    if len(sorted_values) == 1:
+        return sorted_values[0]
+    position = (len(sorted_values) - 1) * pct / 100
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+class BenchmarkRun:
+    def __init__(self, user, iterations, warmup, after_request=None):
+        self.user = user
+        self.after_request = after_request
+        self.iterations = iterations
+        self.warmup = warmup
+        self.client = Client()
+        self.token = None
+        # Ids written by transaction_create, removed by transaction_delete
+        self.created = []
+        self.customer = (
+            Customer.objects.filter(user=user).order_by('-account_balance').only('id', 'name').first()
+        )
+
+    def auth(self):
+        return {'HTTP_AUTHORIZATION': f'Token {self.token}'}
+
+    def timing(self):
+        return Timing(after_request=self.after_request)
+
+    def repeat(self, send, expected_status=200):
+        timing = self.timing()
+        for _ in range(self.warmup):
+            send()
+        for _ in range(self.iterations):
+            timing.measure(send, expected_status)
+        return timing
+
+    # Scenarios ---------------------------------------------------------
+
+    def login(self):
+        def send():
+            response = self.client.post(
+                '/api/signin/', {'username': self.user.email, 'password': BENCH_PASSWORD},
+                content_type='application/json'
+            )
+            if response.status_code == 200:
+                self.token = response.json()['token']
+            return response
+        return self.repeat(send)
+
+    def signup(self):
+        timing = self.timing()
+        emails = []
+        for i in range(self.warmup + self.iterations):
+            email = f'bench-signup-{uuid.uuid4().hex[:12]}@gmail.com'
+            emails.append(email)
+            payload = {
+                'email': email,
+                'first_name': 'Bench',
+                'mobile_number': f'6{uuid.uuid4().int % 10 ** 9:09d}',
+                'password': BENCH_PASSWORD,
+            }
+            send = lambda: self.client.post('/api/signup/', payload, content_type='application/json')
+            if i < self.warmup:
+                send()
+            else:
+                timing.measure(send, 200)
+        PendingUser.objects.filter(email__in=emails).delete()
+        EmailOTP.objects.filter(email__in=emails).delete()
+        return timing
+
+    def customer_list(self):
+        return self.repeat(lambda: self.client.get('/api/customers/', **self.auth()))
+
+    def transaction_search(self):
+        term = self.customer.name.split()[0] if self.customer else 'a'
+        return self.repeat(lambda: self.client.get(
+            '/api/transactions/', {'customer_name': term, 'transaction_type': 'debit'}, **self.auth()
+        ))
+
+    def summary(self):
+        return self.repeat(lambda: self.client.get('/api/user/transaction-summary/', **self.auth()))
+
+    def reminder_list(self):
+        return self.repeat(lambda: self.client.get(
+            '/api/payment-reminders/', {'payment_status': 'overdue'}, **self.auth()
+        ))
+
+    def transaction_create(self):
+        def send():
+            response = self.client.post('/api/transactions/', {
+                'customer': self.customer.pk,
+                'amount': '125.50',
+                'transaction_type': 'debit',
+                'payment_mode': 'cash',
+                'date': timezone.localdate().isoformat(),
+                'description': 'benchmark',
+            }, content_type='application/json', **self.auth())
+            if response.status_code == 201:
+                self.created.append(response.json()['id'])
+            return response
+        return self.repeat(send, expected_status=201)
+
+    def transaction_delete(self):
+        timing = self.timing()
+        for transaction_id in self.created:
+            timing.measure(
+                lambda: self.client.delete(f'/api/transactions/delete/{transaction_id}/', **self.auth()),
+                expected_status=204,
+            )
+        self.created = []
+        return timing
+
+
+def close_connections():
+    """What the end of a request does with CONN_MAX_AGE = 0: close every database connection."""
+    for conn in connections.all(initialized_only=True):
+        conn.close()
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def run_benchmarks(user=None, scenarios=SCENARIOS, iterations=50, warmup=5, after_request=None):
+    """
+    Run ``scenarios`` as ``user`` (default: the first generated user) and
+    return {'meta': ..., 'scenarios': {name: summary}}. Login always runs
+    first since the other scenarios use its token; rows created by the
+    signup and create scenarios are removed again. ``after_request`` is
+    called after every measured request, outside the timing.
+    """
+    if user is None:
+        user = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').order_by('id').first()
+        if user is None:
+            raise ValueError('No benchmark users found; run "manage.py generate_ledger" first.')
+
+    run = BenchmarkRun(user, iterations=iterations, warmup=warmup, after_request=after_request)
+    if run.customer is None:
+        raise ValueError(f'User {user.pk} has no customers to benchmark against.')
+    ordered = ['login'] + [name for name in SCENARIOS if name in scenarios and name != 'login']
+    if 'transaction_delete' in ordered and 'transaction_create' not in ordered:
+        ordered.insert(ordered.index('transaction_delete'), 'transaction_create')
+
+    results = {}
+    overrides = {
+        # Keep the signup scenario from sending real mail
+        'EMAIL_BACKEND': 'django.core.mail.backends.locmem.EmailBackend',
+        'EMAIL_DELIVERY_MODE': 'sync',
+        'ALLOWED_HOSTS': ['*'],
+        # Every signup comes from one client IP
+        'OTP_RATE_LIMITS': {},
+    }
+    with override_settings(**overrides):
+        for name in ordered:
+            timing = getattr(run, name)()
+            if name in scenarios:
+                results[name] = timing.summary()
+        # Don't leave created rows behind when only creation was measured
+        if run.created:
+            for transaction_row in Transaction.objects.filter(pk__in=run.created):
+                transaction_row.delete()
+
+    return {
+        'meta': {
+            'revision': _git_revision(),
+            'created_at': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'django': django.get_version(),
+            'python': platform.python_version(),
+            'user_id': user.pk,
+            'customers': Customer.objects.filter(user=user).count(),
+            'transactions': Transaction.objects.filter(customer__user=user).count(),
+            'iterations': iterations,
+            'warmup': warmup,
+        },
+        'scenarios': results,
+    }
+
+
+def compare_results(baseline, current, metric='p95_ms'):
+    """
+    Per-scenario change of ``metric`` and of queries per request between two
+    run_benchmarks() results: [(scenario, before, after, percent change,
+    queries before, queries after)].
+    """
+    rows = []
+    for name, after in current['scenarios'].items():
+        before = baseline.get('scenarios', {}).get(name)
+        if not before or metric not in before or metric not in after:
+            continue
+        change = (after[metric] - before[metric]) / before[metric] * 100 if before[metric] else 0.0
+        rows.append((
+            name, before[metric], after[metric], round(change, 1),
+            before.get('queries_per_request'), after.get('queries_per_request'),
+        ))
+    return rows
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def save_results(results, path):
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, default=lambda value: value.isoformat() if isinstance(value, date) else str(value))
@@ -0,0 +1,194 @@
+"""
+Month-end balance checkpoints.
+
+A BalanceCheckpoint holds the cumulative credit, debit and balance of a
+customer up to the end of a closed month. A historical balance is then the
+latest checkpoint on or before the date plus the transactions dated after it,
+so statements never sum a customer's whole history. Back-dated writes drop
+the checkpoints they make stale (see ``invalidate_balance_checkpoints``) and
+``build_checkpoints`` fills them in again from the last one still standing.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, Max, Q, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import BalanceCheckpoint, Customer, Transaction
+
+CHECKPOINT_BATCH_SIZE = 200
+
+
+def month_end(day):
+    """Last day of the month ``day`` falls in."""
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def last_closed_month_end(today=None):
+    today = today or timezone.localdate()
+    return today.replace(day=1) - timedelta(days=1)
+
+
+def _empty_totals():
+    return {'credit': Decimal('0'), 'debit': Decimal('0'), 'balance': Decimal('0'), 'transactions': 0}
+
+
+def totals_as_of(customer_id, as_of):
+    """
+    Cumulative credit, debit, balance and transaction count of a customer for
+    every transaction dated on or before ``as_of`` (one checkpoint lookup plus
+    one aggregate over the rows after it).
+    """
+    checkpoint = (
+        BalanceCheckpoint.objects.filter(customer_id=customer_id, period_end__lte=as_of)
+        .order_by('-period_end')
+        .first()
+    )
+    totals = _empty_totals()
+    rows = Transaction.objects.filter(customer_id=customer_id, date__lte=as_of)
+    if checkpoint is not None:
+        totals.update(
+            credit=checkpoint.credit_total,
+            debit=checkpoint.debit_total,
+            balance=checkpoint.balance,
+            transactions=checkpoint.transaction_count,
+        )
+        rows = rows.filter(date__gt=checkpoint.period_end)
+
+    tail = rows.aggregate(
+        credit=Sum('amount', filter=Q(transaction_type='credit')),
+        debit=Sum('amount', filter=Q(transaction_type='debit')),
+        transactions=Count('id'),
+    )
+    credit = tail['credit'] or 0
+    debit = tail['debit'] or 0
+    totals['credit'] += credit
+    totals['debit'] += debit
+    totals['balance'] += credit - debit
+    totals['transactions'] += tail['transactions']
+    return totals
+
+
+def statement_totals(customer_id, start, end):
+    """Opening balance, period credit/debit and closing balance for ``start``..``end`` inclusive."""
+    opening = totals_as_of(customer_id, start - timedelta(days=1))
+    closing = totals_as_of(customer_id, end)
+    return {
+        'start': start,
+        'end': end,
+        'opening_balance': opening['balance'],
+        'total_credit': closing['credit'] - opening['credit'],
+        'total_debit': closing['debit'] - opening['debit'],
+        'transaction_count': closing['transactions'] - opening['transactions'],
+        'closing_balance': closing['balance'],
+    }
+
+
+def _build_batch(customer_ids, until):
+    """Extend the checkpoints of ``customer_ids`` up to ``until``; return the number written."""
+    latest = dict(
+        BalanceCheckpoint.objects.filter(customer_id__in=customer_ids)
+        .values_list('customer_id')
+        .annotate(period_end=Max('period_end'))
+        .order_by()
+    )
+    start_from = {
+        checkpoint.customer_id: checkpoint
+        for checkpoint in BalanceCheckpoint.objects.filter(
+            customer_id__in=list(latest), period_end__in=set(latest.values())
+        )
+        if latest[checkpoint.customer_id] == checkpoint.period_end
+    }
+
+    # Monthly totals after each customer's last checkpoint; the lower bound is
+    # the earliest of them and rows already covered are skipped below.
+    rows = Transaction.objects.filter(customer_id__in=customer_ids, date__lte=until)
+    if len(start_from) == len(customer_ids) and start_from:
+        rows = rows.filter(date__gt=min(checkpoint.period_end for checkpoint in start_from.values()))
+    monthly = (
+        rows.annotate(month=TruncMonth('date'))
+        .values('customer_id', 'month')
+        .annotate(
+            credit=Sum('amount', filter=Q(transaction_type='credit')),
+            debit=Sum('amount', filter=Q(transaction_type='debit')),
+            transactions=Count('id'),
+        )
+        .order_by('customer_id', 'month')
+    )
+
+    months = defaultdict(list)
+    for row in monthly:
+        checkpoint = start_from.get(row['customer_id'])
+        if checkpoint is not None and row['month'] <= checkpoint.period_end:
+            continue
+        months[row['customer_id']].append(row)
+
+    checkpoints = []
+    for customer_id, customer_months in months.items():
+        totals = _empty_totals()
+        checkpoint = start_from.get(customer_id)
+        if checkpoint is not None:
+            totals.update(
+                credit=checkpoint.credit_total,
+                debit=checkpoint.debit_total,
+                balance=checkpoint.balance,
+                transactions=checkpoint.transaction_count,
+            )
+        for row in customer_months:
+            credit = row['credit'] or 0
+            debit = row['debit'] or 0
+            totals['credit'] += credit
+            totals['debit'] += debit
+            totals['balance'] += credit - debit
+            totals['transactions'] += row['transactions']
+            checkpoints.append(BalanceCheckpoint(
+                customer_id=customer_id,
+                period_end=month_end(row['month']),
+                credit_total=totals['credit'],
+                debit_total=totals['debit'],
+                balance=totals['balance'],
+                transaction_count=totals['transactions'],
+            ))
+
+    with transaction.atomic():
+        BalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+    return len(checkpoints)
+
+
+def build_checkpoints(customer_ids=None, until=None, batch_size=CHECKPOINT_BATCH_SIZE):
+    """
+    Write the missing month-end checkpoints of ``customer_ids`` (all customers
+    by default) up to the last closed month, starting from each customer's
+    latest checkpoint. Months without transactions get no row. Returns the
+    number of checkpoints written.
+    """
+    until = until or last_closed_month_end()
+    if month_end(until) != until:
+        # Only whole months are checkpointed
+        until = until.replace(day=1) - timedelta(days=1)
+    customers = Customer.objects.order_by('id')
+    if customer_ids is not None:
+        customers = customers.filter(id__in=customer_ids)
+
+    written = 0
+    last_id = 0
+    while True:
+        batch = list(customers.filter(id__gt=last_id).values_list('id', flat=True)[:batch_size])
+        if not batch:
+            break
+        last_id = batch[-1]
+        written += _build_batch(batch, until)
+    return written
+
+
+def rebuild_checkpoints(customer_ids=None, until=None, batch_size=CHECKPOINT_BATCH_SIZE):
+    """Drop and recompute the checkpoints of ``customer_ids`` (all customers by default)."""
+    checkpoints = BalanceCheckpoint.objects.all()
+    if customer_ids is not None:
+        checkpoints = checkpoints.filter(customer_id__in=customer_ids)
+    checkpoints.delete()
+    return build_checkpoints(customer_ids=customer_ids, until=until, batch_size=batch_size)
@@ -0,0 +1,122 @@
+"""
+Google sign-in.
+
+Clients send either a Google ID token (``id_token``, a JWT signed by
+Google) or an OAuth ``access_token``. ID tokens are verified locally: the
+signature against Google's published keys (JWKS), plus the issuer, the
+audience (GOOGLE_CLIENT_IDS) and the expiry. The key set is fetched once per
+GOOGLE_JWKS_CACHE_SECONDS and kept in memory, and a token signed with a
+``kid`` that is not in the cached set (Google rotated its keys) triggers one
+refetch, at most once per GOOGLE_JWKS_REFRESH_COOLDOWN_SECONDS. A login with
+an ID token therefore normally makes no network call.
+
+Access tokens can only be checked by asking Google's userinfo endpoint. That
+call goes through one pooled ``requests.Session`` per process with a timeout
+and a short retry on 5xx responses.
+"""
+import threading
+
+import jwt
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+GOOGLE_ISSUERS = ('accounts.google.com', 'https://accounts.google.com')
+GOOGLE_JWKS_URL = 'https://www.googleapis.com/oauth2/v3/certs'
+GOOGLE_USERINFO_URL = 'https://www.googleapis.com/oauth2/v2/userinfo'
+
+
+class GoogleTokenError(Exception):
+    pass
+
+
+_lock = threading.Lock()
+_jwks_clients = {}
+_session = None
+
+
+def _timeout():
+    return getattr(settings, 'GOOGLE_HTTP_TIMEOUT', 5)
+
+
+def jwks_client():
+    """The process-wide PyJWKClient for GOOGLE_JWKS_URL; it caches the key set."""
+    url = getattr(settings, 'GOOGLE_JWKS_URL', GOOGLE_JWKS_URL)
+    client = _jwks_clients.get(url)
+    if client is None:
+        with _lock:
+            client = _jwks_clients.get(url)
+            if client is None:
+                client = _jwks_clients[url] = jwt.PyJWKClient(
+                    url,
+                    cache_jwk_set=True,
+                    lifespan=getattr(settings, 'GOOGLE_JWKS_CACHE_SECONDS', 3600),
+                    timeout=_timeout(),
+                    # Limits refetches triggered by tokens with made-up key ids
+                    cooldown_duration=getattr(settings, 'GOOGLE_JWKS_REFRESH_COOLDOWN_SECONDS', 30),
+                )
+    return client
+
+
+def http_session():
+    """Pooled session for calls to Google (keep-alive instead of a TLS handshake per login)."""
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_maxsize=getattr(settings, 'GOOGLE_HTTP_POOL_SIZE', 10),
+                    max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=(502, 503, 504),
+                                      allowed_methods=('GET',)),
+                )
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                _session = session
+    return _session
+
+
+def verify_id_token(token):
+    """Claims of a valid Google ID token with a verified email; raises GoogleTokenError otherwise."""
+    client_ids = getattr(settings, 'GOOGLE_CLIENT_IDS', [])
+    if not client_ids:
+        raise GoogleTokenError('GOOGLE_CLIENT_IDS is not configured')
+    try:
+        signing_key = jwks_client().get_signing_key_from_jwt(token)
+        claims = jwt.decode(
+            token,
+            signing_key.key,
+            algorithms=['RS256'],
+            audience=client_ids,
+            issuer=GOOGLE_ISSUERS,
+            leeway=getattr(settings, 'GOOGLE_TOKEN_LEEWAY_SECONDS', 30),
+            options={'require': ['exp', 'iat', 'iss', 'aud', 'sub']},
+        )
+    except (jwt.InvalidTokenError, jwt.PyJWKClientError) as e:
+        raise GoogleTokenError(str(e)) from e
+    if not claims.get('email') or not claims.get('email_verified'):
+        raise GoogleTokenError('Token has no verified email')
+    return claims
+
+
+def fetch_userinfo(access_token):
+    """Profile of the user an OAuth access token belongs to, from Google's userinfo endpoint."""
+    try:
+        response = http_session().get(
+            getattr(settings, 'GOOGLE_USERINFO_URL', GOOGLE_USERINFO_URL),
+            headers={'Authorization': f'Bearer {access_token}'},
+            timeout=_timeout(),
+        )
+    except requests.RequestException as e:
+        raise GoogleTokenError(f'userinfo request failed: {e}') from e
+    if response.status_code != 200:
+        raise GoogleTokenError(f'userinfo returned {response.status_code}')
+    try:
+        info = response.json()
+    except ValueError as e:
+        raise GoogleTokenError('userinfo returned a body that is not JSON') from e
+    # v2 calls it verified_email, v3 email_verified
+    if not info.get('email') or not (info.get('verified_email') or info.get('email_verified')):
+        raise GoogleTokenError('Token has no verified email')
+    return info
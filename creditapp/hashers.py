@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.contrib.auth.hashers import PBKDF2PasswordHasher as DjangoPBKDF2PasswordHasher
+
+
+class PBKDF2PasswordHasher(DjangoPBKDF2PasswordHasher):
+    """
+    Django's PBKDF2 hasher with the work factor taken from the
+    PASSWORD_HASH_ITERATIONS setting (Django's default when unset). The
+    algorithm name is unchanged, so existing hashes keep working and are
+    re-encoded with the new count on the user's next successful login.
+    """
+
+    @property
+    def iterations(self):
+        return getattr(settings, 'PASSWORD_HASH_ITERATIONS', None) or DjangoPBKDF2PasswordHasher.iterations
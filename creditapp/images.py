@@ -0,0 +1,120 @@
+"""
+Resized, compressed variants of transaction bill images.
+
+Phone photos are uploaded as-is. After an upload commits, the
+``generate_bill_image_variants`` task writes a thumbnail and a medium-sized
+copy of each bill in WebP and JPEG next to the original
+(``uploads/bill_<uuid>_thumb.webp`` ...). Orientation from the EXIF data is
+applied to the pixels and the EXIF block (camera, GPS, ...) is not copied.
+The stored names are kept in ``Transaction.bill_image_variants`` and
+serializers expose them as URLs; an image that cannot be rendered is
+marked with ``VARIANTS_FAILED`` instead.
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+
+logger = logging.getLogger(__name__)
+
+# Longest side in pixels of each variant
+VARIANT_SIZES = {
+    'thumb': 320,
+    'medium': 1280,
+}
+VARIANT_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 75, 'method': 4},
+    'jpeg': {'format': 'JPEG', 'quality': 80, 'optimize': True, 'progressive': True},
+}
+
+
+# Stored instead of variants when the original cannot be rendered, so the
+# backfill does not retry it (unless --force)
+VARIANTS_FAILED = {'failed': True}
+
+
+def variant_names(variants):
+    """{key: storage name} of a Transaction.bill_image_variants value, without the failure marker."""
+    return {key: name for key, name in (variants or {}).items() if key not in VARIANTS_FAILED}
+
+
+def variant_key(size, fmt):
+    return f'{size}_{fmt}'
+
+
+def variant_name(original_name, size, fmt):
+    """Storage name of a variant, next to the original."""
+    stem, _ = os.path.splitext(original_name)
+    return f'{stem}_{size}.{fmt}'
+
+
+def render_variants(data):
+    """
+    Render every size/format variant of the image bytes ``data``; returns
+    {key: bytes}. Pure function of its input, so it can run in a worker process.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ('RGB', 'L'):
+            # JPEG has no alpha; flatten transparent PNGs onto white
+            background = Image.new('RGB', image.size, 'white')
+            background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+            image = background
+
+        rendered = {}
+        for size, longest_side in VARIANT_SIZES.items():
+            resized = image.copy()
+            resized.thumbnail((longest_side, longest_side), Image.Resampling.LANCZOS)
+            for fmt, options in VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                # No exif= argument: the metadata of the original is dropped
+                resized.save(buffer, **options)
+                rendered[variant_key(size, fmt)] = buffer.getvalue()
+        return rendered
+
+
+def store_variants(original_name, storage=None):
+    """
+    Render the variants of the stored image ``original_name`` and save them
+    next to it, replacing earlier copies. Returns {key: stored name}.
+    """
+    storage = storage or default_storage
+    with storage.open(original_name, 'rb') as fh:
+        rendered = render_variants(fh.read())
+
+    stored = {}
+    for key, content in rendered.items():
+        size, fmt = key.split('_', 1)
+        name = variant_name(original_name, size, fmt)
+        if storage.exists(name):
+            storage.delete(name)
+        stored[key] = storage.save(name, ContentFile(content))
+    return stored
+
+
+def variant_urls(names, storage=None):
+    """{key: URL} for a Transaction.bill_image_variants value."""
+    storage = storage or default_storage
+    return {key: storage.url(name) for key, name in variant_names(names).items()}
+
+
+def init_worker():
+    """ProcessPoolExecutor initializer: workers started with 'spawn' need Django set up."""
+    import django
+    from django.apps import apps
+
+    if not apps.ready:
+        django.setup()
+
+
+def process_original(name):
+    """Backfill worker: store the variants of ``name``; returns (name, variants or None)."""
+    try:
+        return name, store_variants(name)
+    except Exception:
+        logger.exception("Could not create variants of bill image %s", name)
+        return name, None
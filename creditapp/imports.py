@@ -0,0 +1,127 @@
+import codecs
+import csv
+import json
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+
+from .models import Customer, Transaction, apply_ledger_changes
+from .serializers import TransactionImportSerializer
+
+IMPORT_BATCH_SIZE = getattr(settings, 'TRANSACTION_IMPORT_BATCH_SIZE', 500)
+IMPORT_MAX_ROWS = getattr(settings, 'TRANSACTION_IMPORT_MAX_ROWS', 20000)
+
+CSV_CONTENT_TYPES = ('text/csv', 'application/csv')
+NDJSON_CONTENT_TYPES = ('application/x-ndjson', 'application/ndjson', 'application/jsonlines')
+
+
+class ImportTooLarge(Exception):
+    pass
+
+
+class InvalidImport(Exception):
+    pass
+
+
+def _body_lines(request):
+    """Iterate the raw request body line by line without reading it into memory."""
+    stream = request.stream
+    if stream is None:
+        return iter(())
+    return iter(stream.readline, b'')
+
+
+def iter_import_rows(request):
+    """
+    Yield import rows from a JSON array, a CSV body with a header row or an
+    NDJSON body. CSV and NDJSON bodies are parsed as they are read.
+    """
+    content_type = request.content_type.split(';')[0].strip().lower()
+
+    if content_type in CSV_CONTENT_TYPES:
+        for row in csv.DictReader(codecs.iterdecode(_body_lines(request), 'utf-8-sig')):
+            # Empty cells mean "not given" so serializer defaults apply
+            yield {key: value for key, value in row.items() if key and value not in ('', None)}
+
+    elif content_type in NDJSON_CONTENT_TYPES:
+        for line in codecs.iterdecode(_body_lines(request), 'utf-8'):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError:
+                # Let the row serializer report it like any other invalid row
+                yield line
+
+    else:
+        data = request.data
+        if isinstance(data, dict):
+            if 'transactions' not in data:
+                raise InvalidImport('Expected a list of transactions or {"transactions": [...]}.')
+            data = data['transactions']
+        if not isinstance(data, list):
+            raise InvalidImport('Expected a list of transactions or {"transactions": [...]}.')
+        yield from data
+
+
+def _batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+def import_transactions(user, rows, batch_size=IMPORT_BATCH_SIZE):
+    """
+    Validate and insert transaction rows for ``user`` with bulk_create.
+
+    Ownership is checked with one query per batch, and each affected
+    customer's balance (and pending reminders) and the user's summary are
+    updated once at the end.
+    Invalid rows are skipped and reported with their 1-based row number.
+    """
+    created = 0
+    errors = []
+    imported = []
+
+    with transaction.atomic():
+        for batch in _batched(enumerate(rows, start=1), batch_size):
+            if batch[-1][0] > IMPORT_MAX_ROWS:
+                raise ImportTooLarge(f"Imports are limited to {IMPORT_MAX_ROWS} rows.")
+
+            valid_rows = []
+            for row_number, row in batch:
+                serializer = TransactionImportSerializer(data=row)
+                if serializer.is_valid():
+                    valid_rows.append((row_number, serializer.validated_data))
+                else:
+                    errors.append({"row": row_number, "errors": serializer.errors})
+
+            owned_customers = set(
+                Customer.objects.filter(
+                    user=user, id__in={data['customer'] for _, data in valid_rows}
+                ).values_list('id', flat=True)
+            )
+
+            new_transactions = []
+            for row_number, data in valid_rows:
+                customer_id = data.pop('customer')
+                if customer_id not in owned_customers:
+                    errors.append({"row": row_number, "errors": {"customer": ["Customer Not Found."]}})
+                    continue
+                new_transactions.append(Transaction(customer_id=customer_id, **data))
+
+            Transaction.objects.bulk_create(new_transactions)
+            created += len(new_transactions)
+            # Only the fields the running totals, last_activity and the
+            # checkpoint invalidation need are kept between batches
+            imported.extend(
+                Transaction(customer_id=t.customer_id, amount=t.amount, transaction_type=t.transaction_type, date=t.date)
+                for t in new_transactions
+            )
+
+        apply_ledger_changes(added=imported)
+
+    errors.sort(key=lambda error: error["row"])
+    return {"created": created, "failed": len(errors), "errors": errors}
@@ -0,0 +1,165 @@
+"""
+Bounded, batched email delivery.
+
+Messages are queued and sent by a single background worker that drains the
+queue in batches and sends each batch over one backend connection, so a burst
+of OTP emails costs one SMTP/TLS handshake per batch instead of one thread
+and one handshake per message. Failed messages are retried with exponential
+backoff and logged when they give up. Mail still queued when the process
+exits is sent before it goes (atexit); a process that is killed outright
+loses it, so use the "celery" mode where that matters.
+
+EMAIL_DELIVERY_MODE selects "background" (default), "celery" (the email
+queue of the Celery app) or "sync" (send in the caller, useful with the
+console/file/locmem backends in tests).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+logger = logging.getLogger(__name__)
+
+
+class EmailDeliveryWorker:
+
+    def __init__(self, maxsize=1000, batch_size=50, max_retries=3, backoff=1.0):
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_started(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='email-delivery', daemon=True)
+                self._thread.start()
+
+    def submit(self, message, timeout=1.0):
+        """Queue a message; when the queue stays full, send it in the caller (backpressure)."""
+        self._ensure_started()
+        try:
+            self._queue.put(message, timeout=timeout)
+        except queue.Full:
+            logger.warning("Email queue full, sending to %s inline", message.to)
+            self.deliver([message])
+
+    def flush(self):
+        """Block until every queued message has been handled."""
+        self._queue.join()
+
+    def shutdown(self, timeout=10.0):
+        """
+        Give the worker ``timeout`` seconds to finish, then send whatever is
+        still queued in the caller. Registered with atexit so a process that
+        exits or is recycled does not drop queued mail.
+        """
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and self._thread is not None and self._thread.is_alive():
+            if time.monotonic() >= deadline:
+                break
+            time.sleep(0.05)
+
+        leftover = []
+        while True:
+            try:
+                leftover.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if leftover:
+            try:
+                self.deliver(leftover)
+            finally:
+                for _ in leftover:
+                    self._queue.task_done()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            while len(batch) < self.batch_size:
+                try:
+                    batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.deliver(batch)
+            except Exception:
+                logger.exception("Email delivery worker failed on a batch of %d", len(batch))
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def deliver(self, messages):
+        """Send ``messages`` over one connection per attempt, retrying failures with backoff."""
+        pending = list(messages)
+        for attempt in range(self.max_retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            failed = []
+            try:
+                with get_connection(fail_silently=False) as connection:
+                    for message in pending:
+                        try:
+                            connection.send_messages([message])
+                        except Exception:
+                            logger.warning("Sending email to %s failed (attempt %d)", message.to, attempt + 1, exc_info=True)
+                            failed.append(message)
+            except Exception:
+                # Could not open the connection at all
+                logger.warning("Opening the email connection failed (attempt %d)", attempt + 1, exc_info=True)
+                failed = pending
+
+            if not failed:
+                return 0
+            pending = failed
+
+        for message in pending:
+            logger.error("Giving up on email to %s after %d attempts", message.to, self.max_retries + 1)
+        return len(pending)
+
+
+worker = EmailDeliveryWorker(
+    maxsize=getattr(settings, 'EMAIL_DELIVERY_QUEUE_SIZE', 1000),
+    batch_size=getattr(settings, 'EMAIL_DELIVERY_BATCH_SIZE', 50),
+    max_retries=getattr(settings, 'EMAIL_DELIVERY_MAX_RETRIES', 3),
+    backoff=getattr(settings, 'EMAIL_DELIVERY_RETRY_BACKOFF', 1.0),
+)
+atexit.register(worker.shutdown)
+
+
+def message_to_payload(message):
+    """JSON-serializable form of an EmailMultiAlternatives, for the Celery email queue."""
+    return {
+        "subject": message.subject,
+        "body": message.body,
+        "from_email": message.from_email,
+        "to": list(message.to),
+        "alternatives": [list(alternative) for alternative in getattr(message, 'alternatives', [])],
+    }
+
+
+def message_from_payload(payload):
+    message = EmailMultiAlternatives(payload["subject"], payload["body"], payload["from_email"], payload["to"])
+    for content, mimetype in payload["alternatives"]:
+        message.attach_alternative(content, mimetype)
+    return message
+
+
+def deliver_email(message):
+    """Send ``message`` according to EMAIL_DELIVERY_MODE."""
+    mode = getattr(settings, 'EMAIL_DELIVERY_MODE', 'background')
+    if mode == 'sync':
+        worker.deliver([message])
+    elif mode == 'celery':
+        from .tasks import enqueue, send_email
+
+        enqueue(send_email, message_to_payload(message))
+    else:
+        worker.submit(message)
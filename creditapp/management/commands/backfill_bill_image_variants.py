@@ -0,0 +1,62 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Create the resized WebP/JPEG variants of existing bill images on a pool of worker processes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 2, help='Worker processes.')
+        parser.add_argument('--batch-size', type=int, default=200, help='Transactions fetched and dispatched per batch.')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that already exist or failed before.')
+
+    def handle(self, *args, **options):
+        from django.db import connections
+        from creditapp.images import VARIANTS_FAILED, init_worker, process_original
+        from creditapp.models import Transaction
+        from creditapp.utils import delete_media_files
+        from creditapp.versions import bump_ledger_versions
+
+        pending = Transaction.objects.exclude(bill_image='').exclude(bill_image__isnull=True).order_by('id')
+        if not options['force']:
+            pending = pending.filter(bill_image_variants={})
+
+        done = failed = 0
+        last_id = 0
+        # Forked workers must not inherit open database connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['workers'], initializer=init_worker) as pool:
+            while True:
+                batch = list(pending.filter(id__gt=last_id).values_list('id', 'bill_image', 'customer__user_id')[:options['batch_size']])
+                if not batch:
+                    break
+                last_id = batch[-1][0]
+
+                ids_by_name = {}
+                users_by_name = {}
+                for transaction_id, name, user_id in batch:
+                    ids_by_name.setdefault(name, []).append(transaction_id)
+                    users_by_name.setdefault(name, set()).add(user_id)
+                for name, variants in pool.map(process_original, list(ids_by_name)):
+                    if variants is None:
+                        failed += 1
+                        # Skipped by later runs unless --force
+                        Transaction.objects.filter(
+                            id__in=ids_by_name[name], bill_image=name
+                        ).update(bill_image_variants=VARIANTS_FAILED)
+                        continue
+                    # Skip rows whose image changed while the batch was processed
+                    updated = Transaction.objects.filter(
+                        id__in=ids_by_name[name], bill_image=name
+                    ).update(bill_image_variants=variants)
+                    if updated:
+                        done += 1
+                        bump_ledger_versions(users_by_name[name])
+                    else:
+                        delete_media_files(variants.values())
+                if options['verbosity'] > 1:
+                    self.stdout.write(f'Up to transaction {last_id}: {done} done, {failed} failed')
+
+        self.stdout.write(self.style.SUCCESS(f'Created variants for {done} bill images ({failed} failed).'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare per-request latency with a new database connection per request "
+        "(CONN_MAX_AGE = 0) against the configured persistent/pooled connections."
+    )
+
+    def add_arguments(self, parser):
+        from creditapp.benchmarks import SCENARIOS
+
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=SCENARIOS,
+                            help='Scenarios to run (repeatable), default customer_list, summary and reminder_list.')
+        parser.add_argument('--iterations', type=int, default=100, help='Measured requests per scenario and mode.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario first.')
+        parser.add_argument('--output', help='Write both runs as JSON to this file.')
+
+    def handle(self, *args, **options):
+        from django.db import connection
+        from creditapp.benchmarks import close_connections, run_benchmarks, save_results
+
+        scenarios = options['scenarios'] or ['customer_list', 'summary', 'reminder_list']
+        settings_dict = connection.settings_dict
+        self.stdout.write(
+            f"{connection.vendor}: CONN_MAX_AGE={settings_dict.get('CONN_MAX_AGE')}, "
+            f"CONN_HEALTH_CHECKS={settings_dict.get('CONN_HEALTH_CHECKS')}, "
+            f"pool={'pool' in settings_dict.get('OPTIONS', {})}"
+        )
+
+        runs = {}
+        try:
+            # Closing after every request is what CONN_MAX_AGE = 0 does at request end
+            runs['per_request'] = run_benchmarks(
+                scenarios=scenarios, iterations=options['iterations'], warmup=options['warmup'],
+                after_request=close_connections,
+            )
+            runs['configured'] = run_benchmarks(
+                scenarios=scenarios, iterations=options['iterations'], warmup=options['warmup'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(
+            f"{'scenario':<20}{'new conn p50':>14}{'reused p50':>12}{'new conn p95':>14}{'reused p95':>12}{'saved/req':>11}"
+        )
+        for name in scenarios:
+            fresh = runs['per_request']['scenarios'][name]
+            reused = runs['configured']['scenarios'][name]
+            self.stdout.write(
+                f"{name:<20}{fresh['p50_ms']:>14.2f}{reused['p50_ms']:>12.2f}"
+                f"{fresh['p95_ms']:>14.2f}{reused['p95_ms']:>12.2f}"
+                f"{fresh['mean_ms'] - reused['mean_ms']:>9.2f}ms"
+            )
+
+        if options['output']:
+            save_results(runs, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
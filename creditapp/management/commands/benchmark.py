@@ -0,0 +1,71 @@
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = "Benchmark the main API flows and report p50/p95/p99 latency and queries per request."
+
+    def add_arguments(self, parser):
+        from creditapp.benchmarks import SCENARIOS
+
+        parser.add_argument('--scenario', action='append', dest='scenarios', choices=SCENARIOS,
+                            help='Only run these scenarios (repeatable), default all.')
+        parser.add_argument('--iterations', type=int, default=50, help='Measured requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per scenario first.')
+        parser.add_argument('--user', help='Email of the user to benchmark as, default the first generated user.')
+        parser.add_argument('--output', help='Write the results as JSON to this file.')
+        parser.add_argument('--compare', help='JSON results of an earlier run to compare against.')
+        parser.add_argument('--max-regression', type=float,
+                            help='With --compare, fail if any p95 got slower by more than this many percent.')
+
+    def handle(self, *args, **options):
+        from creditapp.benchmarks import SCENARIOS, compare_results, load_results, run_benchmarks, save_results
+        from creditapp.models import User
+
+        user = None
+        if options['user']:
+            user = User.objects.filter(email=options['user']).first()
+            if user is None:
+                raise CommandError(f"No user with email {options['user']}.")
+
+        try:
+            results = run_benchmarks(
+                user=user,
+                scenarios=options['scenarios'] or SCENARIOS,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+            )
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        meta = results['meta']
+        self.stdout.write(
+            f"{meta['database']} @ {meta['revision'] or 'unknown revision'}: user {meta['user_id']}, "
+            f"{meta['customers']} customers, {meta['transactions']} transactions"
+        )
+        self.stdout.write(f"{'scenario':<20}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'queries':>10}{'errors':>8}")
+        for name, summary in results['scenarios'].items():
+            if not summary['iterations']:
+                continue
+            self.stdout.write(
+                f"{name:<20}{summary['p50_ms']:>10.2f}{summary['p95_ms']:>10.2f}{summary['p99_ms']:>10.2f}"
+                f"{summary['queries_per_request']:>10.1f}{summary['errors']:>8}"
+            )
+
+        if options['output']:
+            save_results(results, options['output'])
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['output']}."))
+
+        if options['compare']:
+            regressions = []
+            self.stdout.write(f"\n{'scenario':<20}{'p95 before':>12}{'p95 after':>12}{'change':>9}{'queries':>14}")
+            for name, before, after, change, queries_before, queries_after in compare_results(
+                load_results(options['compare']), results
+            ):
+                self.stdout.write(
+                    f"{name:<20}{before:>12.2f}{after:>12.2f}{change:>8.1f}%"
+                    f"{f'{queries_before} -> {queries_after}':>14}"
+                )
+                if options['max_regression'] is not None and change > options['max_regression']:
+                    regressions.append(name)
+            if regressions:
+                raise CommandError(f"p95 regressed by more than {options['max_regression']}% in: {', '.join(regressions)}")
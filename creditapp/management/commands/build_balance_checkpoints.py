@@ -0,0 +1,24 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Write the missing month-end balance checkpoints, starting from each customer's latest one."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200, help='Customers processed per query.')
+        parser.add_argument('--customer', type=int, action='append', dest='customers', help='Only these customer ids.')
+        parser.add_argument('--until', type=date.fromisoformat, help='Last period end to checkpoint (YYYY-MM-DD), default end of last month.')
+        parser.add_argument('--rebuild', action='store_true', help='Drop existing checkpoints and recompute them from scratch.')
+
+    def handle(self, *args, **options):
+        from creditapp.checkpoints import build_checkpoints, rebuild_checkpoints
+
+        build = rebuild_checkpoints if options['rebuild'] else build_checkpoints
+        written = build(
+            customer_ids=options['customers'],
+            until=options['until'],
+            batch_size=options['batch_size'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'Wrote {written} balance checkpoints.'))
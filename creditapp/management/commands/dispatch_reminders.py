@@ -0,0 +1,20 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Send one digest of due payment reminders per shop owner (resumes an interrupted run)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Dispatch as of this date (YYYY-MM-DD), default today.')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Reminders fetched per database round trip.')
+
+    def handle(self, *args, **options):
+        from creditapp.notifications import dispatch_reminders
+
+        run = dispatch_reminders(today=options['date'], chunk_size=options['chunk_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Reminder dispatch for {run.run_date}: {run.digests_sent} digests, '
+            f'{run.reminders_notified} reminders notified.'
+        ))
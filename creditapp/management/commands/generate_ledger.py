@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Generate synthetic users, customers, transactions and reminders for load tests (skewed distributions)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10, help='Shop owners to create.')
+        parser.add_argument('--customers', type=int, default=50, help='Mean customers per user.')
+        parser.add_argument('--transactions', type=int, default=40, help='Mean transactions per customer.')
+        parser.add_argument('--days', type=int, default=730, help='Spread transaction dates over this many past days.')
+        parser.add_argument('--alpha', type=float, default=1.5, help='Pareto shape; lower is more skewed (must be > 1).')
+        parser.add_argument('--reminder-ratio', type=float, default=0.2, help='Share of debits that get a payment reminder.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows per bulk_create.')
+        parser.add_argument('--seed', type=int, help='Random seed for a reproducible data set.')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated users and their ledgers first.')
+
+    def handle(self, *args, **options):
+        from creditapp.synthetic import clear_ledger, generate_ledger
+
+        if options['clear']:
+            self.stdout.write(f'Removed {clear_ledger()} generated users.')
+
+        counts = generate_ledger(
+            users=options['users'],
+            customers=options['customers'],
+            transactions=options['transactions'],
+            days=options['days'],
+            alpha=options['alpha'],
+            reminder_ratio=options['reminder_ratio'],
+            batch_size=options['batch_size'],
+            seed=options['seed'],
+            stdout=self.stdout if options['verbosity'] > 1 else None,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            'Generated {users} users, {customers} customers, {transactions} transactions '
+            'and {payment_reminders} payment reminders.'.format(**counts)
+        ))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 
 class Command(BaseCommand):
-    help = 'This is a test management command.'
+    help = 'List every customer with contact details.'
 
     def handle(self, *args, **kwargs):
         from creditapp.models import Customer
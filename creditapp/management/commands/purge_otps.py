@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Delete used and expired email OTPs from the database."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=5000, help='Rows deleted per query.')
+
+    def handle(self, *args, **options):
+        from creditapp.otp import purge_expired_otps
+
+        removed = purge_expired_otps(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Removed {removed} OTPs.'))
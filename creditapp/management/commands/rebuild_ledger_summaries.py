@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Rebuild the per-user dashboard summaries from the customers and transactions tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500, help='Users rebuilt per query.')
+        parser.add_argument('--user', type=int, action='append', dest='users', help='Only rebuild these user ids.')
+
+    def handle(self, *args, **options):
+        from creditapp.models import User, UserLedgerSummary
+
+        users = User.objects.order_by('id')
+        if options['users']:
+            users = users.filter(id__in=options['users'])
+
+        rebuilt = 0
+        last_id = 0
+        while True:
+            user_ids = list(users.filter(id__gt=last_id).values_list('id', flat=True)[:options['batch_size']])
+            if not user_ids:
+                break
+            last_id = user_ids[-1]
+            UserLedgerSummary.rebuild(user_ids=user_ids)
+            rebuilt += len(user_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} ledger summaries.'))
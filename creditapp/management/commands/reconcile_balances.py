@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Check stored customer balances and ledger aggregates against the transaction and reminder tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true', help='Recompute the aggregates of drifted customers from the ledger.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Customers checked per query.')
+        parser.add_argument('--customer', type=int, action='append', dest='customers', help='Only check these customer ids.')
+
+    def handle(self, *args, **options):
+        from creditapp.models import Customer
+        from creditapp.versions import bump_ledger_versions
+
+        batch_size = options['batch_size']
+        fields = Customer.AGGREGATE_FIELDS
+        customers = Customer.objects.all()
+        if options['customers']:
+            customers = customers.filter(id__in=options['customers'])
+
+        # One query per batch computing every aggregate, walking the table by primary key
+        customers = customers.annotate(**{
+            f'ledger_{field}': expression for field, expression in Customer.aggregate_expressions().items()
+        }).order_by('id')
+        columns = ['id', 'user_id', *fields, *(f'ledger_{field}' for field in fields)]
+
+        checked = 0
+        drifted = []
+        last_id = 0
+        while True:
+            batch = list(customers.filter(id__gt=last_id).values(*columns)[:batch_size])
+            if not batch:
+                break
+            last_id = batch[-1]['id']
+            checked += len(batch)
+
+            mismatches = []
+            for row in batch:
+                stale = [field for field in fields if row[field] != row[f'ledger_{field}']]
+                if not stale:
+                    continue
+                for field in stale:
+                    self.stdout.write(self.style.WARNING(
+                        f"Customer {row['id']}: stored {field} {row[field]}, ledger {field} {row[f'ledger_{field}']}"
+                    ))
+                mismatches.append(row)
+            if mismatches and options['fix']:
+                # Recomputed in the UPDATE itself rather than written back from the values
+                # read above, which would undo writes that landed in between
+                Customer.rebuild_aggregates(customer_ids=[row['id'] for row in mismatches])
+                bump_ledger_versions(row['user_id'] for row in mismatches)
+            drifted.extend(mismatches)
+
+        if drifted and not options['fix']:
+            self.stdout.write(self.style.ERROR(f'{len(drifted)} of {checked} customers have drifted. Re-run with --fix to repair.'))
+        elif drifted:
+            self.stdout.write(self.style.SUCCESS(f'Repaired {len(drifted)} of {checked} customers.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'All {checked} customer balances and aggregates match the ledger.'))
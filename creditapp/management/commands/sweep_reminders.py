@@ -0,0 +1,18 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand
+
+
+class Command(BaseCommand):
+    help = "Move pending payment reminders into their overdue / due today / upcoming buckets."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=date.fromisoformat, help='Sweep as of this date (YYYY-MM-DD), default today.')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Reminders moved per UPDATE.')
+
+    def handle(self, *args, **options):
+        from creditapp.reminders import sweep_reminders
+
+        counts = sweep_reminders(today=options['date'], batch_size=options['batch_size'])
+        summary = ', '.join(f'{bucket}: {count}' for bucket, count in counts.items())
+        self.stdout.write(self.style.SUCCESS(f'Reminder sweep finished ({summary}).'))
@@ -0,0 +1,183 @@
+"""
+Per-view request metrics.
+
+``PerformanceMiddleware`` (creditapp/middleware.py) fills a RequestMetrics
+for every request and adds it to the process-wide ``registry``, which
+renders the Prometheus text format served by ``/api/metrics/``. Counters are
+per process; scrape every worker (or sum them) when running several.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Upper bounds (seconds) of the request duration histogram
+DURATION_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+current_request_metrics = ContextVar('current_request_metrics', default=None)
+_serializing = ContextVar('serializing', default=False)
+
+
+class RequestMetrics:
+    """What one request cost: wall time, queries, serializer time and response size."""
+    __slots__ = ('view', 'method', 'started', 'duration', 'queries', 'query_time',
+                 'serializer_time', 'response_bytes', 'status_code')
+
+    def __init__(self, method):
+        self.view = None
+        self.method = method
+        self.started = time.perf_counter()
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+        self.status_code = None
+
+    def __call__(self, execute, sql, params, many, context):
+        # connection.execute_wrapper hook
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.query_time += time.perf_counter() - start
+            self.queries += 1
+
+    def as_dict(self):
+        return {
+            'view': self.view,
+            'method': self.method,
+            'status': self.status_code,
+            'duration_ms': round(self.duration * 1000, 2),
+            'db_queries': self.queries,
+            'db_time_ms': round(self.query_time * 1000, 2),
+            'serializer_time_ms': round(self.serializer_time * 1000, 2),
+            'response_bytes': self.response_bytes,
+        }
+
+
+@contextmanager
+def serializer_timer():
+    """Add the time spent inside the block to the current request's serializer time."""
+    metrics = current_request_metrics.get()
+    if metrics is None or _serializing.get():
+        # Not in a request, or already inside a timed (outer) serializer
+        yield
+        return
+    token = _serializing.set(True)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.serializer_time += time.perf_counter() - start
+        _serializing.reset(token)
+
+
+class TimedSerializerMixin:
+    """Count the time spent in to_representation() as serializer time; nested serializers are not counted twice."""
+
+    def to_representation(self, instance):
+        with serializer_timer():
+            return super().to_representation(instance)
+
+
+class _ViewStats:
+    __slots__ = ('count', 'slow', 'duration', 'queries', 'query_time', 'serializer_time',
+                 'response_bytes', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.slow = 0
+        self.duration = 0.0
+        self.queries = 0
+        self.query_time = 0.0
+        self.serializer_time = 0.0
+        self.response_bytes = 0
+        self.buckets = [0] * (len(DURATION_BUCKETS) + 1)
+
+
+class MetricsRegistry:
+    """Process-local aggregates of RequestMetrics keyed by (view, method, status)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    def record(self, metrics, slow=False):
+        key = (metrics.view or 'unresolved', metrics.method, str(metrics.status_code))
+        bucket = bisect_left(DURATION_BUCKETS, metrics.duration)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = _ViewStats()
+            stats.count += 1
+            stats.slow += bool(slow)
+            stats.duration += metrics.duration
+            stats.queries += metrics.queries
+            stats.query_time += metrics.query_time
+            stats.serializer_time += metrics.serializer_time
+            stats.response_bytes += metrics.response_bytes
+            stats.buckets[bucket] += 1
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+    def render(self, extra=()):
+        """Prometheus text exposition of every counter, plus ``extra`` (name, help, type, value) gauges."""
+        with self._lock:
+            stats = [(key, _copy(value)) for key, value in sorted(self._stats.items())]
+
+        lines = []
+
+        def family(name, help_text, kind, samples):
+            lines.append(f'# HELP {name} {help_text}')
+            lines.append(f'# TYPE {name} {kind}')
+            lines.extend(samples)
+
+        def labels(key, **more):
+            view, method, status = key
+            pairs = {'view': view, 'method': method, 'status': status, **more}
+            return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs.items()) + '}'
+
+        histogram = []
+        for key, value in stats:
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS + ('+Inf',), value.buckets):
+                cumulative += count
+                histogram.append(f'creditapp_request_duration_seconds_bucket{labels(key, le=bound)} {cumulative}')
+            histogram.append(f'creditapp_request_duration_seconds_sum{labels(key)} {value.duration:.6f}')
+            histogram.append(f'creditapp_request_duration_seconds_count{labels(key)} {value.count}')
+        family('creditapp_request_duration_seconds', 'Wall time of requests per view.', 'histogram', histogram)
+
+        counters = [
+            ('creditapp_request_db_queries_total', 'Database queries run by requests per view.', 'queries', '{}'),
+            ('creditapp_request_db_seconds_total', 'Time spent in database queries per view.', 'query_time', '{:.6f}'),
+            ('creditapp_request_serializer_seconds_total', 'Time spent in serializers per view.', 'serializer_time', '{:.6f}'),
+            ('creditapp_response_bytes_total', 'Response body bytes per view.', 'response_bytes', '{}'),
+            ('creditapp_slow_requests_total', 'Requests over the configured slow thresholds per view.', 'slow', '{}'),
+        ]
+        for name, help_text, attribute, number in counters:
+            family(name, help_text, 'counter', [
+                f'{name}{labels(key)} {number.format(getattr(value, attribute))}' for key, value in stats
+            ])
+
+        for name, help_text, kind, value in extra:
+            family(name, help_text, kind, [f'{name} {value}'])
+        return '\n'.join(lines) + '\n'
+
+
+def _copy(stats):
+    copy = _ViewStats()
+    for field in _ViewStats.__slots__:
+        value = getattr(stats, field)
+        setattr(copy, field, list(value) if isinstance(value, list) else value)
+    return copy
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = MetricsRegistry()
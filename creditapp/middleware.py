@@ -0,0 +1,153 @@
+"""
+Request-level performance instrumentation.
+
+PerformanceMiddleware measures, per request, the wall time, the number of
+database queries and the time spent in them (via ``execute_wrapper`` on
+every configured connection), the serializer time (TimedSerializerMixin)
+and the response size. Each request is added to the Prometheus registry in
+creditapp.metrics, written as one JSON log line to the
+``creditapp.performance`` logger and summarised in a ``Server-Timing``
+header. Requests over the slow thresholds are logged at WARNING.
+
+Streaming responses (exports, statements) are measured until the last
+chunk has been sent, so queries run while streaming are included.
+
+ReplicaRoutingMiddleware sets up read-replica routing per request; see
+creditapp/routers.py.
+"""
+import json
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from .metrics import RequestMetrics, current_request_metrics, registry
+from .routers import RoutingState, request_state, pin_to_primary
+
+logger = logging.getLogger('creditapp.performance')
+
+
+def _view_name(view_func):
+    view_class = getattr(view_func, 'view_class', None) or getattr(view_func, 'cls', None)
+    if view_class is not None:
+        return view_class.__name__
+    return getattr(view_func, '__name__', view_func.__class__.__name__)
+
+
+class PerformanceMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, 'PERFORMANCE_METRICS_ENABLED', True)
+        self.slow_ms = getattr(settings, 'PERFORMANCE_SLOW_REQUEST_MS', 500)
+        self.slow_queries = getattr(settings, 'PERFORMANCE_SLOW_QUERY_COUNT', 50)
+        self.slow_ms_by_view = getattr(settings, 'PERFORMANCE_SLOW_VIEW_MS', {})
+
+    def __call__(self, request):
+        if not self.enabled:
+            return self.get_response(request)
+
+        metrics = RequestMetrics(request.method)
+        request._performance_metrics = metrics
+        token = current_request_metrics.set(metrics)
+        try:
+            with self._query_wrappers(metrics):
+                response = self.get_response(request)
+        finally:
+            current_request_metrics.reset(token)
+
+        metrics.status_code = response.status_code
+        if response.streaming:
+            response.streaming_content = self._measure_stream(response.streaming_content, metrics)
+        else:
+            metrics.response_bytes = len(response.content)
+            self._finish(metrics, response)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        metrics = getattr(request, '_performance_metrics', None)
+        if metrics is not None:
+            metrics.view = _view_name(view_func)
+
+    @staticmethod
+    def _query_wrappers(metrics):
+        stack = ExitStack()
+        for alias in connections:
+            stack.enter_context(connections[alias].execute_wrapper(metrics))
+        return stack
+
+    def _measure_stream(self, chunks, metrics):
+        token = current_request_metrics.set(metrics)
+        try:
+            with self._query_wrappers(metrics):
+                for chunk in chunks:
+                    metrics.response_bytes += len(chunk)
+                    yield chunk
+        finally:
+            current_request_metrics.reset(token)
+            self._finish(metrics)
+
+    def is_slow(self, metrics):
+        limit_ms = self.slow_ms_by_view.get(metrics.view, self.slow_ms)
+        return metrics.duration * 1000 >= limit_ms or metrics.queries >= self.slow_queries
+
+    def _finish(self, metrics, response=None):
+        metrics.duration = time.perf_counter() - metrics.started
+        slow = self.is_slow(metrics)
+        registry.record(metrics, slow=slow)
+
+        if response is not None:
+            response['Server-Timing'] = (
+                f'db;desc="{metrics.queries} queries";dur={metrics.query_time * 1000:.1f}, '
+                f'serializer;dur={metrics.serializer_time * 1000:.1f}, '
+                f'total;dur={metrics.duration * 1000:.1f}'
+            )
+
+        line = metrics.as_dict()
+        line['slow'] = slow
+        if slow:
+            logger.warning(json.dumps(line))
+        elif logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps(line))
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Give each request its own replica routing state (creditapp.routers) and
+    pin the user to the primary after a request that wrote to the database.
+    Streaming responses keep the state until the last chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        state = RoutingState()
+        token = request_state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            request_state.reset(token)
+
+        if response.streaming:
+            response.streaming_content = self._stream(response.streaming_content, request, state)
+        else:
+            self._pin_after_write(request, state)
+        return response
+
+    def _stream(self, chunks, request, state):
+        token = request_state.set(state)
+        try:
+            yield from chunks
+        finally:
+            request_state.reset(token)
+            self._pin_after_write(request, state)
+
+    @staticmethod
+    def _pin_after_write(request, state):
+        user = getattr(request, 'user', None)
+        if user is None or not user.is_authenticated:
+            return
+        if state.wrote or request.method not in ('GET', 'HEAD', 'OPTIONS'):
+            pin_to_primary(user.pk)
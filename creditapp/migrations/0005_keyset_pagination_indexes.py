@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0004_alter_pendinguser_address_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='creditapp_c_user_id_fecf22_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentreminder',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='creditapp_p_custome_259172_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'created_at', 'id'], name='creditapp_t_custome_bf0547_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['created_at', 'id'], name='creditapp_t_created_bf4542_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:36
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0005_keyset_pagination_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLedgerSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('total_customers', models.IntegerField(default=0)),
+                ('total_credit_transactions', models.IntegerField(default=0)),
+                ('total_debit_transactions', models.IntegerField(default=0)),
+                ('total_credit_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('total_debit_amount', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_summary', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+    ]
@@ -0,0 +1,99 @@
+from django.db import migrations
+from django.db.utils import OperationalError
+
+SQLITE_SEARCH_TABLE = 'creditapp_transaction_search'
+
+SQLITE_FORWARD = [
+    f"""CREATE VIRTUAL TABLE {SQLITE_SEARCH_TABLE}
+        USING fts5(customer_name, description, tokenize = 'trigram')""",
+    f"""INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, customer_name, description)
+        SELECT t.id, c.name, t.description
+        FROM creditapp_transaction t JOIN creditapp_customer c ON c.id = t.customer_id""",
+    f"""CREATE TRIGGER creditapp_transaction_search_ai AFTER INSERT ON creditapp_transaction BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, customer_name, description)
+        VALUES (new.id, (SELECT name FROM creditapp_customer WHERE id = new.customer_id), new.description);
+    END""",
+    f"""CREATE TRIGGER creditapp_transaction_search_au
+        AFTER UPDATE OF customer_id, description ON creditapp_transaction BEGIN
+        UPDATE {SQLITE_SEARCH_TABLE}
+        SET customer_name = (SELECT name FROM creditapp_customer WHERE id = new.customer_id),
+            description = new.description
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER creditapp_transaction_search_ad AFTER DELETE ON creditapp_transaction BEGIN
+        DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER creditapp_customer_search_au AFTER UPDATE OF name ON creditapp_customer BEGIN
+        UPDATE {SQLITE_SEARCH_TABLE} SET customer_name = new.name
+        WHERE rowid IN (SELECT id FROM creditapp_transaction WHERE customer_id = new.id);
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS creditapp_customer_search_au",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_ad",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_au",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_ai",
+    f"DROP TABLE IF EXISTS {SQLITE_SEARCH_TABLE}",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX IF NOT EXISTS creditapp_customer_name_trgm ON creditapp_customer USING gin (name gin_trgm_ops)",
+    "CREATE INDEX IF NOT EXISTS creditapp_transaction_description_trgm "
+    "ON creditapp_transaction USING gin (description gin_trgm_ops)",
+]
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS creditapp_transaction_description_trgm",
+    "DROP INDEX IF EXISTS creditapp_customer_name_trgm",
+]
+
+MYSQL_FORWARD = [
+    "ALTER TABLE creditapp_customer ADD FULLTEXT INDEX creditapp_customer_name_ft (name) WITH PARSER ngram",
+    "ALTER TABLE creditapp_transaction ADD FULLTEXT INDEX creditapp_transaction_description_ft (description) WITH PARSER ngram",
+]
+MYSQL_BACKWARD = [
+    "ALTER TABLE creditapp_transaction DROP INDEX creditapp_transaction_description_ft",
+    "ALTER TABLE creditapp_customer DROP INDEX creditapp_customer_name_ft",
+]
+
+STATEMENTS = {
+    'sqlite': (SQLITE_FORWARD, SQLITE_BACKWARD),
+    'postgresql': (POSTGRES_FORWARD, POSTGRES_BACKWARD),
+    'mysql': (MYSQL_FORWARD, MYSQL_BACKWARD),
+}
+
+
+def _run(schema_editor, forward):
+    statements = STATEMENTS.get(schema_editor.connection.vendor)
+    if not statements:
+        return
+    for statement in statements[0 if forward else 1]:
+        schema_editor.execute(statement)
+
+
+def create_search_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        # FTS5 (with the trigram tokenizer, SQLite >= 3.34) is optional; the
+        # search backend falls back to LIKE when the table is missing.
+        try:
+            with schema_editor.connection.cursor() as cursor:
+                cursor.execute("CREATE VIRTUAL TABLE temp.creditapp_fts_probe USING fts5(x, tokenize = 'trigram')")
+                cursor.execute("DROP TABLE temp.creditapp_fts_probe")
+        except OperationalError:
+            return
+    _run(schema_editor, forward=True)
+
+
+def drop_search_indexes(apps, schema_editor):
+    _run(schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0006_userledgersummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_indexes, drop_search_indexes),
+    ]
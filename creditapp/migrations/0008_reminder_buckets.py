@@ -0,0 +1,66 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:40
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def assign_initial_buckets(apps, schema_editor):
+    PaymentReminder = apps.get_model('creditapp', 'PaymentReminder')
+    today = timezone.localdate()
+    pending = PaymentReminder.objects.filter(status='pending')
+    pending.filter(reminder_date__lt=today).update(bucket='overdue')
+    pending.filter(reminder_date=today).update(bucket='due_today')
+    PaymentReminder.objects.exclude(status='pending').update(bucket='settled')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0007_transaction_search_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderSweep',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+                ('overdue', models.IntegerField(default=0)),
+                ('due_today', models.IntegerField(default=0)),
+                ('upcoming', models.IntegerField(default=0)),
+                ('settled', models.IntegerField(default=0)),
+                ('newly_due', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='paymentreminder',
+            name='bucket',
+            field=models.CharField(choices=[('upcoming', 'Upcoming'), ('due_today', 'Due Today'), ('overdue', 'Overdue'), ('settled', 'Settled')], default='upcoming', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='userledgersummary',
+            name='due_today_reminders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userledgersummary',
+            name='overdue_reminders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='userledgersummary',
+            name='upcoming_reminders',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='paymentreminder',
+            index=models.Index(fields=['customer', 'status', 'bucket', 'reminder_date'], name='creditapp_p_custome_96b278_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='paymentreminder',
+            index=models.Index(fields=['status', 'bucket', 'reminder_date'], name='creditapp_p_status_bf2e5f_idx'),
+        ),
+        migrations.RunPython(assign_initial_buckets, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:41
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0008_reminder_buckets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReminderDispatchRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField(unique=True)),
+                ('last_user_id', models.BigIntegerField(default=0)),
+                ('digests_sent', models.IntegerField(default=0)),
+                ('reminders_notified', models.IntegerField(default=0)),
+                ('started_at', models.DateTimeField(auto_now_add=True)),
+                ('finished_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ReminderDigest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('run_date', models.DateField()),
+                ('reminder_count', models.IntegerField(default=0)),
+                ('channels', models.CharField(blank=True, default='', max_length=100)),
+                ('sent_at', models.DateTimeField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reminder_digests', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'run_date')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0009_reminder_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BalanceCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_end', models.DateField()),
+                ('credit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('debit_total', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('balance', models.DecimalField(decimal_places=2, default=0.0, max_digits=14)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='balance_checkpoints', to='creditapp.customer')),
+            ],
+            options={
+                'unique_together': {('customer', 'period_end')},
+            },
+        ),
+    ]
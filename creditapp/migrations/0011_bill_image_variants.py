@@ -0,0 +1,20 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:53
+
+from django.db import migrations, models
+
+from ._search_triggers import without_search_triggers
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0010_balance_checkpoints'),
+    ]
+
+    operations = without_search_triggers(
+        migrations.AddField(
+            model_name='transaction',
+            name='bill_image_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    )
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-17 17:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0011_bill_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='emailotp',
+            index=models.Index(fields=['email', 'otp', 'is_used', 'created_at'], name='creditapp_e_email_d93225_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='emailotp',
+            index=models.Index(fields=['created_at'], name='creditapp_e_created_38f9b9_idx'),
+        ),
+    ]
@@ -0,0 +1,94 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:02
+
+from django.db import migrations, models
+from django.db.models import Case, Count, DecimalField, F, Max, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+from ._search_triggers import without_search_triggers
+
+
+def backfill_aggregates(apps, schema_editor):
+    Customer = apps.get_model('creditapp', 'Customer')
+    Transaction = apps.get_model('creditapp', 'Transaction')
+    PaymentReminder = apps.get_model('creditapp', 'PaymentReminder')
+    money = DecimalField(max_digits=14, decimal_places=2)
+
+    def per_customer(queryset, aggregate, output_field):
+        rows = queryset.filter(customer=OuterRef('pk')).order_by().values('customer')
+        return Subquery(rows.annotate(value=aggregate).values('value'), output_field=output_field)
+
+    signed = Case(When(transaction_type='credit', then=F('amount')), default=-F('amount'), output_field=money)
+    aggregates = {
+        'account_balance': Coalesce(per_customer(Transaction.objects, Sum(signed), money), Value(0), output_field=money),
+        'credit_total': Coalesce(
+            per_customer(Transaction.objects.filter(transaction_type='credit'), Sum('amount'), money), Value(0), output_field=money
+        ),
+        'debit_total': Coalesce(
+            per_customer(Transaction.objects.filter(transaction_type='debit'), Sum('amount'), money), Value(0), output_field=money
+        ),
+        'last_activity': per_customer(Transaction.objects, Max('date'), models.DateField()),
+        'overdue_reminder_count': Coalesce(
+            per_customer(PaymentReminder.objects.filter(status='pending', bucket='overdue'), Count('id'), models.IntegerField()),
+            Value(0),
+        ),
+    }
+    # In id ranges, so no single UPDATE holds the whole table
+    ids = list(Customer.objects.order_by('id').values_list('id', flat=True))
+    for start in range(0, len(ids), 5000):
+        Customer.objects.filter(id__in=ids[start:start + 5000]).update(**aggregates)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0012_emailotp_indexes'),
+    ]
+
+    operations = without_search_triggers(
+        migrations.AddField(
+            model_name='customer',
+            name='credit_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='debit_total',
+            field=models.DecimalField(decimal_places=2, default=0.0, max_digits=14),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='last_activity',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='customer',
+            name='overdue_reminder_count',
+            field=models.IntegerField(default=0),
+        ),
+    ) + [
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'account_balance'], name='creditapp_c_user_id_5266e5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'credit_total'], name='creditapp_c_user_id_7a875b_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'debit_total'], name='creditapp_c_user_id_1bc041_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'last_activity'], name='creditapp_c_user_id_fa333a_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='customer',
+            index=models.Index(fields=['user', 'overdue_reminder_count'], name='creditapp_c_user_id_3a771c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['customer', 'date'], name='creditapp_t_custome_59a268_idx'),
+        ),
+        migrations.RunPython(backfill_aggregates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-17 18:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0013_customer_ledger_aggregates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='reminderdigest',
+            name='attempts',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='reminderdigest',
+            name='claimed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,53 @@
+from django.db import migrations
+from django.db.models import Count, IntegerField, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def assign_reminder_customers(apps, schema_editor):
+    """
+    Reminders created for a transaction before PaymentReminder.save filled in
+    the customer have none, so customer-scoped lists, counts and the digest
+    dispatch never saw them. Take it from the transaction and recount what
+    the stored reminder counts of those customers and owners were missing.
+    """
+    PaymentReminder = apps.get_model('creditapp', 'PaymentReminder')
+    Customer = apps.get_model('creditapp', 'Customer')
+    Transaction = apps.get_model('creditapp', 'Transaction')
+    UserLedgerSummary = apps.get_model('creditapp', 'UserLedgerSummary')
+
+    orphans = PaymentReminder.objects.filter(customer__isnull=True, transaction__isnull=False)
+    customer_ids = set(orphans.values_list('transaction__customer_id', flat=True).distinct())
+    if not customer_ids:
+        return
+    orphans.update(customer_id=Subquery(Transaction.objects.filter(pk=OuterRef('transaction_id')).values('customer_id')))
+
+    def count(queryset, outer):
+        rows = queryset.filter(**{outer: OuterRef('pk')}).order_by().values(outer)
+        return Coalesce(Subquery(rows.annotate(n=Count('id')).values('n')), Value(0), output_field=IntegerField())
+
+    pending = PaymentReminder.objects.filter(status='pending')
+    Customer.objects.filter(pk__in=customer_ids).update(
+        overdue_reminder_count=count(pending.filter(bucket='overdue'), 'customer')
+    )
+    user_ids = set(Customer.objects.filter(pk__in=customer_ids).values_list('user_id', flat=True))
+    UserLedgerSummary.objects.filter(user_id__in=user_ids).update(**{
+        f'{bucket}_reminders': Coalesce(
+            Subquery(
+                pending.filter(bucket=bucket, customer__user_id=OuterRef('user_id')).order_by()
+                .values('customer__user_id').annotate(n=Count('id')).values('n')
+            ),
+            Value(0), output_field=IntegerField(),
+        )
+        for bucket in ('overdue', 'due_today', 'upcoming')
+    })
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0014_reminder_digest_claims'),
+    ]
+
+    operations = [
+        migrations.RunPython(assign_reminder_customers, migrations.RunPython.noop),
+    ]
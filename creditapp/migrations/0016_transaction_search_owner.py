@@ -0,0 +1,80 @@
+from importlib import import_module
+
+from django.db import migrations
+
+_search = import_module('creditapp.migrations.0007_transaction_search_indexes')
+
+SQLITE_SEARCH_TABLE = _search.SQLITE_SEARCH_TABLE
+
+# Each row also carries the owner as a '<user id>' token, so a search can be
+# limited to one user inside the FTS match instead of after it
+OWNER = "'<' || {customer}.user_id || '>'"
+
+SQLITE_FORWARD = [
+    *[statement for statement in _search.SQLITE_BACKWARD if statement.startswith('DROP TRIGGER')],
+    f"DROP TABLE {SQLITE_SEARCH_TABLE}",
+    f"""CREATE VIRTUAL TABLE {SQLITE_SEARCH_TABLE}
+        USING fts5(customer_name, description, owner, tokenize = 'trigram')""",
+    f"""INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, customer_name, description, owner)
+        SELECT t.id, c.name, t.description, {OWNER.format(customer='c')}
+        FROM creditapp_transaction t JOIN creditapp_customer c ON c.id = t.customer_id""",
+    f"""CREATE TRIGGER creditapp_transaction_search_ai AFTER INSERT ON creditapp_transaction BEGIN
+        INSERT INTO {SQLITE_SEARCH_TABLE} (rowid, customer_name, description, owner)
+        SELECT new.id, c.name, new.description, {OWNER.format(customer='c')}
+        FROM creditapp_customer c WHERE c.id = new.customer_id;
+    END""",
+    f"""CREATE TRIGGER creditapp_transaction_search_au
+        AFTER UPDATE OF customer_id, description ON creditapp_transaction BEGIN
+        UPDATE {SQLITE_SEARCH_TABLE}
+        SET customer_name = (SELECT name FROM creditapp_customer WHERE id = new.customer_id),
+            owner = (SELECT {OWNER.format(customer='c')} FROM creditapp_customer c WHERE c.id = new.customer_id),
+            description = new.description
+        WHERE rowid = new.id;
+    END""",
+    f"""CREATE TRIGGER creditapp_transaction_search_ad AFTER DELETE ON creditapp_transaction BEGIN
+        DELETE FROM {SQLITE_SEARCH_TABLE} WHERE rowid = old.id;
+    END""",
+    f"""CREATE TRIGGER creditapp_customer_search_au AFTER UPDATE OF name, user_id ON creditapp_customer BEGIN
+        UPDATE {SQLITE_SEARCH_TABLE} SET customer_name = new.name, owner = {OWNER.format(customer='new')}
+        WHERE rowid IN (SELECT id FROM creditapp_transaction WHERE customer_id = new.id);
+    END""",
+]
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS creditapp_customer_search_au",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_ad",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_au",
+    "DROP TRIGGER IF EXISTS creditapp_transaction_search_ai",
+    f"DROP TABLE IF EXISTS {SQLITE_SEARCH_TABLE}",
+    *_search.SQLITE_FORWARD,
+]
+
+
+def _run(schema_editor, statements):
+    # Only where 0007 could create the FTS table; other databases are unchanged
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_SEARCH_TABLE])
+        if cursor.fetchone() is None:
+            return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def add_search_owner(apps, schema_editor):
+    _run(schema_editor, SQLITE_FORWARD)
+
+
+def remove_search_owner(apps, schema_editor):
+    _run(schema_editor, SQLITE_BACKWARD)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('creditapp', '0015_reminder_customer_backfill'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_search_owner, remove_search_owner),
+    ]
@@ -0,0 +1,47 @@
+"""
+SQLite rebuilds a table to alter it, and the FTS triggers (0007, replaced in 0016) refer to
+creditapp_transaction and creditapp_customer, which makes the rebuild fail.
+Wrap schema changes to either table in ``without_search_triggers`` so the
+triggers are dropped first and recreated afterwards (the search table keeps
+its rows; the rebuild preserves ids).
+"""
+from importlib import import_module
+
+from django.db import migrations
+
+
+def _statements(module):
+    search = import_module(f'creditapp.migrations.{module}')
+    triggers = [statement for statement in search.SQLITE_FORWARD if statement.startswith('CREATE TRIGGER')]
+    drops = [statement for statement in search.SQLITE_BACKWARD if statement.startswith('DROP TRIGGER')]
+    return search.SQLITE_SEARCH_TABLE, triggers, drops
+
+
+def _search_table_exists(schema_editor, table):
+    if schema_editor.connection.vendor != 'sqlite':
+        return False
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [table])
+        return cursor.fetchone() is not None
+
+
+def _executor(statements, table):
+    def run(apps, schema_editor):
+        if _search_table_exists(schema_editor, table):
+            for statement in statements:
+                schema_editor.execute(statement)
+    return run
+
+
+def without_search_triggers(*operations, module='0007_transaction_search_indexes'):
+    """
+    ``module`` is the migration whose triggers are current at this point of
+    the history (0016_transaction_search_owner for migrations after it).
+    """
+    table, triggers, drops = _statements(module)
+    drop, create = _executor(drops, table), _executor(triggers, table)
+    return [
+        migrations.RunPython(drop, create),
+        *operations,
+        migrations.RunPython(create, drop),
+    ]
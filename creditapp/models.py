@@ -1,14 +1,58 @@
-from django.db import models
+from django.conf import settings
+from django.db import connections, models, transaction
 from django.contrib.auth.models import AbstractBaseUser, BaseUserManager, PermissionsMixin
-from django.core.files.storage import default_storage
 import os
 import uuid
-from django.db.models.signals import  post_delete
+from django.db.models.signals import  post_delete, post_save
 from django.dispatch import receiver
-from django.db.models import F, Sum, Case, When, DecimalField
+from django.db.models import F, Q, Sum, Max, Count, Case, When, Value, DecimalField, Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from django.utils.functional import cached_property
 from django.utils import timezone
+from collections import defaultdict
+from contextlib import contextmanager
+from decimal import Decimal
+from datetime import date
 import random
+import threading
+
+from .versions import bump_ledger_versions
+
+_balance_maintenance = threading.local()
+
+
+@contextmanager
+def balance_maintenance_suspended():
+    """
+    Skip the per-row balance and summary updates done by the post_delete
+    receivers, e.g. while a customer's whole ledger is removed by a cascade.
+    """
+    previous = getattr(_balance_maintenance, 'suspended', False)
+    _balance_maintenance.suspended = True
+    try:
+        yield
+    finally:
+        _balance_maintenance.suspended = previous
+
+
+def balance_maintenance_enabled():
+    return not getattr(_balance_maintenance, 'suspended', False)
+
+
+def signed_amount_sum(prefix=''):
+    """
+    Sum of transaction amounts as they affect a balance (credits add, debits
+    subtract). ``prefix`` lets callers aggregate across a relation,
+    e.g. ``signed_amount_sum('transactions__')`` on a Customer queryset.
+    """
+    return Sum(
+        Case(
+            When(**{f'{prefix}transaction_type': 'credit'}, then=F(f'{prefix}amount')),
+            When(**{f'{prefix}transaction_type': 'debit'}, then=-F(f'{prefix}amount')),
+            default=0,
+            output_field=DecimalField()
+        )
+    )
 
 # Custom User Manager
 class UserManager(BaseUserManager):
@@ -78,11 +122,19 @@ class EmailOTP(models.Model):
     is_used = models.BooleanField(default=False)
 
     def is_expired(self):
-        return timezone.now() > self.created_at + timezone.timedelta(minutes=10)
+        return timezone.now() > self.created_at + timezone.timedelta(seconds=getattr(settings, 'OTP_TTL_SECONDS', 600))
 
     @staticmethod
     def generate_otp():
         return f"{random.randint(100000, 999999)}"
+
+    class Meta:
+        indexes = [
+            # Verification lookup of DatabaseOTPStore (creditapp/otp.py)
+            models.Index(fields=['email', 'otp', 'is_used', 'created_at']),
+            # purge_expired_otps
+            models.Index(fields=['created_at']),
+        ]
     
 
 class PendingUser(models.Model):
@@ -112,46 +164,147 @@ class Customer(models.Model):
     email = models.EmailField(null=True, blank=True)
     address = models.TextField()
     account_balance = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
+    # Ledger aggregates for sorting and filtering the customer list, kept up to
+    # date by apply_ledger_changes() and the reminder write paths
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # Date of the latest transaction
+    last_activity = models.DateField(null=True, blank=True)
+    # Pending reminders in the overdue bucket (as of the last reminder sweep)
+    overdue_reminder_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    AGGREGATE_FIELDS = ['account_balance', 'credit_total', 'debit_total', 'last_activity', 'overdue_reminder_count']
+
     def __str__(self):
         return self.name
 
-    @cached_property
+    @property
     def total_credit(self):
-        return self.transactions.filter(transaction_type='credit').aggregate(total=Sum('amount'))['total'] or 0
+        return self.credit_total
 
-    @cached_property
+    @property
     def total_debit(self):
-        return self.transactions.filter(transaction_type='debit').aggregate(total=Sum('amount'))['total'] or 0
+        return self.debit_total
 
     @cached_property
     def current_balance(self):
-        # Using annotate for more efficient calculation
-        balance = self.transactions.aggregate(
-            balance=Sum(
-                Case(
-                    When(transaction_type='credit', then=F('amount')),
-                    When(transaction_type='debit', then=-F('amount')),
-                    default=0,
-                    output_field=DecimalField()
-                )
-            )
-        )['balance'] or 0
+        # Full re-aggregation; the write path keeps account_balance up to date
+        # incrementally, this is only used for reconciliation.
+        balance = self.transactions.aggregate(balance=signed_amount_sum())['balance'] or 0
         return balance
 
+    def balance_as_of(self, as_of):
+        """Credit, debit and balance of every transaction dated on or before ``as_of``."""
+        from .checkpoints import totals_as_of
+        return totals_as_of(self.pk, as_of)
+
     def update_account_balance(self):
-        self.account_balance = self.current_balance
-        self.save(update_fields=['account_balance'])
-        if self.account_balance >= 0:
-            self.payment_reminders.filter(status='pending').update(status='paid')
+        """Recompute the balance and the other ledger aggregates from scratch."""
+        Customer.rebuild_aggregates(customer_ids=[self.pk])
+        self.refresh_from_db(fields=self.AGGREGATE_FIELDS)
+        bump_ledger_versions([self.user_id])
+        if self.account_balance >= 0 and PaymentReminder.objects.filter(customer=self, status='pending').exists():
+            from .tasks import enqueue, settle_customer_reminders
+            enqueue(settle_customer_reminders, self.pk)
+
+    @staticmethod
+    def has_pending_reminders():
+        """Whether the customer has pending reminders, as an annotation."""
+        return Exists(PaymentReminder.objects.filter(customer=OuterRef('pk'), status='pending'))
+
+    @staticmethod
+    def aggregate_expressions():
+        """
+        {field: expression} computing every AGGREGATE_FIELDS value of a
+        customer from the transactions and reminders tables, as correlated
+        subqueries (joining both tables would multiply the rows).
+        """
+        def per_customer(queryset, aggregate, output_field, default):
+            rows = queryset.filter(customer=OuterRef('pk')).order_by().values('customer')
+            value = Subquery(rows.annotate(value=aggregate).values('value'), output_field=output_field)
+            return value if default is None else Coalesce(value, Value(default), output_field=output_field)
+
+        money = DecimalField(max_digits=14, decimal_places=2)
+        return {
+            'account_balance': per_customer(Transaction.objects, signed_amount_sum(), money, 0),
+            'credit_total': per_customer(Transaction.objects.filter(transaction_type='credit'), Sum('amount'), money, 0),
+            'debit_total': per_customer(Transaction.objects.filter(transaction_type='debit'), Sum('amount'), money, 0),
+            'last_activity': per_customer(Transaction.objects, Max('date'), models.DateField(), None),
+            'overdue_reminder_count': per_customer(
+                PaymentReminder.objects.filter(status='pending', bucket='overdue'), Count('id'), models.IntegerField(), 0
+            ),
+        }
+
+    @classmethod
+    def rebuild_aggregates(cls, customer_ids=None, fields=None):
+        """Recompute the stored aggregates (all of AGGREGATE_FIELDS by default) with one UPDATE."""
+        expressions = cls.aggregate_expressions()
+        customers = cls.objects.all() if customer_ids is None else cls.objects.filter(pk__in=customer_ids)
+        return customers.update(**{field: expressions[field] for field in (fields or cls.AGGREGATE_FIELDS)})
+
+    @classmethod
+    def refresh_overdue_counts(cls, customer_ids):
+        if customer_ids:
+            cls.rebuild_aggregates(customer_ids=customer_ids, fields=['overdue_reminder_count'])
+
+    @classmethod
+    def apply_balance_delta(cls, customer_id, delta, credit=0, debit=0, latest_date=None, removed_date=None):
+        """
+        Shift the stored balance of a customer by ``delta`` (and the credit and
+        debit totals by ``credit`` / ``debit``) with one atomic F() update
+        instead of re-aggregating the whole transaction history.
+
+        ``latest_date`` is the newest date written, ``removed_date`` the newest
+        date removed. last_activity only has to be recomputed when a removed
+        row may have been the latest one and nothing at least as new was added.
+        Returns the new balance (None if the customer no longer exists).
+        """
+        customers = cls.objects.filter(pk=customer_id)
+        updates = {}
+        if delta:
+            updates['account_balance'] = F('account_balance') + delta
+        if credit:
+            updates['credit_total'] = F('credit_total') + credit
+        if debit:
+            updates['debit_total'] = F('debit_total') + debit
+        if removed_date is not None and (latest_date is None or latest_date < removed_date):
+            updates['last_activity'] = Case(
+                When(last_activity__lte=removed_date, then=cls.aggregate_expressions()['last_activity']),
+                default=F('last_activity'),
+            )
+        elif latest_date is not None:
+            updates['last_activity'] = Case(
+                When(Q(last_activity__isnull=True) | Q(last_activity__lt=latest_date), then=Value(latest_date)),
+                default=F('last_activity'),
+            )
+        if updates:
+            customers.update(**updates)
+        row = customers.annotate(has_pending=cls.has_pending_reminders()).values_list(
+            'account_balance', 'has_pending'
+        ).first()
+        if row is None:
+            return None
+        balance, has_pending = row
+        if balance >= 0 and has_pending:
+            # Flipping pending reminders to paid happens off the request path
+            from .tasks import enqueue, settle_customer_reminders
+            enqueue(settle_customer_reminders, customer_id)
+        return balance
 
     class Meta:
         unique_together = ['user', 'contact_number']
         indexes = [
             models.Index(fields=['name']),
             models.Index(fields=['user', 'contact_number']),
+            models.Index(fields=['user', 'created_at', 'id']),
+            # ?ordering= and range filters of the customer list
+            models.Index(fields=['user', 'account_balance']),
+            models.Index(fields=['user', 'credit_total']),
+            models.Index(fields=['user', 'debit_total']),
+            models.Index(fields=['user', 'last_activity']),
+            models.Index(fields=['user', 'overdue_reminder_count']),
         ]
 
 # Transaction Model
@@ -177,46 +330,89 @@ class Transaction(models.Model):
     date = models.DateField()
     description = models.TextField(null=True, blank=True)
     bill_image = models.ImageField(upload_to=get_file_path, null=True, blank=True)
+    # Resized copies of bill_image, {"thumb_webp": name, ...}; filled in by a background task
+    bill_image_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
         return f"{self.customer.name} - {self.transaction_type} - {self.amount}"
 
+    def media_files(self):
+        """Storage names of the bill image and its variants."""
+        from .images import variant_names
+
+        if not self.bill_image:
+            return []
+        return [self.bill_image.name, *variant_names(self.bill_image_variants).values()]
+
+    @property
+    def signed_amount(self):
+        """Amount as it affects the customer's balance (credit adds, debit subtracts)."""
+        amount = Decimal(str(self.amount))
+        return amount if self.transaction_type == 'credit' else -amount
+
     def save(self, *args, **kwargs):
-        # Check if this is an update and bill_image is being replaced
-        if not self._state.adding and self.pk:
-            try:
-                old_instance = Transaction.objects.get(pk=self.pk)
-                if old_instance.bill_image and self.bill_image != old_instance.bill_image:
-                    # Delete the old image
-                    if default_storage.exists(old_instance.bill_image.path):
-                        default_storage.delete(old_instance.bill_image.path)
-            except Transaction.DoesNotExist:
-                pass
-        
-        is_new = self.pk is None
-        super().save(*args, **kwargs)
-        
-        # Update customer balance on transaction save
-        self.customer.update_account_balance()
+        from .tasks import enqueue, delete_media_files, generate_bill_image_variants
+
+        with transaction.atomic():
+            # Lock the stored row so concurrent edits each remove what the other wrote
+            old_instance = None
+            if not self._state.adding and self.pk:
+                try:
+                    old_instance = Transaction.objects.select_for_update().only(
+                        'customer_id', 'amount', 'transaction_type', 'date', 'bill_image', 'bill_image_variants'
+                    ).get(pk=self.pk)
+                except Transaction.DoesNotExist:
+                    pass
+
+            # Check if bill_image is being replaced
+            old_image = old_instance.bill_image.name if old_instance is not None and old_instance.bill_image else None
+            image_changed = (self.bill_image.name or None) != old_image
+            if image_changed:
+                # Variants of the previous image no longer apply
+                self.bill_image_variants = {}
+                if kwargs.get('update_fields') is not None:
+                    kwargs['update_fields'] = {*kwargs['update_fields'], 'bill_image_variants'}
+
+            super().save(*args, **kwargs)
+
+            if image_changed and old_image:
+                # Delete the old image and its variants once the new one is committed
+                enqueue(delete_media_files, old_instance.media_files())
+            if image_changed and self.bill_image:
+                enqueue(generate_bill_image_variants, self.pk)
+
+            # Apply only the difference this write makes to the running totals
+            removed = [old_instance] if old_instance is not None else []
+            balances = apply_ledger_changes(removed=removed, added=[self])
+            # Keep an already loaded customer in sync for the response
+            if Transaction.customer.is_cached(self) and balances.get(self.customer_id) is not None:
+                self.customer.account_balance = balances[self.customer_id]
 
     def delete(self, *args, **kwargs):
-        # Delete associated bill image if it exists
-        if self.bill_image:
-            try:
-                if default_storage.exists(self.bill_image.path):
-                    default_storage.delete(self.bill_image.path)
-            except Exception as e:
-                # Log error but continue with deletion
-                print(f"Error deleting bill image: {e}")
-        
-        super().delete(*args, **kwargs)
+        from .tasks import enqueue, delete_media_files
+
+        with transaction.atomic():
+            result = super().delete(*args, **kwargs)
+            # A concurrent or repeated delete matches no row and must not be counted again
+            if result[1].get(self._meta.label):
+                if self.customer_id and balance_maintenance_enabled():
+                    apply_ledger_changes(removed=[self])
+                # Delete associated bill image and variants once the row is gone for good
+                if self.bill_image:
+                    enqueue(delete_media_files, self.media_files())
+        return result
 
     class Meta:
         indexes = [
             models.Index(fields=['customer', 'transaction_type']),
             models.Index(fields=['date']),
             models.Index(fields=['payment_mode']),
+            # Keyset pagination on (created_at, id), per customer and across customers
+            models.Index(fields=['customer', 'created_at', 'id']),
+            models.Index(fields=['created_at', 'id']),
+            # Latest transaction date per customer (Customer.last_activity)
+            models.Index(fields=['customer', 'date']),
         ]
 
 # Payment Reminder Model
@@ -225,12 +421,21 @@ class PaymentReminder(models.Model):
         ('pending', 'Pending'),
         ("paid", "Paid"),
     )
+
+    # Stored by save() and moved forward daily by the reminder sweeper
+    BUCKET_CHOICES = (
+        ('upcoming', 'Upcoming'),
+        ('due_today', 'Due Today'),
+        ('overdue', 'Overdue'),
+        ('settled', 'Settled'),
+    )
     
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='payment_reminders', null=True, blank=True)
     transaction = models.ForeignKey(Transaction, on_delete=models.CASCADE, related_name='payment_reminders', null=True, blank=True)
     amount_due = models.DecimalField(max_digits=12, decimal_places=2)
     reminder_date = models.DateField()
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    bucket = models.CharField(max_length=10, choices=BUCKET_CHOICES, default='upcoming')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -240,16 +445,368 @@ class PaymentReminder(models.Model):
             return f"Reminder for transaction {self.transaction.id} - {self.amount_due}"
         return f"Reminder for {self.amount_due}"
 
+    @staticmethod
+    def bucket_for(status, reminder_date, today=None):
+        if status != 'pending':
+            return 'settled'
+        today = today or timezone.localdate()
+        if isinstance(reminder_date, str):
+            reminder_date = date.fromisoformat(reminder_date)
+        if reminder_date < today:
+            return 'overdue'
+        if reminder_date == today:
+            return 'due_today'
+        return 'upcoming'
+
+    def save(self, *args, **kwargs):
+        # Reminders created for a transaction are listed under its customer
+        if self.transaction_id and not self.customer_id:
+            self.customer_id = self.transaction.customer_id
+        self.bucket = self.bucket_for(self.status, self.reminder_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'bucket' not in update_fields:
+            kwargs['update_fields'] = [*update_fields, 'bucket']
+        super().save(*args, **kwargs)
+
     class Meta:
         indexes = [
             models.Index(fields=['reminder_date', 'status']),
             models.Index(fields=['customer']),
             models.Index(fields=['transaction']),
+            models.Index(fields=['customer', 'created_at', 'id']),
+            # Bucket reads (lists and badge counts) and the sweeper's moves
+            models.Index(fields=['customer', 'status', 'bucket', 'reminder_date']),
+            models.Index(fields=['status', 'bucket', 'reminder_date']),
         ]
 
+
+# One row per day the reminder sweeper ran
+class ReminderSweep(models.Model):
+    run_date = models.DateField(unique=True)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    overdue = models.IntegerField(default=0)
+    due_today = models.IntegerField(default=0)
+    upcoming = models.IntegerField(default=0)
+    settled = models.IntegerField(default=0)
+    # Reminders that became due (today or overdue) in this run, i.e. need a notification
+    newly_due = models.IntegerField(default=0)
+
+    def __str__(self):
+        return f"Reminder sweep {self.run_date}"
+
+
+# Progress of the daily reminder notification run, so a crashed run resumes
+class ReminderDispatchRun(models.Model):
+    run_date = models.DateField(unique=True)
+    # Owners are processed in id order; everything up to here is done
+    last_user_id = models.BigIntegerField(default=0)
+    digests_sent = models.IntegerField(default=0)
+    reminders_notified = models.IntegerField(default=0)
+    started_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"Reminder dispatch {self.run_date}"
+
+
+# One notification digest per shop owner per day; the unique row is the idempotency key
+class ReminderDigest(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='reminder_digests')
+    run_date = models.DateField()
+    reminder_count = models.IntegerField(default=0)
+    channels = models.CharField(max_length=100, blank=True, default='')
+    # Set before sending and cleared when every channel failed; a claim that is
+    # never cleared or completed means a worker died mid-send
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.IntegerField(default=0)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Reminder digest for {self.user_id} on {self.run_date}"
+
+    class Meta:
+        unique_together = ['user', 'run_date']
+
+# Per-user dashboard totals, kept up to date by the write path
+class UserLedgerSummary(models.Model):
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='ledger_summary')
+    total_customers = models.IntegerField(default=0)
+    total_credit_transactions = models.IntegerField(default=0)
+    total_debit_transactions = models.IntegerField(default=0)
+    total_credit_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    total_debit_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    # Pending reminders per bucket, for badge counts
+    overdue_reminders = models.IntegerField(default=0)
+    due_today_reminders = models.IntegerField(default=0)
+    upcoming_reminders = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Ledger summary for {self.user_id}"
+
+    @classmethod
+    def for_user(cls, user):
+        summary = cls.objects.filter(user=user).first()
+        if summary is None:
+            cls.rebuild(user_ids=[user.pk])
+            summary = cls.objects.get(user=user)
+        return summary
+
+    @classmethod
+    def apply_changes(cls, user_id, deltas):
+        """
+        Add ``deltas`` ({field: change}) to the user's row with one F() update.
+        A missing row is rebuilt from scratch, which already includes the change.
+        """
+        deltas = {field: F(field) + change for field, change in deltas.items() if change}
+        if not deltas:
+            return
+        if not cls.objects.filter(user_id=user_id).update(**deltas):
+            cls.rebuild(user_ids=[user_id])
+
+    @classmethod
+    def totals_by_user(cls, customers):
+        """
+        Summary totals of a Customer queryset grouped by owner, computed with
+        three grouped aggregates: {user_id: {field: value}}.
+        """
+        totals = defaultdict(lambda: {
+            'total_customers': 0,
+            'total_credit_transactions': 0,
+            'total_debit_transactions': 0,
+            'total_credit_amount': 0,
+            'total_debit_amount': 0,
+            'overdue_reminders': 0,
+            'due_today_reminders': 0,
+            'upcoming_reminders': 0,
+        })
+        for user_id, count in customers.order_by().values_list('user_id').annotate(count=models.Count('id')):
+            totals[user_id]['total_customers'] = count
+
+        transaction_totals = (
+            Transaction.objects.filter(customer__in=customers.order_by().values('pk'))
+            .values('customer__user_id')
+            .annotate(
+                total_credit_transactions=models.Count('id', filter=models.Q(transaction_type='credit')),
+                total_debit_transactions=models.Count('id', filter=models.Q(transaction_type='debit')),
+                total_credit_amount=Sum('amount', filter=models.Q(transaction_type='credit')),
+                total_debit_amount=Sum('amount', filter=models.Q(transaction_type='debit')),
+            )
+            .order_by()
+        )
+        for row in transaction_totals:
+            user_id = row.pop('customer__user_id')
+            totals[user_id].update({field: value or 0 for field, value in row.items()})
+
+        for user_id, counts in cls.reminder_counts_by_user(customers).items():
+            totals[user_id].update(counts)
+        return totals
+
+    @staticmethod
+    def reminder_counts_by_user(customers):
+        """Pending reminder counts per bucket for a Customer queryset, grouped by owner."""
+        rows = (
+            PaymentReminder.objects.filter(customer__in=customers.order_by().values('pk'), status='pending')
+            .values('customer__user_id')
+            .annotate(
+                overdue_reminders=models.Count('id', filter=models.Q(bucket='overdue')),
+                due_today_reminders=models.Count('id', filter=models.Q(bucket='due_today')),
+                upcoming_reminders=models.Count('id', filter=models.Q(bucket='upcoming')),
+            )
+            .order_by()
+        )
+        return {row.pop('customer__user_id'): row for row in rows}
+
+    @classmethod
+    def refresh_reminder_counts(cls, user_ids):
+        """Recount the pending reminders per bucket of ``user_ids`` (one grouped query)."""
+        counts = cls.reminder_counts_by_user(Customer.objects.filter(user_id__in=user_ids))
+        summaries = cls.objects.filter(user_id__in=user_ids).in_bulk(field_name='user_id')
+        fields = ['overdue_reminders', 'due_today_reminders', 'upcoming_reminders']
+        for user_id, summary in summaries.items():
+            user_counts = counts.get(user_id, {})
+            for field in fields:
+                setattr(summary, field, user_counts.get(field, 0))
+        cls.objects.bulk_update(summaries.values(), fields)
+        missing = set(user_ids) - set(summaries)
+        if missing:
+            cls.rebuild(user_ids=list(missing))
+
+    @classmethod
+    def rebuild(cls, user_ids):
+        """
+        Recompute the rows of ``user_ids`` from the customers and transactions
+        tables. Written as one upsert, so two requests creating the same
+        missing row (for_user on a first GET) both succeed.
+        """
+        totals = cls.totals_by_user(Customer.objects.filter(user_id__in=user_ids))
+        summaries = [cls(user_id=user_id, **totals[user_id]) for user_id in user_ids]
+        fields = [field.name for field in cls._meta.concrete_fields if field.name not in ('id', 'user')]
+        # MySQL's ON DUPLICATE KEY UPDATE takes no conflict target
+        unique_fields = ['user'] if connections[cls.objects.db].features.supports_update_conflicts_with_target else None
+
+        cls.objects.bulk_create(summaries, update_conflicts=True, unique_fields=unique_fields, update_fields=fields)
+        bump_ledger_versions(user_ids)
+
+
+# Month-end running totals per customer, so historical balances only sum the rows after a checkpoint
+class BalanceCheckpoint(models.Model):
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    period_end = models.DateField()
+    # Cumulative totals of every transaction dated on or before period_end
+    credit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    debit_total = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    balance = models.DecimalField(max_digits=14, decimal_places=2, default=0.00)
+    transaction_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.customer_id} balance at {self.period_end}: {self.balance}"
+
+    @classmethod
+    def invalidate(cls, earliest_dates):
+        """
+        Drop the checkpoints a back-dated write made stale: for each
+        {customer_id: date}, every checkpoint on or after that date.
+        Returns the ids of the customers that lost checkpoints.
+        """
+        if not earliest_dates:
+            return set()
+        stale = models.Q()
+        for customer_id, changed_on in earliest_dates.items():
+            stale |= models.Q(customer_id=customer_id, period_end__gte=changed_on)
+        stale_checkpoints = cls.objects.filter(stale)
+        customer_ids = set(stale_checkpoints.values_list('customer_id', flat=True).distinct())
+        if customer_ids:
+            stale_checkpoints.delete()
+        return customer_ids
+
+    class Meta:
+        unique_together = ['customer', 'period_end']
+
+
+def invalidate_balance_checkpoints(changes):
+    """
+    Invalidate checkpoints covering the dates of back-dated ``changes`` and
+    queue an incremental rebuild for the customers affected. Checkpoints only
+    exist for closed months, so writes dated this month never touch them.
+    """
+    current_month = timezone.localdate().replace(day=1)
+    earliest_dates = {}
+    for ledger_row in changes:
+        changed_on = ledger_row.date
+        if isinstance(changed_on, str):
+            changed_on = date.fromisoformat(changed_on)
+        if changed_on is None or changed_on >= current_month:
+            continue
+        customer_id = ledger_row.customer_id
+        if customer_id not in earliest_dates or changed_on < earliest_dates[customer_id]:
+            earliest_dates[customer_id] = changed_on
+
+    customer_ids = BalanceCheckpoint.invalidate(earliest_dates)
+    if customer_ids:
+        from .tasks import enqueue, build_balance_checkpoints
+        enqueue(build_balance_checkpoints, sorted(customer_ids))
+
+
+def apply_ledger_changes(removed=(), added=()):
+    """
+    Bring the stored running totals in line after ``removed`` transactions
+    went away and ``added`` ones were written: one balance update per affected
+    customer and one summary update per affected user.
+
+    Returns the new balance of every affected customer.
+    """
+    changes = [(-1, t) for t in removed] + [(1, t) for t in added]
+
+    owners = {}
+    for _, ledger_row in changes:
+        if Transaction.customer.is_cached(ledger_row):
+            owners[ledger_row.customer_id] = ledger_row.customer.user_id
+    unknown = {ledger_row.customer_id for _, ledger_row in changes} - set(owners)
+    if unknown:
+        owners.update(Customer.objects.filter(pk__in=unknown).values_list('id', 'user_id'))
+
+    customer_deltas = defaultdict(lambda: {'delta': 0, 'credit': 0, 'debit': 0, 'latest_date': None, 'removed_date': None})
+    summary_deltas = defaultdict(lambda: defaultdict(int))
+    for sign, ledger_row in changes:
+        deltas = customer_deltas[ledger_row.customer_id]
+        deltas['delta'] += sign * ledger_row.signed_amount
+        # The amount as stored, like the Sum('amount') the rebuilds use
+        deltas[ledger_row.transaction_type] += sign * Decimal(str(ledger_row.amount))
+        row_date = date.fromisoformat(ledger_row.date) if isinstance(ledger_row.date, str) else ledger_row.date
+        date_key = 'latest_date' if sign > 0 else 'removed_date'
+        if row_date is not None and (deltas[date_key] is None or row_date > deltas[date_key]):
+            deltas[date_key] = row_date
+        user_id = owners.get(ledger_row.customer_id)
+        if user_id is not None:
+            deltas = summary_deltas[user_id]
+            deltas[f'total_{ledger_row.transaction_type}_transactions'] += sign
+            deltas[f'total_{ledger_row.transaction_type}_amount'] += sign * Decimal(str(ledger_row.amount))
+
+    balances = {
+        customer_id: Customer.apply_balance_delta(customer_id, **deltas)
+        for customer_id, deltas in customer_deltas.items()
+    }
+    for user_id, deltas in summary_deltas.items():
+        UserLedgerSummary.apply_changes(user_id, deltas)
+    invalidate_balance_checkpoints([ledger_row for _, ledger_row in changes])
+    bump_ledger_versions(owners.values())
+    return balances
+
+
 # Signal handlers for Transaction model
 @receiver(post_delete, sender=Transaction)
-def update_balance_on_delete(sender, instance, **kwargs):
-    """Update the customer's account balance when a transaction is deleted."""
-    if instance.customer:
-        instance.customer.update_account_balance()
\ No newline at end of file
+def update_balance_on_delete(sender, instance, origin=None, **kwargs):
+    """
+    Update the customer's account balance and the owner's summary when a
+    transaction goes in a cascade or queryset delete. Transaction.delete
+    applies its own change, only if its DELETE removed the row.
+    """
+    if isinstance(origin, Transaction):
+        return
+    if instance.customer_id and balance_maintenance_enabled():
+        apply_ledger_changes(removed=[instance])
+
+
+# Signal handlers for Customer model
+@receiver(post_save, sender=Customer)
+def count_customer_on_create(sender, instance, created, **kwargs):
+    if created:
+        UserLedgerSummary.apply_changes(instance.user_id, {'total_customers': 1})
+
+
+@receiver(post_delete, sender=Customer)
+def uncount_customer_on_delete(sender, instance, **kwargs):
+    if balance_maintenance_enabled():
+        UserLedgerSummary.apply_changes(instance.user_id, {'total_customers': -1})
+
+
+@receiver(post_save, sender=Customer)
+@receiver(post_delete, sender=Customer)
+def bump_version_on_customer_change(sender, instance, **kwargs):
+    # Bulk deletes (delete_customers) bump once for all rows
+    if balance_maintenance_enabled():
+        bump_ledger_versions([instance.user_id])
+
+
+# Signal handlers for PaymentReminder model
+@receiver(post_save, sender=PaymentReminder)
+@receiver(post_delete, sender=PaymentReminder)
+def refresh_reminder_counts_on_change(sender, instance, **kwargs):
+    if instance.customer_id and balance_maintenance_enabled():
+        Customer.refresh_overdue_counts([instance.customer_id])
+        user_id = Customer.objects.filter(pk=instance.customer_id).values_list('user_id', flat=True).first()
+        if user_id is not None:
+            UserLedgerSummary.refresh_reminder_counts([user_id])
+            bump_ledger_versions([user_id])
+
+
+# Signal handlers for User model
+@receiver(post_save, sender=User)
+def bump_version_on_user_change(sender, instance, created, update_fields=None, **kwargs):
+    # The profile shows neither field, and every login may write them
+    if not created and not (update_fields and set(update_fields) <= {'last_login', 'password'}):
+        bump_ledger_versions([instance.pk])
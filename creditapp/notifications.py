@@ -0,0 +1,270 @@
+"""
+Payment reminder notifications.
+
+The dispatcher walks due reminders (due today or overdue) in owner order,
+builds one digest per shop owner and sends it through the configured
+channels. Email goes over one connection per batch of digests; SMS and
+WhatsApp go through a local fake gateway until a provider is wired in.
+
+ReminderDigest rows (unique per owner and day) make the run idempotent: a
+digest is claimed before it is sent and marked sent once a channel delivered
+it, so it goes out at most once. ReminderDispatchRun records how far the run
+got so a crashed run resumes where it stopped, and later runs of the same
+day retry the digests every channel failed for, as well as claims older
+than REMINDER_DIGEST_CLAIM_TIMEOUT (left by a worker that died mid-send).
+"""
+import logging
+import threading
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+from itertools import groupby
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import PaymentReminder, ReminderDigest, ReminderDispatchRun
+
+logger = logging.getLogger(__name__)
+
+DISPATCH_CHUNK_SIZE = 2000
+# Run progress is written every this many owners
+PROGRESS_EVERY = 100
+
+
+class FakeMessageGateway:
+    """
+    Local stand-in for an SMS/WhatsApp provider. Messages are kept in
+    ``outbox`` (like django.core.mail.outbox) and logged.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.outbox = []
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            self.outbox.append({"to": to, "body": body})
+        logger.info("[%s] to %s: %s", self.name, to, body.splitlines()[0] if body else '')
+        return True
+
+
+sms_gateway = FakeMessageGateway('sms')
+whatsapp_gateway = FakeMessageGateway('whatsapp')
+
+
+class EmailChannel:
+    """
+    Sends over one connection per EMAIL_DELIVERY_BATCH_SIZE digests (like the
+    mailer), reconnecting once when the server has dropped the connection.
+    """
+    name = 'email'
+
+    def __init__(self):
+        self.connection = None
+        self.sent_on_connection = 0
+        self.batch_size = getattr(settings, 'EMAIL_DELIVERY_BATCH_SIZE', 50)
+
+    def open(self):
+        # Connections are opened as digests are sent
+        pass
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.close()
+            except Exception:
+                logger.warning("Closing the reminder email connection failed", exc_info=True)
+        self.connection = None
+
+    def _connection(self):
+        if self.connection is None or self.sent_on_connection >= self.batch_size:
+            self.close()
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+            self.sent_on_connection = 0
+        return self.connection
+
+    def send(self, owner, subject, body):
+        if not owner.email:
+            return False
+        for attempt in range(2):
+            message = EmailMessage(subject, body, None, [owner.email], connection=self._connection())
+            try:
+                sent = message.send()
+            except SMTPServerDisconnected:
+                self.close()
+                if attempt:
+                    raise
+                continue
+            self.sent_on_connection += 1
+            return bool(sent)
+
+
+class GatewayChannel:
+
+    def __init__(self, name, gateway):
+        self.name = name
+        self.gateway = gateway
+
+    def open(self):
+        pass
+
+    def close(self):
+        pass
+
+    def send(self, owner, subject, body):
+        if not owner.mobile_number:
+            return False
+        return self.gateway.send(owner.mobile_number, f"{subject}\n{body}")
+
+
+def get_channels():
+    available = {
+        'email': EmailChannel,
+        'sms': lambda: GatewayChannel('sms', sms_gateway),
+        'whatsapp': lambda: GatewayChannel('whatsapp', whatsapp_gateway),
+    }
+    names = getattr(settings, 'REMINDER_NOTIFICATION_CHANNELS', ['email'])
+    return [available[name]() for name in names]
+
+
+def build_digest(reminders, today):
+    overdue = sum(1 for reminder in reminders if reminder.reminder_date < today)
+    subject = f"Payment reminders: {len(reminders)} due ({overdue} overdue)"
+    lines = []
+    for reminder in reminders:
+        state = 'overdue since' if reminder.reminder_date < today else 'due'
+        line = f"- {reminder.customer.name}: {reminder.amount_due} {state} {reminder.reminder_date.isoformat()}"
+        if reminder.transaction_id:
+            line += f" (transaction of {reminder.transaction.amount} on {reminder.transaction.date.isoformat()})"
+        lines.append(line)
+    return subject, "\n".join(lines)
+
+
+def max_attempts():
+    return getattr(settings, 'REMINDER_DIGEST_MAX_ATTEMPTS', 5)
+
+
+def _claimable():
+    """Digests that are unsent, have attempts left and are unclaimed or claimed too long ago."""
+    timeout = getattr(settings, 'REMINDER_DIGEST_CLAIM_TIMEOUT', 30 * 60)
+    expired = timezone.now() - timedelta(seconds=timeout)
+    return ReminderDigest.objects.filter(
+        Q(claimed_at__isnull=True) | Q(claimed_at__lt=expired),
+        sent_at__isnull=True, attempts__lt=max_attempts(),
+    )
+
+
+def _claim_digest(owner, reminders, today):
+    """
+    Claim today's digest of ``owner`` for sending; None when it is already
+    sent, claimed by another worker, or out of attempts. The claim is one
+    conditional UPDATE, so only one worker can win it.
+    """
+    digest, _ = ReminderDigest.objects.get_or_create(
+        user=owner, run_date=today, defaults={'reminder_count': len(reminders)}
+    )
+    claimed = _claimable().filter(pk=digest.pk).update(claimed_at=timezone.now(), attempts=F('attempts') + 1)
+    return digest if claimed else None
+
+
+def _send_digest(owner, reminders, today, channels):
+    """
+    Send one owner's digest; True if at least one channel delivered it.
+    When every channel fails the claim is released for the retry pass. A
+    claim left behind by a crashed worker is retried once it is older than
+    REMINDER_DIGEST_CLAIM_TIMEOUT, so that digest may go out twice.
+    """
+    digest = _claim_digest(owner, reminders, today)
+    if digest is None:
+        return False
+
+    subject, body = build_digest(reminders, today)
+    delivered = []
+    for channel in channels:
+        try:
+            if channel.send(owner, subject, body):
+                delivered.append(channel.name)
+        except Exception:
+            logger.exception("Sending reminder digest to user %s over %s failed", owner.pk, channel.name)
+
+    if not delivered:
+        ReminderDigest.objects.filter(pk=digest.pk).update(claimed_at=None)
+        return False
+    ReminderDigest.objects.filter(pk=digest.pk).update(
+        sent_at=timezone.now(), reminder_count=len(reminders), channels=','.join(delivered)
+    )
+    return True
+
+
+def _due_reminders(today):
+    return (
+        PaymentReminder.objects.filter(status='pending', reminder_date__lte=today)
+        .select_related('customer', 'customer__user', 'transaction')
+        .order_by('customer__user_id', 'id')
+    )
+
+
+def _send_digests(run, due, today, channels, chunk_size, track_progress):
+    """Send a digest to every owner of ``due``; progress is recorded on ``run`` in owner order."""
+    digests = notified = owners_since_progress = 0
+    last_user_id = run.last_user_id
+    try:
+        for _, owner_reminders in groupby(due.iterator(chunk_size=chunk_size), key=lambda r: r.customer.user_id):
+            owner_reminders = list(owner_reminders)
+            owner = owner_reminders[0].customer.user
+            if _send_digest(owner, owner_reminders, today, channels):
+                digests += 1
+                notified += len(owner_reminders)
+            if track_progress:
+                last_user_id = owner.pk
+            owners_since_progress += 1
+
+            if owners_since_progress >= PROGRESS_EVERY:
+                _record_progress(run, last_user_id, digests, notified)
+                digests = notified = owners_since_progress = 0
+    finally:
+        _record_progress(run, last_user_id, digests, notified)
+
+
+def dispatch_reminders(today=None, chunk_size=DISPATCH_CHUNK_SIZE):
+    """
+    Retry the digests every channel failed for (up to
+    REMINDER_DIGEST_MAX_ATTEMPTS tries) or whose claim expired, then send
+    today's reminder digests, resuming an interrupted run. Returns the run.
+    """
+    today = today or timezone.localdate()
+    run, _ = ReminderDispatchRun.objects.get_or_create(run_date=today)
+    retry_user_ids = list(_claimable().filter(run_date=today, attempts__gt=0).values_list('user_id', flat=True))
+    if run.finished_at is not None and not retry_user_ids:
+        return run
+
+    channels = get_channels()
+    for channel in channels:
+        channel.open()
+    try:
+        if retry_user_ids:
+            _send_digests(run, _due_reminders(today).filter(customer__user_id__in=retry_user_ids),
+                          today, channels, chunk_size, track_progress=False)
+        if run.finished_at is None:
+            run.refresh_from_db()
+            _send_digests(run, _due_reminders(today).filter(customer__user_id__gt=run.last_user_id),
+                          today, channels, chunk_size, track_progress=True)
+            ReminderDispatchRun.objects.filter(pk=run.pk).update(finished_at=timezone.now())
+    finally:
+        for channel in channels:
+            channel.close()
+
+    run.refresh_from_db()
+    return run
+
+
+def _record_progress(run, last_user_id, digests, notified):
+    ReminderDispatchRun.objects.filter(pk=run.pk).update(
+        last_user_id=last_user_id,
+        digests_sent=F('digests_sent') + digests,
+        reminders_notified=F('reminders_notified') + notified,
+    )
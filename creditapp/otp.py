@@ -0,0 +1,223 @@
+"""
+One-time passwords for signup verification and password resets.
+
+OTP_STORE selects where issued codes live:
+
+* ``cache``: one cache key per email that expires after OTP_TTL_SECONDS.
+  A verification is a single cache round trip and never touches the
+  database. Needs a cache shared by every process (Redis), so it is the
+  default only when REDIS_CACHE_URL is set.
+* ``database``: EmailOTP rows, looked up through the (email, otp, is_used,
+  created_at) index. Expired and used rows are removed by the hourly
+  ``purge_expired_otps`` task (``manage.py purge_otps``).
+
+Either way, the counters behind OTP_RATE_LIMITS are kept in the cache. They
+limit how many codes are sent per email and per client IP, and how many
+codes a client IP may try. A code is also burned after OTP_MAX_ATTEMPTS
+wrong guesses.
+"""
+import hashlib
+import random
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.core.cache import caches
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+
+from .models import EmailOTP
+
+DEFAULT_RATE_LIMITS = {
+    # name: (requests, window in seconds)
+    'send_per_email': (5, 3600),
+    'send_per_ip': (20, 3600),
+    'verify_per_ip': (30, 600),
+}
+
+
+class OTPRateLimited(Exception):
+    def __init__(self, limit, retry_after):
+        super().__init__(f'OTP rate limit "{limit}" exceeded')
+        self.limit = limit
+        self.retry_after = retry_after
+
+
+def otp_ttl():
+    return getattr(settings, 'OTP_TTL_SECONDS', 600)
+
+
+def generate_otp():
+    return f"{random.SystemRandom().randint(100000, 999999)}"
+
+
+def _email_key(email):
+    # Hashed so keys have a fixed length and no raw addresses sit in the cache
+    return hashlib.sha256(email.strip().lower().encode()).hexdigest()[:32]
+
+
+class OTPStore(ABC):
+    """Issue and verify codes; subclasses decide where the codes are kept."""
+
+    def __init__(self):
+        self.cache = caches[getattr(settings, 'OTP_CACHE_ALIAS', 'default')]
+
+    @property
+    def max_attempts(self):
+        return getattr(settings, 'OTP_MAX_ATTEMPTS', 5)
+
+    # Rate limiting --------------------------------------------------------
+
+    @staticmethod
+    def _rate_key(name, subject):
+        return f'otp:rate:{name}:{subject}'
+
+    def _limit(self, name):
+        return getattr(settings, 'OTP_RATE_LIMITS', DEFAULT_RATE_LIMITS).get(name)
+
+    def _hit(self, name, subject):
+        """Count one request against limit ``name``; raise OTPRateLimited over it."""
+        limit = self._limit(name)
+        if limit is None or subject is None:
+            return
+        allowed, window = limit
+        key = self._rate_key(name, subject)
+        # add() starts the window, incr() keeps its expiry
+        if self.cache.add(key, 1, timeout=window):
+            return
+        try:
+            count = self.cache.incr(key)
+        except ValueError:
+            # Expired between add() and incr()
+            self.cache.add(key, 1, timeout=window)
+            return
+        if count > allowed:
+            raise OTPRateLimited(name, retry_after=window)
+
+    def _blocked(self, name, subject, cached):
+        limit = self._limit(name)
+        if limit is None or subject is None:
+            return
+        allowed, window = limit
+        if (cached.get(self._rate_key(name, subject)) or 0) >= allowed:
+            raise OTPRateLimited(name, retry_after=window)
+
+    # API ------------------------------------------------------------------
+
+    def issue(self, email, ip=None):
+        """Store a new code for ``email`` (replacing older ones) and return it."""
+        self._hit('send_per_ip', ip)
+        self._hit('send_per_email', _email_key(email))
+        otp = generate_otp()
+        self.save(email, otp)
+        self.cache.delete(self._attempts_key(email))
+        return otp
+
+    def verify(self, email, otp, ip=None):
+        """
+        True when ``otp`` is the current code of ``email``; the code is used
+        up. Wrong guesses count against the IP limit and OTP_MAX_ATTEMPTS.
+        """
+        # The IP counter and (for the cache store) the code in one round trip
+        keys = self.cached_keys(email)
+        if ip is not None:
+            keys.append(self._rate_key('verify_per_ip', ip))
+        cached = self.cache.get_many(keys)
+        self._blocked('verify_per_ip', ip, cached)
+        if self.consume(email, str(otp), cached):
+            return True
+        self._hit('verify_per_ip', ip)
+        try:
+            attempts = self.cache.incr(self._attempts_key(email))
+        except ValueError:
+            self.cache.set(self._attempts_key(email), 1, timeout=otp_ttl())
+            attempts = 1
+        if attempts >= self.max_attempts:
+            self.discard(email)
+        return False
+
+    @staticmethod
+    def _attempts_key(email):
+        return f'otp:attempts:{_email_key(email)}'
+
+    def cached_keys(self, email):
+        """Cache keys consume() needs, fetched together with the rate counters."""
+        return []
+
+    @abstractmethod
+    def save(self, email, otp):
+        """Store a freshly issued code for the email."""
+
+    @abstractmethod
+    def consume(self, email, otp, cached):
+        """Mark the code used and return True if it matches an unexpired one."""
+
+    @abstractmethod
+    def discard(self, email):
+        """Drop the email's outstanding code."""
+
+
+class CacheOTPStore(OTPStore):
+
+    @staticmethod
+    def _key(email):
+        return f'otp:code:{_email_key(email)}'
+
+    def save(self, email, otp):
+        self.cache.set(self._key(email), otp, timeout=otp_ttl())
+
+    def cached_keys(self, email):
+        return [self._key(email)]
+
+    def consume(self, email, otp, cached):
+        stored = cached.get(self._key(email))
+        if stored is None or not constant_time_compare(stored, otp):
+            return False
+        # Only the request whose delete removed the key uses the code; a
+        # concurrent verification that read it too gets False
+        return self.cache.delete(self._key(email))
+
+    def discard(self, email):
+        self.cache.delete(self._key(email))
+
+
+class DatabaseOTPStore(OTPStore):
+
+    def save(self, email, otp):
+        EmailOTP.objects.filter(email=email).delete()
+        EmailOTP.objects.create(email=email, otp=otp)
+
+    def consume(self, email, otp, cached):
+        valid_since = timezone.now() - timezone.timedelta(seconds=otp_ttl())
+        # Deleting the matching row is what uses it up, so two concurrent
+        # verifications cannot both succeed
+        used, _ = EmailOTP.objects.filter(
+            email=email, otp=otp, is_used=False, created_at__gte=valid_since
+        ).delete()
+        if used:
+            EmailOTP.objects.filter(email=email).delete()
+        return bool(used)
+
+    def discard(self, email):
+        EmailOTP.objects.filter(email=email).delete()
+
+
+OTP_STORES = {
+    'cache': CacheOTPStore,
+    'database': DatabaseOTPStore,
+}
+
+
+def get_otp_store():
+    return OTP_STORES[getattr(settings, 'OTP_STORE', 'database')]()
+
+
+def purge_expired_otps(batch_size=5000):
+    """Delete used and expired EmailOTP rows; returns the number removed."""
+    expired_before = timezone.now() - timezone.timedelta(seconds=otp_ttl())
+    stale = EmailOTP.objects.filter(created_at__lt=expired_before) | EmailOTP.objects.filter(is_used=True)
+    removed = 0
+    while True:
+        ids = list(stale.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return removed
+        removed += EmailOTP.objects.filter(id__in=ids).delete()[0]
@@ -0,0 +1,108 @@
+"""
+Daily payment-reminder sweeper.
+
+Reminders store their bucket (upcoming / due_today / overdue / settled).
+save() sets it when a reminder is written, and the sweeper moves pending
+reminders forward once a day with batched UPDATEs and recounts the
+per-user badge counts and per-customer overdue counts it touched. After a
+sweep has finished for today, list and count reads filter on the stored
+bucket instead of comparing dates.
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from .models import Customer, PaymentReminder, ReminderSweep, UserLedgerSummary
+from .versions import bump_ledger_versions
+
+SWEEP_BATCH_SIZE = 5000
+
+
+def _sweep_cache_key(day):
+    return f'reminder-sweep:{day.isoformat()}'
+
+
+def buckets_are_current(today=None):
+    """True once today's sweep has finished, so stored buckets can be trusted."""
+    today = today or timezone.localdate()
+    current = cache.get(_sweep_cache_key(today))
+    if current is None:
+        current = ReminderSweep.objects.filter(run_date=today, finished_at__isnull=False).exists()
+        if current:
+            cache.set(_sweep_cache_key(today), True, 60 * 60 * 24)
+    return current
+
+
+def _move(reminders, bucket, batch_size):
+    """Move ``reminders`` into ``bucket`` in batches; return (moved, affected user ids, affected customer ids)."""
+    moved = 0
+    user_ids = set()
+    customer_ids = set()
+    stale = reminders.exclude(bucket=bucket).order_by()
+    while True:
+        batch = list(stale.values_list('id', 'customer_id', 'customer__user_id')[:batch_size])
+        if not batch:
+            break
+        ids = [reminder_id for reminder_id, _, _ in batch]
+        customer_ids.update(customer_id for _, customer_id, _ in batch if customer_id is not None)
+        user_ids.update(user_id for _, _, user_id in batch if user_id is not None)
+        with transaction.atomic():
+            moved += PaymentReminder.objects.filter(id__in=ids).update(bucket=bucket)
+    return moved, user_ids, customer_ids
+
+
+def sweep_reminders(today=None, batch_size=SWEEP_BATCH_SIZE):
+    """Bring every stored bucket up to date for ``today`` and record the run."""
+    today = today or timezone.localdate()
+    sweep, _ = ReminderSweep.objects.update_or_create(run_date=today, defaults={'finished_at': None})
+
+    pending = PaymentReminder.objects.filter(status='pending')
+    moves = {
+        'overdue': pending.filter(reminder_date__lt=today),
+        'due_today': pending.filter(reminder_date=today),
+        'upcoming': pending.filter(reminder_date__gt=today),
+        'settled': PaymentReminder.objects.filter(~Q(status='pending')),
+    }
+
+    # Reminders that are about to become due need a notification
+    newly_due = pending.filter(reminder_date__lte=today).exclude(bucket__in=['overdue', 'due_today']).count()
+
+    affected_users = set()
+    affected_customers = set()
+    counts = {}
+    for bucket, reminders in moves.items():
+        counts[bucket], user_ids, customer_ids = _move(reminders, bucket, batch_size)
+        affected_users |= user_ids
+        affected_customers |= customer_ids
+
+    affected_users = sorted(affected_users)
+    for start in range(0, len(affected_users), 500):
+        UserLedgerSummary.refresh_reminder_counts(affected_users[start:start + 500])
+    affected_customers = sorted(affected_customers)
+    for start in range(0, len(affected_customers), 500):
+        Customer.refresh_overdue_counts(affected_customers[start:start + 500])
+    bump_ledger_versions(affected_users)
+
+    ReminderSweep.objects.filter(pk=sweep.pk).update(finished_at=timezone.now(), newly_due=newly_due, **counts)
+    cache.delete(_sweep_cache_key(today))
+    return {**counts, 'newly_due': newly_due}
+
+
+def reminder_counts(user, today=None):
+    """Badge counts of pending reminders per bucket for ``user``."""
+    today = today or timezone.localdate()
+    if buckets_are_current(today):
+        summary = UserLedgerSummary.for_user(user)
+        return {
+            'overdue': summary.overdue_reminders,
+            'due_today': summary.due_today_reminders,
+            'upcoming': summary.upcoming_reminders,
+        }
+
+    # The sweep has not run yet today: count by date instead
+    return PaymentReminder.objects.filter(customer__user=user, status='pending').aggregate(
+        overdue=Count('id', filter=Q(reminder_date__lt=today)),
+        due_today=Count('id', filter=Q(reminder_date=today)),
+        upcoming=Count('id', filter=Q(reminder_date__gt=today)),
+    )
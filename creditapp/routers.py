@@ -0,0 +1,84 @@
+"""
+Read-replica routing.
+
+Views that opt in with ReplicaReadMixin send the reads of their GET
+requests to one of settings.DATABASE_REPLICAS; every other read and all
+writes use the primary. ReplicaRoutingMiddleware gives each request its own
+routing state and pins a user to the primary for REPLICA_PIN_SECONDS after
+any request of theirs wrote to the database, so users always read their own
+writes. Code outside a request (tasks, commands) always uses the primary.
+The pins live in the cache, so use a shared cache (Redis) with several
+processes.
+"""
+import random
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+request_state = ContextVar('replica_request_state', default=None)
+
+
+class RoutingState:
+    __slots__ = ('use_replica', 'wrote', 'alias')
+
+    def __init__(self):
+        self.use_replica = False
+        self.wrote = False
+        self.alias = None
+
+
+def _pin_key(user_id):
+    return f'replica-pin:{user_id}'
+
+
+def pin_to_primary(user_id):
+    cache.set(_pin_key(user_id), True, getattr(settings, 'REPLICA_PIN_SECONDS', 5))
+
+
+def is_pinned(user_id):
+    return bool(cache.get(_pin_key(user_id)))
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', ()))
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = request_state.get()
+        if state is None or not state.use_replica or state.wrote:
+            return DEFAULT_DB_ALIAS
+        if state.alias is None:
+            # One replica per request, so all of its reads see the same snapshot
+            state.alias = random.choice(replicas() or [DEFAULT_DB_ALIAS])
+        return state.alias
+
+    def db_for_write(self, model, **hints):
+        state = request_state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ReplicaReadMixin:
+    """
+    Serve this view's GET/HEAD requests from a replica, unless the user
+    wrote something within the last REPLICA_PIN_SECONDS.
+    """
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        state = request_state.get()
+        if state is None or request.method not in ('GET', 'HEAD') or not replicas():
+            return
+        user_id = getattr(request.user, 'pk', None)
+        state.use_replica = user_id is None or not is_pinned(user_id)
@@ -0,0 +1,197 @@
+"""
+Pluggable full-text search over transactions (customer name and description).
+
+Each database gets a backend that can use an index for substring search:
+pg_trgm GIN indexes on PostgreSQL, an FTS5 trigram side table on SQLite and
+ngram FULLTEXT indexes on MySQL. The indexes are created by migration
+0007_transaction_search_indexes (the SQLite table gained its owner column in
+0016). Results are annotated with ``search_rank``.
+"""
+from django.conf import settings
+from django.db import connections
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+from rest_framework import filters
+
+SQLITE_SEARCH_TABLE = 'creditapp_transaction_search'
+
+# Search field -> ORM lookup path on Transaction
+SEARCH_FIELDS = {
+    'customer_name': 'customer__name',
+    'description': 'description',
+}
+
+
+class IContainsSearchBackend:
+    """Portable fallback: LIKE '%term%' on every field, every word must match."""
+
+    # Trigram indexes cannot help with shorter words
+    min_indexed_length = 3
+
+    def split_terms(self, term):
+        words = [word for word in term.split() if word]
+        indexed = [word for word in words if len(word) >= self.min_indexed_length]
+        short = [word for word in words if len(word) < self.min_indexed_length]
+        return indexed, short
+
+    def icontains(self, queryset, words, fields):
+        for word in words:
+            condition = Q()
+            for field in fields:
+                condition |= Q(**{f'{SEARCH_FIELDS[field]}__icontains': word})
+            queryset = queryset.filter(condition)
+        return queryset
+
+    def search(self, queryset, term, fields=tuple(SEARCH_FIELDS), user_id=None, rank=True):
+        queryset = self.icontains(queryset, term.split(), fields)
+        if rank:
+            queryset = queryset.annotate(search_rank=Value(0.0, output_field=FloatField()))
+        return queryset
+
+
+class PostgresTrigramSearchBackend(IContainsSearchBackend):
+    """
+    ILIKE served by pg_trgm GIN indexes, ranked by trigram word similarity.
+    """
+
+    def search(self, queryset, term, fields=tuple(SEARCH_FIELDS), user_id=None, rank=True):
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        from django.db.models.functions import Greatest
+
+        queryset = self.icontains(queryset, term.split(), fields)
+        if not rank:
+            return queryset
+        similarities = [TrigramWordSimilarity(term, SEARCH_FIELDS[field]) for field in fields]
+        return queryset.annotate(search_rank=Greatest(*similarities) if len(similarities) > 1 else similarities[0])
+
+
+class SQLiteFTSSearchBackend(IContainsSearchBackend):
+    """
+    FTS5 trigram side table kept in sync by triggers, ranked by bm25().
+    Each row also carries an ``owner`` token (``<user id>``), so a match
+    limited to one user only walks that user's entries.
+    Falls back to icontains when FTS5 is not compiled in.
+    """
+
+    def __init__(self):
+        self._available = {}
+
+    def is_available(self, alias):
+        if alias not in self._available:
+            with connections[alias].cursor() as cursor:
+                cursor.execute(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [SQLITE_SEARCH_TABLE]
+                )
+                self._available[alias] = cursor.fetchone() is not None
+        return self._available[alias]
+
+    @staticmethod
+    def match_expression(words, fields, user_id=None):
+        phrases = ' AND '.join('"{}"'.format(word.replace('"', '""')) for word in words)
+        expression = '{%s} : (%s)' % (' '.join(fields), phrases)
+        if user_id is not None:
+            expression = f'owner : "<{int(user_id)}>" AND {expression}'
+        return expression
+
+    def search(self, queryset, term, fields=tuple(SEARCH_FIELDS), user_id=None, rank=True):
+        indexed, short = self.split_terms(term)
+        if not indexed or not self.is_available(queryset.db):
+            return super().search(queryset, term, fields, user_id=user_id, rank=rank)
+
+        match = self.match_expression(indexed, fields, user_id)
+        if rank:
+            # Joined rather than looked up per result row; bm25() is lower for
+            # better matches and the owner column gets no weight
+            queryset = queryset.extra(
+                tables=[SQLITE_SEARCH_TABLE],
+                where=[f'{SQLITE_SEARCH_TABLE}.rowid = creditapp_transaction.id', f'{SQLITE_SEARCH_TABLE} MATCH %s'],
+                params=[match],
+                select={'search_rank': f'-bm25({SQLITE_SEARCH_TABLE}, 1.0, 1.0, 0.0)'},
+            )
+        else:
+            queryset = queryset.filter(
+                id__in=RawSQL(f"SELECT rowid FROM {SQLITE_SEARCH_TABLE} WHERE {SQLITE_SEARCH_TABLE} MATCH %s", [match])
+            )
+        return self.icontains(queryset, short, fields)
+
+
+class MySQLFullTextSearchBackend(IContainsSearchBackend):
+    """ngram FULLTEXT indexes queried in boolean mode, ranked by MATCH() score."""
+
+    def search(self, queryset, term, fields=tuple(SEARCH_FIELDS), user_id=None, rank=True):
+        indexed, short = self.split_terms(term)
+        if not indexed:
+            return super().search(queryset, term, fields, user_id=user_id, rank=rank)
+
+        against = ' '.join('+"{}"'.format(word.replace('"', '')) for word in indexed)
+        owner, owner_params = ('AND c.user_id = %s', [user_id]) if user_id is not None else ('', [])
+        condition = Q()
+        if 'description' in fields:
+            condition |= Q(id__in=RawSQL(
+                "SELECT t.id FROM creditapp_transaction t JOIN creditapp_customer c ON c.id = t.customer_id "
+                f"WHERE MATCH(t.description) AGAINST (%s IN BOOLEAN MODE) {owner}", [against, *owner_params]
+            ))
+        if 'customer_name' in fields:
+            condition |= Q(customer_id__in=RawSQL(
+                f"SELECT c.id FROM creditapp_customer c WHERE MATCH(c.name) AGAINST (%s IN BOOLEAN MODE) {owner}",
+                [against, *owner_params]
+            ))
+        queryset = self.icontains(queryset.filter(condition), short, fields)
+        if not rank:
+            return queryset
+
+        if 'description' in fields:
+            search_rank = RawSQL(
+                "MATCH(creditapp_transaction.description) AGAINST (%s)", [' '.join(indexed)], output_field=FloatField()
+            )
+        else:
+            search_rank = Value(0.0, output_field=FloatField())
+        return queryset.annotate(search_rank=search_rank)
+
+
+VENDOR_BACKENDS = {
+    'postgresql': PostgresTrigramSearchBackend,
+    'sqlite': SQLiteFTSSearchBackend,
+    'mysql': MySQLFullTextSearchBackend,
+}
+_backends = {}
+
+
+def get_search_backend(queryset):
+    """
+    The search backend for the database ``queryset`` reads from, or the class
+    named by the LEDGER_SEARCH_BACKEND setting.
+    """
+    backend_path = getattr(settings, 'LEDGER_SEARCH_BACKEND', None)
+    key = backend_path or connections[queryset.db].vendor
+    if key not in _backends:
+        backend_class = import_string(backend_path) if backend_path else VENDOR_BACKENDS.get(key, IContainsSearchBackend)
+        _backends[key] = backend_class()
+    return _backends[key]
+
+
+def search_transactions(queryset, term, fields=tuple(SEARCH_FIELDS), user_id=None, rank=True):
+    """
+    Transactions of ``queryset`` matching every word of ``term``. Pass the
+    owner's ``user_id`` so indexes that can are searched for that user only;
+    ``rank=False`` skips the ``search_rank`` annotation (plain filters).
+    """
+    return get_search_backend(queryset).search(queryset, term, fields, user_id=user_id, rank=rank)
+
+
+class LedgerSearchFilter(filters.SearchFilter):
+    """
+    ?search= over customer name and description through the search backend.
+    Results are ordered by relevance unless ?ordering= is given.
+    """
+
+    def filter_queryset(self, request, queryset, view):
+        terms = self.get_search_terms(request)
+        if not terms:
+            return queryset
+
+        queryset = search_transactions(queryset, ' '.join(terms), user_id=request.user.pk)
+        if not request.query_params.get(filters.OrderingFilter.ordering_param):
+            queryset = queryset.order_by('-search_rank', '-created_at', '-id')
+        return queryset
@@ -4,6 +4,8 @@ from .models import User, Customer, Transaction, PaymentReminder, PendingUser
 import re
 from .utils import send_otp_email, validate_password
 from rest_framework.exceptions import ValidationError
+from .metrics import TimedSerializerMixin
+from .images import variant_urls
 
 
 # ---------------------------- Signup Serializer ----------------------------
@@ -63,7 +65,7 @@ class SignupSerializer(serializers.ModelSerializer):
     #     return user
 
 # ---------------------------- User Edit Serializer ----------------------------
-class UserSerializer(serializers.ModelSerializer):
+class UserSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     mobile_number = serializers.CharField(required=False)
     category = serializers.CharField(required=False)
 
@@ -85,10 +87,15 @@ class UserTransactionSummarySerializer(serializers.Serializer):
 
 
 # ---------------------------- Customer Serializer ----------------------------
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     class Meta:
         model = Customer
-        fields = ['id', 'name', 'contact_number', 'email', 'address', 'account_balance', 'created_at', 'updated_at']
+        fields = [
+            'id', 'name', 'contact_number', 'email', 'address', 'account_balance',
+            'credit_total', 'debit_total', 'last_activity', 'overdue_reminder_count', 'created_at', 'updated_at',
+        ]
+        # Maintained by the ledger write path
+        read_only_fields = ['credit_total', 'debit_total', 'last_activity', 'overdue_reminder_count']
         extra_kwargs = {
             "email": {"required": False},
             "address": {"required": False},
@@ -118,16 +125,25 @@ class SimpleCustomerSerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'account_balance']
 
 # ---------------------------- Transaction Serializer ----------------------------
-class TransactionSerializer(serializers.ModelSerializer):
+class TransactionSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Optimize nested serialization by using a minimal customer representation
     customer_details = SimpleCustomerSerializer(source='customer', read_only=True)
+    # Resized copies of the bill image ({"thumb_webp": url, ...}), empty until generated
+    bill_image_variants = serializers.SerializerMethodField()
     
     class Meta:
         model = Transaction
         fields = [
             'id', 'customer', 'customer_details', 'amount', 'transaction_type', 
-            'payment_mode', 'date', 'description', 'bill_image', 'created_at'
+            'payment_mode', 'date', 'description', 'bill_image', 'bill_image_variants', 'created_at'
         ]
+
+    def get_bill_image_variants(self, obj):
+        urls = variant_urls(obj.bill_image_variants)
+        request = self.context.get('request')
+        if request is not None:
+            urls = {key: request.build_absolute_uri(url) for key, url in urls.items()}
+        return urls
     
     def create(self, validated_data):
         """
@@ -155,6 +171,27 @@ class TransactionSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("Not Found.")
         return attrs
 
+# ---------------------------- Transaction Import Serializer ----------------------------
+# Validates one row of a bulk import. Customer ownership is checked per batch
+# by the importer, so the customer is taken as a plain id here.
+class TransactionImportSerializer(serializers.Serializer):
+    customer = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    transaction_type = serializers.ChoiceField(choices=Transaction.TRANSACTION_TYPES)
+    payment_mode = serializers.ChoiceField(choices=Transaction.PAYMENT_MODES, default='cash')
+    date = serializers.DateField()
+    description = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+
+# ---------------------------- Statement Row Serializer ----------------------------
+class StatementRowSerializer(TimedSerializerMixin, serializers.Serializer):
+    id = serializers.IntegerField()
+    date = serializers.DateField()
+    transaction_type = serializers.CharField()
+    payment_mode = serializers.CharField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    description = serializers.CharField(allow_null=True)
+    running_balance = serializers.DecimalField(max_digits=14, decimal_places=2)
+
 # ---------------------------- Simple Transaction Serializer ----------------------------
 # For optimized nested relationships
 class SimpleTransactionSerializer(serializers.ModelSerializer):
@@ -163,7 +200,7 @@ class SimpleTransactionSerializer(serializers.ModelSerializer):
         fields = ['id', 'amount', 'transaction_type', 'date']
 
 # ---------------------------- Payment Reminder Serializer ----------------------------
-class PaymentReminderSerializer(serializers.ModelSerializer):
+class PaymentReminderSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     # Optimize nested serialization
     customer_details = SimpleCustomerSerializer(source='customer', read_only=True)
     transaction_details = SimpleTransactionSerializer(source='transaction', read_only=True)
@@ -0,0 +1,55 @@
+"""
+Customer statements: transactions in date order with a running balance.
+
+The running balance is a window sum computed by the database over the
+(date, id) order, offset by the balance carried in from before the first
+row: the checkpointed balance before ``start`` on the first page, the last
+row's running balance of the previous page after that.
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import F, Q, Window
+
+from .checkpoints import totals_as_of
+from .models import Transaction, signed_amount_sum
+
+STATEMENT_FIELDS = ['id', 'date', 'transaction_type', 'payment_mode', 'amount', 'description']
+
+
+def opening_balance(customer_id, start=None):
+    """Balance carried into a statement that starts on ``start`` (0 for a full history)."""
+    if start is None:
+        return Decimal('0')
+    return totals_as_of(customer_id, start - timedelta(days=1))['balance']
+
+
+def statement_queryset(customer_id, start=None, end=None, after=None):
+    """
+    Statement rows of a customer as dicts, oldest first, each with
+    ``period_balance``: the running sum of signed amounts from the first row
+    returned. ``after`` is a (date, id) keyset position to continue from.
+    """
+    rows = Transaction.objects.filter(customer_id=customer_id)
+    if start is not None:
+        rows = rows.filter(date__gte=start)
+    if end is not None:
+        rows = rows.filter(date__lte=end)
+    if after is not None:
+        after_date, after_id = after
+        rows = rows.filter(Q(date__gt=after_date) | Q(date=after_date, id__gt=after_id))
+
+    return rows.values(*STATEMENT_FIELDS).annotate(
+        period_balance=Window(
+            expression=signed_amount_sum(),
+            order_by=[F('date').asc(), F('id').asc()],
+        )
+    ).order_by('date', 'id')
+
+
+def with_running_balance(rows, opening):
+    """Add ``running_balance`` (opening + period_balance) to each statement row."""
+    opening = Decimal(opening or 0)
+    for row in rows:
+        row['running_balance'] = opening + Decimal(str(row.pop('period_balance') or 0))
+        yield row
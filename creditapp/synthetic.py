@@ -0,0 +1,156 @@
+"""
+Synthetic ledger data for load tests and benchmarks.
+
+``generate_ledger`` writes users, customers, transactions and payment
+reminders with bulk_create. Customers per user and transactions per
+customer follow a Pareto distribution, so a few shops and customers carry
+most of the volume as in real ledgers. The derived data (balances and
+customer aggregates, dashboard summaries, balance checkpoints) is rebuilt
+at the end, so the data looks exactly like data written through the API.
+
+Generated users share BENCH_EMAIL_DOMAIN and one password, so they can be
+logged into by the benchmark and removed again with ``clear_ledger``.
+"""
+import random
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    Customer, PaymentReminder, Transaction, User, UserLedgerSummary, balance_maintenance_suspended
+)
+
+BENCH_EMAIL_DOMAIN = 'bench.example.com'
+BENCH_PASSWORD = 'Bench@12345'
+
+_WORDS = (
+    'rice', 'sugar', 'oil', 'flour', 'milk', 'tea', 'soap', 'dal', 'salt', 'spices',
+    'advance', 'monthly', 'settlement', 'return', 'udhaar', 'payment', 'bill', 'order',
+)
+_FIRST_NAMES = ('Amit', 'Priya', 'Rahul', 'Sneha', 'Vikram', 'Anjali', 'Ravi', 'Pooja', 'Karan', 'Neha')
+_LAST_NAMES = ('Patel', 'Shah', 'Sharma', 'Mehta', 'Desai', 'Joshi', 'Iyer', 'Reddy', 'Singh', 'Gupta')
+_PAYMENT_MODES = (('cash', 55), ('upi', 30), ('bank_transfer', 7), ('cheque', 3), ('card', 3), ('other', 2))
+
+
+def bench_email(index):
+    return f'bench-{index}@{BENCH_EMAIL_DOMAIN}'
+
+
+def _skewed_count(rng, mean, alpha, cap):
+    """A Pareto-distributed count with the given mean (alpha > 1), at least 1 and at most ``cap``."""
+    scale = mean * (alpha - 1) / alpha
+    return max(1, min(cap, int(rng.paretovariate(alpha) * scale)))
+
+
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def generate_ledger(users=10, customers=50, transactions=40, days=730, alpha=1.5,
+                    reminder_ratio=0.2, batch_size=5000, seed=None, stdout=None):
+    """
+    Create ``users`` shop owners with on average ``customers`` customers each
+    and on average ``transactions`` transactions per customer, dated over the
+    last ``days`` days. Returns the number of rows written per model.
+    """
+    from .checkpoints import build_checkpoints
+
+    rng = random.Random(seed)
+    today = timezone.localdate()
+    password = make_password(BENCH_PASSWORD)
+    modes, mode_weights = zip(*_PAYMENT_MODES)
+    counts = {'users': 0, 'customers': 0, 'transactions': 0, 'payment_reminders': 0}
+
+    first_index = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}').count()
+    new_users = [
+        User(
+            email=bench_email(first_index + i),
+            mobile_number=f'7{first_index + i:09d}',
+            first_name=rng.choice(_FIRST_NAMES),
+            last_name=rng.choice(_LAST_NAMES),
+            password=password,
+            is_active=True,
+            is_verified=True,
+            is_approved=True,
+        )
+        for i in range(users)
+    ]
+    User.objects.bulk_create(new_users, batch_size=batch_size)
+    user_ids = list(
+        User.objects.filter(email__in=[user.email for user in new_users]).order_by('id').values_list('id', flat=True)
+    )
+    counts['users'] = len(user_ids)
+
+    with balance_maintenance_suspended():
+        for user_id in user_ids:
+            customer_count = _skewed_count(rng, customers, alpha, cap=customers * 20)
+            Customer.objects.bulk_create([
+                Customer(
+                    user_id=user_id,
+                    name=f'{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {n}',
+                    contact_number=f'9{user_id % 1000:03d}{n:06d}',
+                    address=f'{rng.randint(1, 300)} Market Road',
+                ) for n in range(customer_count)
+            ], batch_size=batch_size)
+            customer_ids = list(Customer.objects.filter(user_id=user_id).values_list('id', flat=True))
+            counts['customers'] += len(customer_ids)
+
+            rows = []
+            reminders = []
+            for customer_id in customer_ids:
+                for _ in range(_skewed_count(rng, transactions, alpha, cap=transactions * 50)):
+                    # Recent days are busier than old ones
+                    age = int(days * rng.random() ** 2)
+                    transaction_type = 'debit' if rng.random() < 0.6 else 'credit'
+                    amount = Decimal(round(rng.lognormvariate(6, 1.1), 2)).quantize(Decimal('0.01'))
+                    rows.append(Transaction(
+                        customer_id=customer_id,
+                        amount=max(amount, Decimal('1.00')),
+                        transaction_type=transaction_type,
+                        payment_mode=rng.choices(modes, mode_weights)[0],
+                        date=today - timedelta(days=age),
+                        description=' '.join(rng.sample(_WORDS, rng.randint(1, 3))),
+                    ))
+                    if transaction_type == 'debit' and rng.random() < reminder_ratio:
+                        reminder_date = today + timedelta(days=rng.randint(-30, 30))
+                        reminders.append(PaymentReminder(
+                            customer_id=customer_id,
+                            amount_due=amount,
+                            reminder_date=reminder_date,
+                            bucket=PaymentReminder.bucket_for('pending', reminder_date, today),
+                        ))
+            for chunk in _chunks(rows, batch_size):
+                with transaction.atomic():
+                    Transaction.objects.bulk_create(chunk)
+            PaymentReminder.objects.bulk_create(reminders, batch_size=batch_size)
+            counts['transactions'] += len(rows)
+            counts['payment_reminders'] += len(reminders)
+            if stdout is not None:
+                stdout.write(f'user {user_id}: {len(customer_ids)} customers, {len(rows)} transactions')
+
+    _rebuild_derived(user_ids, batch_size)
+    build_checkpoints(customer_ids=list(Customer.objects.filter(user_id__in=user_ids).values_list('id', flat=True)))
+    return counts
+
+
+def _rebuild_derived(user_ids, batch_size):
+    """Recompute stored balances, customer aggregates and dashboard summaries of the generated users."""
+    for chunk in _chunks(user_ids, 50):
+        customer_ids = list(Customer.objects.filter(user_id__in=chunk).values_list('id', flat=True))
+        for customer_chunk in _chunks(customer_ids, batch_size):
+            Customer.rebuild_aggregates(customer_ids=customer_chunk)
+        UserLedgerSummary.rebuild(user_ids=chunk)
+
+
+def clear_ledger():
+    """Delete every generated user together with their ledgers; returns the number of users removed."""
+    from .utils import delete_customers
+
+    users = User.objects.filter(email__endswith=f'@{BENCH_EMAIL_DOMAIN}')
+    delete_customers(Customer.objects.filter(user__in=users))
+    _, removed = users.delete()
+    return removed.get(User._meta.label, 0)
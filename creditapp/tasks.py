@@ -0,0 +1,133 @@
+"""
+Celery tasks for the slow side effects of ledger writes.
+
+Use ``enqueue()`` rather than ``.delay()`` from request code: the task is
+published only once the surrounding database transaction has committed, so
+a worker never sees rows that might still roll back. With
+CELERY_TASK_ALWAYS_EAGER (the local default) tasks run in-process.
+"""
+import logging
+
+from celery import shared_task
+from django.core.management import call_command
+from django.db import transaction
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(task, *args, **kwargs):
+    """Publish ``task`` after the current transaction commits (immediately outside one)."""
+    transaction.on_commit(lambda: task.apply_async(args, kwargs))
+
+
+@shared_task(ignore_result=True)
+def settle_customer_reminders(customer_id):
+    """Mark a customer's pending reminders paid once the balance is no longer negative."""
+    from .models import Customer, PaymentReminder, UserLedgerSummary
+    from .versions import bump_ledger_versions
+
+    customer = Customer.objects.filter(pk=customer_id).values('account_balance', 'user_id').first()
+    if customer is None or customer['account_balance'] < 0:
+        return 0
+    settled = PaymentReminder.objects.filter(customer_id=customer_id, status='pending').update(
+        status='paid', bucket='settled'
+    )
+    if settled:
+        UserLedgerSummary.refresh_reminder_counts([customer['user_id']])
+        Customer.refresh_overdue_counts([customer_id])
+        bump_ledger_versions([customer['user_id']])
+    return settled
+
+
+@shared_task(ignore_result=True)
+def sweep_payment_reminders():
+    from .reminders import sweep_reminders
+
+    sweep_reminders()
+
+
+@shared_task(ignore_result=True)
+def dispatch_payment_reminders():
+    from .notifications import dispatch_reminders
+
+    dispatch_reminders()
+
+
+@shared_task(ignore_result=True)
+def reconcile_customer_balance(customer_id):
+    """Recompute one customer's balance and ledger aggregates from the full ledger."""
+    from .models import Customer
+
+    customer = Customer.objects.filter(pk=customer_id).first()
+    if customer is not None:
+        customer.update_account_balance()
+
+
+@shared_task(ignore_result=True)
+def reconcile_all_balances():
+    call_command('reconcile_balances', '--fix')
+
+
+@shared_task(ignore_result=True)
+def build_balance_checkpoints(customer_ids=None):
+    """Extend month-end balance checkpoints (all customers by default) up to last month."""
+    from .checkpoints import build_checkpoints
+
+    return build_checkpoints(customer_ids=customer_ids)
+
+
+@shared_task(ignore_result=True)
+def purge_expired_otps():
+    """Delete used and expired EmailOTP rows (the database OTP store)."""
+    from .otp import purge_expired_otps as purge
+
+    return purge()
+
+
+@shared_task(ignore_result=True)
+def generate_bill_image_variants(transaction_id):
+    """
+    Write the resized WebP/JPEG copies of a transaction's bill image. The
+    write that queued this has committed already, so a bad image is logged
+    and marked failed instead of raising.
+    """
+    from .images import VARIANTS_FAILED, store_variants
+    from .models import Transaction
+    from .utils import delete_media_files as delete_files
+    from .versions import bump_ledger_versions
+
+    row = Transaction.objects.filter(pk=transaction_id).values_list('bill_image', 'customer__user_id').first()
+    original, user_id = row or (None, None)
+    if not original:
+        return {}
+    try:
+        variants = store_variants(original)
+    except Exception:
+        # Unreadable files, decompression bombs, broken EXIF data, storage errors...
+        logger.exception("Could not create variants of bill image %s", original)
+        Transaction.objects.filter(pk=transaction_id, bill_image=original).update(bill_image_variants=VARIANTS_FAILED)
+        return {}
+
+    # Only attach them if the image was not replaced or removed meanwhile
+    if not Transaction.objects.filter(pk=transaction_id, bill_image=original).update(bill_image_variants=variants):
+        delete_files(variants.values())
+        return {}
+    bump_ledger_versions([user_id])
+    return variants
+
+
+@shared_task(ignore_result=True)
+def delete_media_files(names):
+    from .utils import delete_media_files as delete_files
+
+    return delete_files(names)
+
+
+@shared_task(bind=True, ignore_result=True, max_retries=5)
+def send_email(self, payload):
+    """Send a serialized email (see mailer.message_to_payload), retrying with backoff."""
+    from .mailer import message_from_payload, worker
+
+    # The worker retries in-process first; hand the rest back to Celery
+    if worker.deliver([message_from_payload(payload)]):
+        raise self.retry(countdown=30 * 2 ** self.request.retries)
@@ -1,3 +1,1926 @@
-from django.test import TestCase
+from datetime import date, timedelta
+from decimal import Decimal
+from smtplib import SMTPServerDisconnected
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.mail.backends import locmem
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .models import Customer, PaymentReminder, PendingUser, Transaction, User, UserLedgerSummary
+from .search import SQLiteFTSSearchBackend, search_transactions
+
+PAGE_SIZES = (1, 20, 100)
+
+
+class QueryCountTests(TestCase):
+    """
+    Freeze the number of queries each list/detail endpoint runs. The count
+    must not depend on the page size; if one of these fails after a change,
+    a serializer is most likely reading a field the queryset does not load.
+    Counts include the SAVEPOINT / RELEASE pair that ATOMIC_REQUESTS adds
+    inside a test transaction.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+
+        Customer.objects.bulk_create([
+            Customer(user=cls.user, name=f'Customer {i}', contact_number=f'98{i:08d}', address='Market road')
+            for i in range(120)
+        ] + [Customer(user=other, name='Other', contact_number='9999999999', address='Elsewhere')])
+        customers = list(Customer.objects.filter(user=cls.user).order_by('id'))
+        cls.customer = customers[0]
+
+        today = date.today()
+        Transaction.objects.bulk_create(
+            [
+                Transaction(customer=customer, amount=Decimal('100.00'), transaction_type='debit',
+                            date=today - timedelta(days=i % 90), bill_image=f'bill_images/{i}.jpg')
+                for i, customer in enumerate(customers)
+            ] + [
+                Transaction(customer=cls.customer, amount=Decimal(i + 1), transaction_type='credit',
+                            date=today - timedelta(days=i))
+                for i in range(120)
+            ]
+        )
+        transactions = list(Transaction.objects.filter(customer__user=cls.user).order_by('id')[:120])
+        cls.transaction = transactions[0]
+
+        # Two reminders per transaction, spread over overdue / due today / upcoming
+        PaymentReminder.objects.bulk_create([
+            PaymentReminder(customer_id=txn.customer_id, transaction=txn, amount_due=Decimal('50.00'),
+                            reminder_date=today + timedelta(days=i % 7 - 3))
+            for i, txn in enumerate(transactions * 2)
+        ])
+        cls.reminder = PaymentReminder.objects.filter(customer__user=cls.user).first()
+        # bulk_create skips the write-path bookkeeping
+        UserLedgerSummary.rebuild(user_ids=[cls.user.pk, other.pk])
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertQueriesAtEveryPageSize(self, num, url):
+        separator = '&' if '?' in url else '?'
+        for page_size in PAGE_SIZES:
+            with self.subTest(url=url, page_size=page_size):
+                with self.assertNumQueries(num):
+                    response = self.client.get(f'{url}{separator}page_size={page_size}')
+                self.assertEqual(response.status_code, 200, response.content)
+                self.assertEqual(len(response.data['results']), page_size)
+
+    def test_customer_list(self):
+        self.assertQueriesAtEveryPageSize(4, '/api/customers/')
+        self.assertQueriesAtEveryPageSize(3, '/api/customers/?count=false')
+        self.assertQueriesAtEveryPageSize(3, '/api/customers/?cursor=')
+
+    def test_transaction_list(self):
+        self.assertQueriesAtEveryPageSize(4, '/api/transactions/')
+        self.assertQueriesAtEveryPageSize(3, '/api/transactions/?cursor=')
+        self.assertQueriesAtEveryPageSize(4, '/api/transactions/?transaction_type=credit')
+
+    def test_customer_transactions(self):
+        self.assertQueriesAtEveryPageSize(5, f'/api/customers/{self.customer.pk}/transactions/')
+        self.assertQueriesAtEveryPageSize(4, f'/api/customers/{self.customer.pk}/transactions/?cursor=')
+
+    def test_payment_reminder_list(self):
+        self.assertQueriesAtEveryPageSize(4, '/api/payment-reminders/')
+        self.assertQueriesAtEveryPageSize(3, '/api/payment-reminders/?cursor=')
+        self.assertQueriesAtEveryPageSize(5, '/api/payment-reminders/?payment_status=overdue')
+
+    def test_customer_statement(self):
+        self.assertQueriesAtEveryPageSize(4, f'/api/customers/{self.customer.pk}/statement/')
+
+    def test_detail_endpoints(self):
+        for num, url in [
+            (3, f'/api/customers/{self.customer.pk}/'),
+            (3, f'/api/transactions/{self.transaction.pk}/'),
+            (3, f'/api/payment-reminders/{self.reminder.pk}/'),
+            (3, '/api/user/transaction-summary/'),
+            (4, '/api/payment-reminders/counts/'),
+            (5, f'/api/customers/{self.customer.pk}/balance/'),
+        ]:
+            with self.subTest(url=url):
+                with self.assertNumQueries(num):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, 200, response.content)
+
+
+# The harness times its own requests; the request log would only print its
+# logins (full-strength password hashing) as slow
+@override_settings(PASSWORD_HASH_ITERATIONS=1000, PERFORMANCE_METRICS_ENABLED=False)
+class BenchmarkHarnessTests(TestCase):
+    """Keep the synthetic data generator and the benchmark scenarios runnable."""
+
+    def test_generated_ledger_is_consistent_and_benchmarks_run(self):
+        from .benchmarks import SCENARIOS, run_benchmarks
+        from .synthetic import clear_ledger, generate_ledger
+
+        counts = generate_ledger(users=2, customers=5, transactions=8, seed=7)
+        self.assertEqual(counts['users'], 2)
+
+        for customer in Customer.objects.filter(user__email__endswith='@bench.example.com'):
+            self.assertEqual(customer.account_balance, customer.current_balance)
+
+        results = run_benchmarks(iterations=2, warmup=0)
+        self.assertEqual(set(results['scenarios']), set(SCENARIOS))
+        for name, summary in results['scenarios'].items():
+            self.assertEqual(summary['errors'], 0, name)
+            self.assertEqual(summary['iterations'], 2, name)
+
+        self.assertEqual(clear_ledger(), 2)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], REPLICA_PIN_SECONDS=60)
+class ReplicaRoutingTests(TestCase):
+    """
+    'default' and 'replica' are two separate SQLite databases here with no
+    replication between them, so every response shows where it was read from.
+    """
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.primary_customer = Customer.objects.create(
+            user=self.user, name='On primary', contact_number='1', address='Market road'
+        )
+        User.objects.using('replica').bulk_create([User(pk=self.user.pk, email=self.user.email, mobile_number='9000000000')])
+        Customer.objects.using('replica').bulk_create([
+            Customer(pk=self.primary_customer.pk, user_id=self.user.pk, name='On replica', contact_number='1', address='Market road')
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def customer_names(self):
+        response = self.client.get('/api/customers/')
+        self.assertEqual(response.status_code, 200)
+        return [customer['name'] for customer in response.data['results']]
+
+    def test_list_reads_go_to_the_replica(self):
+        self.assertEqual(self.customer_names(), ['On replica'])
+
+    def test_detail_reads_stay_on_the_primary(self):
+        response = self.client.get(f'/api/customers/{self.primary_customer.pk}/')
+        self.assertEqual(response.data['name'], 'On primary')
+
+    def test_export_streams_from_the_replica(self):
+        Transaction.objects.using('replica').bulk_create([
+            Transaction(customer_id=self.primary_customer.pk, amount=Decimal('5.00'), transaction_type='credit', date=date.today())
+        ])
+        response = self.client.get('/api/transactions/export/')
+        body = b''.join(response.streaming_content).decode()
+        self.assertIn('On replica', body)
+
+    def test_user_reads_own_writes_after_a_write(self):
+        response = self.client.post('/api/customers/', {
+            'name': 'New', 'contact_number': '2', 'address': 'Market road'
+        }, format='json')
+        self.assertEqual(response.status_code, 201)
+        # Pinned to the primary, so the new customer is visible at once
+        self.assertEqual(sorted(self.customer_names()), ['New', 'On primary'])
+
+        other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+        User.objects.using('replica').bulk_create([User(pk=other.pk, email=other.email, mobile_number='9000000001')])
+        self.client.force_authenticate(other)
+        self.assertEqual(self.customer_names(), [])
+
+        # Once the pin expires the replica serves reads again
+        cache.clear()
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.customer_names(), ['On replica'])
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(Customer.objects.get(pk=self.primary_customer.pk).name, 'On primary')
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.client = APIClient()
+
+    def login(self, username, password='secret'):
+        return self.client.post('/api/signin/', {'username': username, 'password': password}, format='json')
+
+    def test_email_and_mobile_number_log_in(self):
+        for username in ('owner@gmail.com', '9000000000'):
+            response = self.login(username)
+            self.assertEqual(response.status_code, 200, username)
+            self.assertEqual(response.data['email'], 'owner@gmail.com')
+
+    def test_wrong_password_is_rejected(self):
+        for username in ('owner@gmail.com', '9000000000', 'nobody@gmail.com'):
+            self.assertEqual(self.login(username, 'wrong').status_code, 401, username)
+
+    def test_inactive_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.login('owner@gmail.com').status_code, 401)
+
+    def test_login_reuses_the_token(self):
+        first = self.login('owner@gmail.com').data['token']
+        # user lookup, token lookup and the ATOMIC_REQUESTS savepoint pair
+        with self.assertNumQueries(4):
+            second = self.login('9000000000').data['token']
+        self.assertEqual(first, second)
+
+    @override_settings(AUTH_TOKEN_ROTATE_ON_LOGIN=True)
+    def test_login_can_rotate_the_token(self):
+        first = self.login('owner@gmail.com').data['token']
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {first}')
+        self.assertEqual(self.client.get('/api/user/profile/').status_code, 200)
+
+        second = self.login('owner@gmail.com').data['token']
+        self.assertNotEqual(first, second)
+        self.assertEqual(self.client.get('/api/user/profile/').status_code, 401)
+
+    def test_changed_iteration_count_rehashes_on_login(self):
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login('owner@gmail.com').status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$2000$'))
+
+
+class PerformanceMiddlewareTests(TestCase):
+    """Every request is timed, counted and logged; slow ones at WARNING; /api/metrics/ exposes the totals."""
+
+    def setUp(self):
+        from .metrics import registry
+
+        from rest_framework.authtoken.models import Token
+
+        registry.reset()
+        self.addCleanup(registry.reset)
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        Token.objects.create(user=self.user)
+        customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        Transaction.objects.create(customer=customer, amount=Decimal('10'), transaction_type='debit', date=date.today())
+
+    def client_for(self, user=None):
+        # A new client loads the middleware, and so the settings, afresh
+        client = APIClient()
+        if user is not None:
+            client.force_authenticate(user)
+        return client
+
+    def logged(self, records):
+        import json
+
+        return [json.loads(record.getMessage()) for record in records]
+
+    def test_server_timing_and_query_count(self):
+        import re
+
+        with CaptureQueriesContext(connection) as queries, self.assertLogs('creditapp.performance', 'INFO') as logs:
+            response = self.client_for(self.user).get('/api/user/profile/')
+        self.assertEqual(response.status_code, 200)
+        timing = re.fullmatch(
+            r'db;desc="(\d+) queries";dur=[\d.]+, serializer;dur=[\d.]+, total;dur=[\d.]+', response['Server-Timing']
+        )
+        self.assertIsNotNone(timing, response['Server-Timing'])
+        [line] = self.logged(logs.records)
+        self.assertEqual(line['view'], 'get_user_profile')
+        self.assertEqual(line['db_queries'], len(queries))
+        self.assertEqual(int(timing.group(1)), len(queries))
+        self.assertEqual((line['status'], line['response_bytes'], line['slow']), (200, len(response.content), False))
+
+    def test_streamed_response_is_measured_to_the_last_chunk(self):
+        response = self.client_for(self.user).get('/api/transactions/export/', {'file_format': 'csv'})
+        self.assertNotIn('Server-Timing', response)
+        with self.assertLogs('creditapp.performance', 'INFO') as logs:
+            body = b''.join(response.streaming_content)
+        [line] = self.logged(logs.records)
+        self.assertEqual((line['view'], line['response_bytes']), ('TransactionExportView', len(body)))
+        # Includes the query that read the rows while streaming
+        self.assertGreaterEqual(line['db_queries'], 1)
+
+    @override_settings(PERFORMANCE_SLOW_REQUEST_MS=0)
+    def test_slow_requests_are_logged_as_warnings(self):
+        with self.assertLogs('creditapp.performance', 'WARNING') as logs:
+            self.client_for(self.user).get('/api/user/profile/')
+        [line] = self.logged(logs.records)
+        self.assertTrue(line['slow'])
+
+        with override_settings(PERFORMANCE_SLOW_VIEW_MS={'get_user_profile': 60000}), \
+                self.assertLogs('creditapp.performance', 'INFO') as logs:
+            self.client_for(self.user).get('/api/user/profile/')
+        self.assertEqual([record.levelname for record in logs.records], ['INFO'])
+
+    @override_settings(PERFORMANCE_SLOW_QUERY_COUNT=1)
+    def test_query_count_threshold(self):
+        with self.assertLogs('creditapp.performance', 'WARNING'):
+            self.client_for(self.user).get('/api/user/profile/')
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_metrics_endpoint(self):
+        with self.assertLogs('creditapp.performance', 'INFO'):
+            self.client_for(self.user).get('/api/user/profile/')
+
+        self.assertIn(self.client_for().get('/api/metrics/').status_code, (401, 403))
+        self.assertEqual(self.client_for(self.user).get('/api/metrics/').status_code, 403)
+        wrong = self.client_for()
+        wrong.credentials(HTTP_AUTHORIZATION='Bearer guess')
+        self.assertIn(wrong.get('/api/metrics/').status_code, (401, 403))
+
+        scraper = self.client_for()
+        scraper.credentials(HTTP_AUTHORIZATION='Bearer scrape-secret')
+        with self.assertLogs('creditapp.performance', 'INFO'):
+            response = scraper.get('/api/metrics/')
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        body = response.content.decode()
+        labels = 'view="get_user_profile",method="GET",status="200"'
+        self.assertIn(f'creditapp_request_duration_seconds_bucket{{{labels},le="+Inf"}} 1', body)
+        self.assertIn(f'creditapp_request_duration_seconds_count{{{labels}}} 1', body)
+        self.assertIn(f'creditapp_slow_requests_total{{{labels}}} 0', body)
+        self.assertIn('# TYPE creditapp_token_cache_hits_total counter', body)
+
+        staff = User.objects.create_user(email='staff@gmail.com', mobile_number='9000000001', password='secret',
+                                         is_staff=True)
+        with self.assertLogs('creditapp.performance', 'INFO'):
+            self.assertEqual(self.client_for(staff).get('/api/metrics/').status_code, 200)
+
+
+class FlakyEmailBackend(locmem.EmailBackend):
+    """locmem backend that fails the next ``failures`` sends and counts the connections opened."""
+    failures = 0
+    opened = 0
+
+    def open(self):
+        FlakyEmailBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        if FlakyEmailBackend.failures:
+            FlakyEmailBackend.failures -= 1
+            raise SMTPServerDisconnected('Connection unexpectedly closed')
+        return super().send_messages(messages)
+
+
+@override_settings(EMAIL_BACKEND='creditapp.tests.FlakyEmailBackend')
+class EmailDeliveryWorkerTests(TestCase):
+    """Queued mail goes out in batches over one connection each, with retries and backpressure."""
+
+    def setUp(self):
+        from unittest import mock
+
+        from django.core import mail
+
+        mail.outbox = []
+        FlakyEmailBackend.failures = FlakyEmailBackend.opened = 0
+        sleep = mock.patch('creditapp.mailer.time.sleep')
+        self.sleep = sleep.start()
+        self.addCleanup(sleep.stop)
+
+    def worker(self, **options):
+        from .mailer import EmailDeliveryWorker
+
+        return EmailDeliveryWorker(**{'backoff': 1.0, **options})
+
+    @staticmethod
+    def message(i):
+        from django.core.mail import EmailMultiAlternatives
+
+        return EmailMultiAlternatives(f'Code {i}', 'body', None, [f'user{i}@gmail.com'])
+
+    def queue_without_worker(self, worker, count, timeout=1.0):
+        from unittest import mock
+
+        with mock.patch.object(worker, '_ensure_started'):
+            for i in range(count):
+                worker.submit(self.message(i), timeout=timeout)
+
+    def test_batches_share_a_connection(self):
+        from django.core import mail
+
+        worker = self.worker(batch_size=2)
+        self.queue_without_worker(worker, 5)
+        worker._ensure_started()
+        worker.flush()
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(FlakyEmailBackend.opened, 3)
+
+    def test_failures_are_retried_with_backoff(self):
+        from django.core import mail
+
+        FlakyEmailBackend.failures = 2
+        with self.assertLogs('creditapp.mailer', 'WARNING'):
+            self.assertEqual(self.worker(max_retries=3).deliver([self.message(1)]), 0)
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual([call.args[0] for call in self.sleep.call_args_list], [1.0, 2.0])
+
+    def test_gives_up_after_max_retries(self):
+        from django.core import mail
+
+        FlakyEmailBackend.failures = 10
+        with self.assertLogs('creditapp.mailer', 'ERROR') as logs:
+            self.assertEqual(self.worker(max_retries=2).deliver([self.message(1)]), 1)
+        self.assertEqual(mail.outbox, [])
+        self.assertIn('Giving up on email', logs.output[-1])
+
+    def test_full_queue_sends_inline(self):
+        from django.core import mail
+
+        worker = self.worker(maxsize=1)
+        with self.assertLogs('creditapp.mailer', 'WARNING'):
+            self.queue_without_worker(worker, 2, timeout=0.01)
+        self.assertEqual([message.subject for message in mail.outbox], ['Code 1'])
+
+    def test_shutdown_sends_queued_mail(self):
+        from django.core import mail
+
+        worker = self.worker()
+        self.queue_without_worker(worker, 3)
+        worker.shutdown(timeout=0)
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(worker._queue.unfinished_tasks, 0)
+
+
+class TokenCacheTests(TestCase):
+    """Cached tokens authenticate without queries and stop working as soon as they are revoked."""
+
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def profile(self):
+        return self.client.get('/api/user/profile/')
+
+    def test_second_request_is_served_from_the_cache(self):
+        from .authentication import _token_cache_key
+
+        self.assertEqual(self.profile().status_code, 200)
+        entry = cache.get(_token_cache_key(self.token.key))
+        self.assertEqual(entry['user']['id'], self.user.pk)
+        self.assertNotIn('password', entry['user'])
+
+        # No token or user query on a hit
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.profile().status_code, 200)
+        self.assertFalse([q for q in queries if 'authtoken_token' in q['sql']])
+
+    def test_logout_and_token_deletion_revoke_the_cached_token(self):
+        from rest_framework.authtoken.models import Token
+
+        self.assertEqual(self.profile().status_code, 200)
+        self.assertEqual(self.client.post('/api/logout/').status_code, 200)
+        self.assertEqual(self.profile().status_code, 401)
+
+        token = Token.objects.create(user=self.user)
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(self.profile().status_code, 200)
+        Token.objects.filter(user=self.user).delete()
+        self.assertEqual(self.profile().status_code, 401)
+
+    @override_settings(PASSWORD_HASH_ITERATIONS=1000, AUTH_TOKEN_ROTATE_ON_LOGIN=True)
+    def test_rotating_login_revokes_the_previous_token(self):
+        self.assertEqual(self.profile().status_code, 200)
+        response = self.client.post('/api/signin/', {'username': 'owner@gmail.com', 'password': 'secret'}, format='json')
+        self.assertNotEqual(response.data['token'], self.token.key)
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_user_changes_and_deletion(self):
+        self.assertEqual(self.profile().status_code, 200)
+        User.objects.filter(pk=self.user.pk).update(first_name='Asha')
+        self.user.refresh_from_db()
+        self.user.save()
+        self.assertEqual(self.profile().json()['first_name'], 'Asha')
+
+        self.user.delete()
+        self.assertEqual(self.profile().status_code, 401)
+
+    def test_lookup_racing_a_revocation_is_not_cached(self):
+        from .authentication import REVOKED, CachedTokenAuthentication, _token_cache_key, invalidate_user_token
+
+        # The token was read from the database before its revocation was recorded
+        invalidate_user_token(self.user.pk, self.token.key)
+        CachedTokenAuthentication().authenticate_credentials(self.token.key)
+        self.assertEqual(cache.get(_token_cache_key(self.token.key)), REVOKED)
+
+
+@override_settings(
+    EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', EMAIL_DELIVERY_MODE='sync',
+    OTP_STORE='cache', PASSWORD_HASH_ITERATIONS=1000, OTP_RATE_LIMITS={'send_per_email': (2, 3600), 'send_per_ip': (3, 3600), 'verify_per_ip': (4, 600)},
+)
+class EmailOTPTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def sent_otp(self):
+        from django.core import mail
+        return mail.outbox[-1].body.rsplit(' ', 1)[-1]
+
+    def signup(self, email='new@gmail.com'):
+        return self.client.post('/api/signup/', {
+            'email': email, 'first_name': 'New', 'mobile_number': '9100000000', 'password': 'Secret@123',
+        }, format='json')
+
+    def verify(self, otp, email='new@gmail.com'):
+        return self.client.post('/api/verify-email-otp/', {'email': email, 'otp': otp, 'action': 'signup'}, format='json')
+
+    def test_signup_verification(self):
+        self.assertEqual(self.signup().status_code, 200)
+        otp = self.sent_otp()
+        self.assertEqual(self.verify(otp).status_code, 201)
+        self.assertTrue(User.objects.filter(email='new@gmail.com').exists())
+        # Used up
+        self.assertEqual(self.verify(otp).status_code, 400)
+
+    def test_cache_store_verification_does_not_query_the_database(self):
+        from .otp import get_otp_store
+
+        store = get_otp_store()
+        otp = store.issue('bot@gmail.com', ip='10.0.0.1')
+        with self.assertNumQueries(0):
+            self.assertFalse(store.verify('bot@gmail.com', '000000', ip='10.0.0.1'))
+            self.assertFalse(store.verify('nobody@gmail.com', otp, ip='10.0.0.1'))
+            self.assertTrue(store.verify('bot@gmail.com', otp, ip='10.0.0.1'))
+
+    @override_settings(OTP_STORE='database')
+    def test_database_store(self):
+        from .models import EmailOTP
+        from .otp import get_otp_store, purge_expired_otps
+
+        store = get_otp_store()
+        store.issue('a@gmail.com')
+        otp = store.issue('a@gmail.com')
+        self.assertEqual(EmailOTP.objects.filter(email='a@gmail.com').count(), 1)
+        self.assertTrue(store.verify('a@gmail.com', otp))
+        self.assertFalse(EmailOTP.objects.exists())
+
+        store.issue('b@gmail.com')
+        EmailOTP.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        self.assertFalse(store.verify('b@gmail.com', EmailOTP.objects.get().otp))
+        self.assertEqual(purge_expired_otps(), 1)
+
+    @override_settings(OTP_STORE='cache')
+    def test_concurrent_verifications_use_the_code_once(self):
+        from .otp import get_otp_store
+
+        store = get_otp_store()
+        otp = store.issue('a@gmail.com')
+        # Both requests read the code before either deletes it
+        cached = [store.cache.get_many(store.cached_keys('a@gmail.com')) for _ in range(2)]
+        self.assertEqual([store.consume('a@gmail.com', otp, values) for values in cached], [True, False])
+
+    @override_settings(OTP_MAX_ATTEMPTS=3)
+    def test_wrong_guesses_discard_the_code(self):
+        from .otp import get_otp_store
+
+        store = get_otp_store()
+        otp = store.issue('a@gmail.com')
+        for _ in range(3):
+            self.assertFalse(store.verify('a@gmail.com', '000000' if otp != '000000' else '111111'))
+        self.assertFalse(store.verify('a@gmail.com', otp))
+
+    def test_store_must_implement_every_storage_method(self):
+        from .otp import OTPStore
+
+        class PartialStore(OTPStore):
+            def save(self, email, otp):
+                pass
+
+        with self.assertRaises(TypeError):
+            PartialStore()
+
+    def test_send_and_verify_rate_limits(self):
+        self.assertEqual(self.signup().status_code, 200)
+        resend = lambda: self.client.post('/api/send-email-otp/', {'email': 'new@gmail.com'}, format='json')
+        self.assertEqual(resend().status_code, 200)
+        response = resend()
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '3600')
+
+        # Per IP: a fourth address from the same client is refused
+        self.assertEqual(self.signup('other@gmail.com').status_code, 429)
+        self.assertFalse(PendingUser.objects.filter(email='other@gmail.com').exists())
+
+        for _ in range(4):
+            self.assertEqual(self.verify('000000').status_code, 400)
+        self.assertEqual(self.verify(self.sent_otp()).status_code, 429)
+
+
+class FakeGoogle:
+    """
+    Local stand-in for Google's JWKS and userinfo endpoints, on a random port.
+    ``rotate()`` switches to a new signing key; ``requests`` counts the hits per path.
+    """
+
+    def __init__(self):
+        import json
+        import threading
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+        self.keys = []
+        self.requests = {}
+        self.userinfo = {}
+        self.rotate()
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                fake.requests[self.path] = fake.requests.get(self.path, 0) + 1
+                if self.path == '/certs':
+                    status, body = 200, {'keys': [public for _, _, public in fake.keys]}
+                elif self.path == '/userinfo':
+                    info = fake.userinfo.get(self.headers.get('Authorization', '').removeprefix('Bearer '))
+                    status, body = (200, info) if info else (401, {'error': 'invalid_token'})
+                else:
+                    status, body = 404, {}
+                # A str body is sent as is, to stand in for a broken response
+                payload = body.encode() if isinstance(body, str) else json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def rotate(self):
+        import json
+        import uuid
+        import jwt
+        from cryptography.hazmat.primitives.asymmetric import rsa
+
+        private_key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        kid = uuid.uuid4().hex
+        public = json.loads(jwt.algorithms.RSAAlgorithm.to_jwk(private_key.public_key()))
+        public.update(kid=kid, alg='RS256', use='sig')
+        # Google publishes the current and the next key
+        self.keys = [(kid, private_key, public)] + self.keys[:1]
+
+    def id_token(self, email='g@gmail.com', audience='test-client', **claims):
+        import time
+        import jwt
+
+        kid, private_key, _ = self.keys[0]
+        now = int(time.time())
+        payload = {
+            'iss': 'https://accounts.google.com', 'aud': audience, 'sub': '1234', 'iat': now, 'exp': now + 3600,
+            'email': email, 'email_verified': True, 'given_name': 'Goo', 'family_name': 'Gle', **claims,
+        }
+        return jwt.encode(payload, private_key, algorithm='RS256', headers={'kid': kid})
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class GoogleLoginTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.google = FakeGoogle()
+        cls.settings_override = override_settings(
+            GOOGLE_CLIENT_IDS=['test-client'],
+            GOOGLE_JWKS_URL=f'{cls.google.url}/certs',
+            GOOGLE_USERINFO_URL=f'{cls.google.url}/userinfo',
+            GOOGLE_JWKS_REFRESH_COOLDOWN_SECONDS=0,
+        )
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        cls.google.close()
+        super().tearDownClass()
+
+    def setUp(self):
+        from . import google_auth
+
+        google_auth._jwks_clients.clear()
+        self.google.requests.clear()
+        self.client = APIClient()
+
+    def login(self, **data):
+        return self.client.post('/api/auth/google/', data, format='json')
+
+    def test_id_token_is_verified_against_cached_keys(self):
+        response = self.login(id_token=self.google.id_token())
+        self.assertEqual(response.status_code, 200, response.content)
+        user = User.objects.get(email='g@gmail.com')
+        self.assertTrue(user.is_verified)
+        self.assertEqual(response.data['token'], self.login(id_token=self.google.id_token()).data['token'])
+        # The second login used the cached key set
+        self.assertEqual(self.google.requests, {'/certs': 1})
+
+    def test_rotated_key_is_fetched_once(self):
+        self.login(id_token=self.google.id_token())
+        self.google.rotate()
+        self.assertEqual(self.login(id_token=self.google.id_token()).status_code, 200)
+        self.assertEqual(self.login(id_token=self.google.id_token()).status_code, 200)
+        self.assertEqual(self.google.requests, {'/certs': 2})
+
+    def test_invalid_id_tokens_are_rejected(self):
+        import time
+
+        tokens = [
+            self.google.id_token(audience='someone-else'),
+            self.google.id_token(iss='https://evil.example.com'),
+            self.google.id_token(exp=int(time.time()) - 3600),
+            self.google.id_token(email_verified=False),
+            self.google.id_token()[:-4] + 'abcd',
+            'not-a-jwt',
+        ]
+        for token in tokens:
+            self.assertEqual(self.login(id_token=token).status_code, 400, token)
+        self.assertFalse(User.objects.exists())
+
+    def test_access_token_uses_userinfo(self):
+        self.google.userinfo['good'] = {'email': 'u@gmail.com', 'verified_email': True, 'given_name': 'U'}
+        self.assertEqual(self.login(access_token='good').status_code, 200)
+        self.assertEqual(self.login(access_token='bad').status_code, 400)
+        self.assertEqual(self.login().status_code, 400)
+        self.assertEqual(self.google.requests, {'/userinfo': 2})
+
+    def test_userinfo_that_is_not_json_is_rejected(self):
+        self.google.userinfo['garbled'] = '<html>Service Unavailable</html>'
+        self.assertEqual(self.login(access_token='garbled').status_code, 400)
+        self.assertFalse(User.objects.exists())
+
+
+class CustomerAggregateTests(TestCase):
+    """The stored per-customer aggregates follow every write and back the list's ordering and filters."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.a = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        self.b = Customer.objects.create(user=self.user, name='B', contact_number='2', address='Market road')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def add(self, customer, amount, transaction_type, day):
+        return Transaction.objects.create(
+            customer=customer, amount=Decimal(amount), transaction_type=transaction_type, date=day
+        )
+
+    def assertAggregates(self, customer, **expected):
+        customer.refresh_from_db()
+        self.assertEqual({field: getattr(customer, field) for field in expected}, expected)
+
+    def test_write_path_keeps_aggregates_current(self):
+        today = date.today()
+        old = self.add(self.a, '100', 'debit', today - timedelta(days=10))
+        latest = self.add(self.a, '40', 'credit', today - timedelta(days=2))
+        self.assertAggregates(self.a, credit_total=Decimal('40'), debit_total=Decimal('100'),
+                              account_balance=Decimal('-60'), last_activity=today - timedelta(days=2))
+
+        # Moving the latest row back in time recomputes last_activity
+        latest.date = today - timedelta(days=20)
+        latest.amount = Decimal('50')
+        latest.save()
+        self.assertAggregates(self.a, credit_total=Decimal('50'), last_activity=today - timedelta(days=10))
+
+        old.delete()
+        self.assertAggregates(self.a, debit_total=Decimal('0'), last_activity=today - timedelta(days=20))
+        latest.delete()
+        self.assertAggregates(self.a, credit_total=Decimal('0'), account_balance=Decimal('0'), last_activity=None)
+
+    def test_negative_amount_matches_a_rebuild(self):
+        self.add(self.a, '100', 'credit', date.today())
+        self.add(self.a, '-30', 'debit', date.today())
+        self.assertAggregates(self.a, credit_total=Decimal('100'), debit_total=Decimal('-30'),
+                              account_balance=Decimal('130'))
+        incremental = {field: getattr(self.a, field) for field in Customer.AGGREGATE_FIELDS}
+        Customer.rebuild_aggregates(customer_ids=[self.a.pk])
+        self.assertAggregates(self.a, **incremental)
+
+    def test_import_moves_last_activity(self):
+        from .imports import import_transactions
+
+        today = date.today()
+        self.add(self.a, '100', 'credit', today - timedelta(days=30))
+        import_transactions(self.user, [
+            {'customer': self.a.pk, 'amount': '25', 'transaction_type': 'debit', 'date': (today - timedelta(days=1)).isoformat()},
+            {'customer': self.b.pk, 'amount': '5', 'transaction_type': 'credit', 'date': (today - timedelta(days=60)).isoformat()},
+        ])
+        self.assertAggregates(self.a, last_activity=today - timedelta(days=1), debit_total=Decimal('25'))
+        self.assertAggregates(self.b, last_activity=today - timedelta(days=60), credit_total=Decimal('5'))
+
+        response = self.client.get('/api/customers/', {'ordering': '-last_activity'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.a.pk, self.b.pk])
+
+    def test_overdue_reminder_count(self):
+        from .reminders import sweep_reminders
+
+        today = date.today()
+        reminder = PaymentReminder.objects.create(customer=self.a, amount_due=Decimal('10'), reminder_date=today - timedelta(days=1))
+        self.assertAggregates(self.a, overdue_reminder_count=1)
+        PaymentReminder.objects.create(customer=self.a, amount_due=Decimal('10'), reminder_date=today + timedelta(days=1))
+        # Becomes overdue in a later sweep
+        sweep_reminders(today=today + timedelta(days=2))
+        self.assertAggregates(self.a, overdue_reminder_count=2)
+        reminder.delete()
+        self.assertAggregates(self.a, overdue_reminder_count=1)
+
+    def test_ordering_and_filters(self):
+        today = date.today()
+        self.add(self.a, '500', 'credit', today - timedelta(days=40))
+        self.add(self.b, '20', 'debit', today - timedelta(days=1))
+        PaymentReminder.objects.create(customer=self.b, amount_due=Decimal('20'), reminder_date=today - timedelta(days=1))
+        c = Customer.objects.create(user=self.user, name='C', contact_number='3', address='Market road')
+
+        def names(**params):
+            response = self.client.get('/api/customers/', params)
+            self.assertEqual(response.status_code, 200, response.content)
+            return [row['name'] for row in response.data['results']]
+
+        self.assertEqual(names(ordering='-last_activity')[:2], ['B', 'A'])
+        self.assertEqual(names(ordering='-credit_total')[0], 'A')
+        self.assertEqual(names(ordering='-overdue_reminder_count')[0], 'B')
+        self.assertEqual(names(active_since=(today - timedelta(days=7)).isoformat()), ['B'])
+        self.assertEqual(sorted(names(inactive_since=(today - timedelta(days=7)).isoformat())), ['A', 'C'])
+        self.assertEqual(names(min_debit_total='10'), ['B'])
+        self.assertEqual(names(has_overdue='true'), ['B'])
+        self.assertEqual(self.client.get('/api/customers/', {'active_since': 'soon'}).status_code, 400)
+
+        row = self.client.get(f'/api/customers/{c.pk}/').data
+        self.assertEqual((row['last_activity'], row['overdue_reminder_count']), (None, 0))
+
+    def test_reconcile_repairs_drifted_aggregates(self):
+        from io import StringIO
+        from django.core.management import call_command
+
+        self.add(self.a, '75', 'debit', date.today())
+        Customer.objects.filter(pk=self.a.pk).update(debit_total=0, last_activity=None, overdue_reminder_count=3)
+        out = StringIO()
+        call_command('reconcile_balances', '--fix', stdout=out)
+        self.assertIn('Repaired 1 of 2 customers', out.getvalue())
+        self.assertAggregates(self.a, debit_total=Decimal('75'), last_activity=date.today(), overdue_reminder_count=0)
+
+
+class ConditionalGetTests(TestCase):
+    """Polled endpoints answer 304 from the ledger version until a write bumps it."""
+
+    POLLED = ('/api/customers/', '/api/user/transaction-summary/', '/api/user/profile/', '/api/transactions/')
+
+    def setUp(self):
+        from rest_framework.authtoken.models import Token
+
+        cache.clear()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+
+    def etags(self):
+        etags = {}
+        for url in self.POLLED:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200, url)
+            self.assertIn('private', response['Cache-Control'])
+            self.assertIn('no-cache', response['Cache-Control'])
+            etags[url] = response['ETag']
+        return etags
+
+    def test_not_modified_skips_the_view_queries(self):
+        etags = self.etags()
+        for url, etag in etags.items():
+            # Only the SAVEPOINT / RELEASE pair of ATOMIC_REQUESTS; the token comes from the cache
+            with self.assertNumQueries(2):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304, url)
+            self.assertEqual(response['ETag'], etag)
+        # Other query strings are other representations
+        response = self.client.get('/api/customers/?ordering=name', HTTP_IF_NONE_MATCH=etags['/api/customers/'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_writes_change_the_etags(self):
+        def changed(write):
+            before = self.etags()
+            with self.captureOnCommitCallbacks(execute=True):
+                write()
+            after = self.etags()
+            return {url for url in self.POLLED if before[url] != after[url]}
+
+        row = Transaction.objects.create(
+            customer=self.customer, amount=Decimal('10'), transaction_type='debit', date=date.today()
+        )
+
+        def edit_transaction():
+            row.amount = Decimal('20')
+            row.save()
+
+        self.assertEqual(changed(edit_transaction), set(self.POLLED))
+        self.assertEqual(changed(lambda: PaymentReminder.objects.create(
+            customer=self.customer, amount_due=Decimal('5'), reminder_date=date.today()
+        )), set(self.POLLED))
+        self.assertEqual(changed(lambda: self.client.patch('/api/edit/', {'first_name': 'New'})), set(self.POLLED))
+        # A response from before the write is not served as current
+        etag = self.client.get('/api/customers/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(f'/api/customers/{self.customer.pk}/')
+        response = self.client.get('/api/customers/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'], [])
+
+    def test_rolled_back_write_keeps_the_version(self):
+        from django.db import transaction as db_transaction
+
+        etag = self.client.get('/api/customers/')['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), db_transaction.atomic():
+                Customer.objects.create(user=self.user, name='B', contact_number='2', address='Market road')
+                raise RuntimeError
+        self.assertEqual(self.client.get('/api/customers/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+
+class LedgerImportTests(TestCase):
+    """Bulk imports keep the same derived state as single writes."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        # A closed month, so it can have a checkpoint
+        self.month = (date.today().replace(day=1) - timedelta(days=70)).replace(day=1)
+
+    def test_back_dated_import_invalidates_checkpoints(self):
+        from .checkpoints import build_checkpoints, month_end, totals_as_of
+        from .imports import import_transactions
+        from .models import BalanceCheckpoint
+
+        Transaction.objects.create(customer=self.customer, amount=Decimal('100'), transaction_type='credit',
+                                   date=self.month + timedelta(days=4))
+        build_checkpoints(customer_ids=[self.customer.pk])
+        period_end = month_end(self.month)
+        self.assertEqual(BalanceCheckpoint.objects.get(customer=self.customer, period_end=period_end).balance, 100)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            result = import_transactions(self.user, [{
+                'customer': self.customer.pk, 'amount': '40', 'transaction_type': 'debit',
+                'date': (self.month + timedelta(days=9)).isoformat(),
+            }])
+        self.assertEqual(result['created'], 1)
+
+        totals = totals_as_of(self.customer.pk, period_end + timedelta(days=1))
+        self.assertEqual((totals['balance'], totals['transactions']), (Decimal('60'), 2))
+        # Rebuilt from the ledger once the import committed
+        checkpoint = BalanceCheckpoint.objects.get(customer=self.customer, period_end=period_end)
+        self.assertEqual((checkpoint.balance, checkpoint.transaction_count), (Decimal('60'), 2))
+
+
+def use_temporary_media(test):
+    """Point MEDIA_ROOT at a directory removed after ``test``; returns the default storage."""
+    import tempfile
+
+    from django.core.files.storage import default_storage
+
+    media = tempfile.TemporaryDirectory()
+    test.addCleanup(media.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=media.name)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    return default_storage
+
+
+class DeleteCustomersTests(TestCase):
+    """delete_customers removes a customer's ledger in one cascade and its files after commit."""
+
+    def setUp(self):
+        from django.core.files.base import ContentFile
+
+        self.storage = use_temporary_media(self)
+
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        self.kept = Customer.objects.create(user=self.user, name='B', contact_number='2', address='Market road')
+        self.files = [self.storage.save(name, ContentFile(b'x')) for name in ('bill_images/a.jpg', 'bill_images/a_thumb.webp')]
+        billed = Transaction.objects.create(customer=self.customer, amount=Decimal('100'), transaction_type='debit',
+                                            date=date.today(), bill_image=self.files[0])
+        # As the variant task records them
+        Transaction.objects.filter(pk=billed.pk).update(bill_image_variants={'thumb_webp': self.files[1]})
+        Transaction.objects.create(customer=self.customer, amount=Decimal('40'), transaction_type='credit', date=date.today())
+        Transaction.objects.create(customer=self.kept, amount=Decimal('5'), transaction_type='debit', date=date.today())
+        PaymentReminder.objects.create(customer=self.customer, amount_due=Decimal('60'), reminder_date=date.today())
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_counts_summary_and_files(self):
+        from .utils import delete_customers
+
+        with self.captureOnCommitCallbacks(execute=True):
+            deleted = delete_customers(Customer.objects.filter(pk=self.customer.pk))
+        self.assertEqual(deleted, {'customers': 1, 'transactions': 2, 'payment_reminders': 1, 'files': 2})
+        self.assertFalse(any(self.storage.exists(name) for name in self.files))
+
+        summary = UserLedgerSummary.objects.get(user=self.user)
+        rebuilt = UserLedgerSummary.totals_by_user(Customer.objects.filter(user=self.user))[self.user.pk]
+        self.assertEqual({field: getattr(summary, field) for field in rebuilt}, rebuilt)
+        self.assertEqual((summary.total_customers, summary.total_debit_amount), (1, Decimal('5')))
+
+    def test_files_are_kept_on_rollback(self):
+        from django.db import transaction
+
+        from .utils import delete_customers
+
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                delete_customers(Customer.objects.filter(pk=self.customer.pk))
+                raise RuntimeError
+        self.assertTrue(all(self.storage.exists(name) for name in self.files))
+        self.assertEqual(Transaction.objects.filter(customer=self.customer).count(), 2)
+
+    def test_delete_route(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.delete(f'/api/customers/delete/{self.customer.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['deleted']['transactions'], 2)
+        self.assertFalse(Customer.objects.filter(pk=self.customer.pk).exists())
+        self.assertFalse(self.storage.exists(self.files[0]))
+
+        # Another user's customer is not found
+        other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.delete(f'/api/customers/delete/{self.kept.pk}/').status_code, 404)
+        self.assertTrue(Customer.objects.filter(pk=self.kept.pk).exists())
+
+
+class BillImageVariantTests(TestCase):
+    """Uploaded bill images get upright, metadata-free WebP/JPEG copies, cleaned up with the original."""
+
+    def setUp(self):
+        self.storage = use_temporary_media(self)
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='x')
+
+    @staticmethod
+    def image_file(size=(2000, 1000), fmt='PNG', mode='RGBA', exif=None, name='bill.png'):
+        import io
+
+        from django.core.files.uploadedfile import SimpleUploadedFile
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        image = Image.new(mode, size, 'red')
+        image.save(buffer, fmt, **({'exif': exif} if exif is not None else {}))
+        return SimpleUploadedFile(name, buffer.getvalue())
+
+    def add(self, bill_image):
+        with self.captureOnCommitCallbacks(execute=True):
+            row = Transaction.objects.create(customer=self.customer, amount=Decimal('10'), transaction_type='debit',
+                                             date=date.today(), bill_image=bill_image)
+        row.refresh_from_db()
+        return row
+
+    def open_variant(self, row, key):
+        from PIL import Image
+
+        with self.storage.open(row.bill_image_variants[key], 'rb') as fh:
+            image = Image.open(fh)
+            image.load()
+        return image
+
+    def test_sizes_and_formats(self):
+        from .images import VARIANT_FORMATS, VARIANT_SIZES
+
+        row = self.add(self.image_file())
+        self.assertEqual(set(row.bill_image_variants), {f'{size}_{fmt}' for size in VARIANT_SIZES for fmt in VARIANT_FORMATS})
+        for size, longest_side in VARIANT_SIZES.items():
+            for fmt, options in VARIANT_FORMATS.items():
+                image = self.open_variant(row, f'{size}_{fmt}')
+                self.assertEqual((image.format, image.mode), (options['format'], 'RGB'))
+                self.assertEqual(image.size, (longest_side, longest_side // 2))
+
+    def test_exif_orientation_is_applied_and_metadata_dropped(self):
+        from PIL import Image
+
+        exif = Image.Exif()
+        exif[0x0112] = 6  # Rotated 90 degrees: stored landscape, shown portrait
+        exif[0x010F] = 'Camera maker'
+        row = self.add(self.image_file((300, 200), 'JPEG', 'RGB', exif=exif.tobytes(), name='bill.jpg'))
+        for key in row.bill_image_variants:
+            image = self.open_variant(row, key)
+            self.assertEqual(image.size, (200, 300), key)
+            self.assertFalse(dict(image.getexif()), key)
+
+    def test_replacing_and_deleting_remove_old_files(self):
+        row = self.add(self.image_file())
+        old_files = row.media_files()
+        self.assertEqual(len(old_files), 5)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            row.bill_image = self.image_file(name='new.png')
+            row.save()
+        row.refresh_from_db()
+        self.assertFalse(any(self.storage.exists(name) for name in old_files))
+        new_files = row.media_files()
+        self.assertEqual(len(new_files), 5)
+        self.assertTrue(all(self.storage.exists(name) for name in new_files))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            row.delete()
+        self.assertFalse(any(self.storage.exists(name) for name in new_files))
+
+    def test_unrenderable_image_is_marked_failed(self):
+        from unittest import mock
+
+        from PIL import Image
+
+        from .images import VARIANTS_FAILED
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        for error in (Image.DecompressionBombError('too big'), ValueError('bad EXIF'), OSError('truncated')):
+            with mock.patch('creditapp.images.render_variants', side_effect=error), \
+                    self.assertLogs('creditapp.tasks', 'ERROR'), self.captureOnCommitCallbacks(execute=True):
+                response = client.post('/api/transactions/', {
+                    'customer': self.customer.pk, 'amount': '10', 'transaction_type': 'debit',
+                    'date': date.today().isoformat(), 'bill_image': self.image_file(),
+                }, format='multipart')
+            self.assertEqual(response.status_code, 201, error)
+            self.assertEqual(response.data['bill_image_variants'], {})
+            row = Transaction.objects.get(pk=response.data['id'])
+            self.assertEqual(row.bill_image_variants, VARIANTS_FAILED)
+            self.assertEqual(row.media_files(), [row.bill_image.name])
+
+    def test_backfill_command(self):
+        import io
+        from concurrent.futures import ThreadPoolExecutor
+        from unittest import mock
+
+        from django.core.files.base import ContentFile
+        from django.core.management import call_command
+
+        from .images import VARIANTS_FAILED
+
+        good = self.storage.save('bill_images/good.png', self.image_file())
+        bad = self.storage.save('bill_images/bad.png', ContentFile(b'not an image'))
+        rows = Transaction.objects.bulk_create([
+            Transaction(customer=self.customer, amount=Decimal('1'), transaction_type='debit', date=date.today(),
+                        bill_image=name)
+            for name in (good, bad)
+        ])
+
+        # Threads instead of worker processes, so the test database stays visible
+        command = 'creditapp.management.commands.backfill_bill_image_variants.ProcessPoolExecutor'
+        with mock.patch(command, ThreadPoolExecutor), self.assertLogs('creditapp.images', 'ERROR'):
+            out = io.StringIO()
+            call_command('backfill_bill_image_variants', workers=1, stdout=out)
+        self.assertIn('for 1 bill images (1 failed)', out.getvalue())
+        good_row, bad_row = Transaction.objects.filter(pk__in=[row.pk for row in rows]).order_by('pk')
+        self.assertEqual(len(good_row.bill_image_variants), 4)
+        self.assertEqual(bad_row.bill_image_variants, VARIANTS_FAILED)
+
+        # Nothing left to do, until --force
+        with mock.patch(command, ThreadPoolExecutor):
+            out = io.StringIO()
+            call_command('backfill_bill_image_variants', workers=1, stdout=out)
+        self.assertIn('for 0 bill images (0 failed)', out.getvalue())
+
+
+class ExportTests(TestCase):
+    """The exports stream every matching row, in every format, with the list's filters."""
+
+    url = '/api/transactions/export/'
+    header = ['id', 'customer_id', 'customer_name', 'amount', 'transaction_type',
+              'payment_mode', 'date', 'description', 'created_at']
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='Ramesh', contact_number='1', address='x')
+        self.rows = [
+            Transaction.objects.create(customer=self.customer, amount=Decimal(amount), transaction_type=kind,
+                                       date=date.today(), description=description)
+            for amount, kind, description in (
+                ('10.50', 'debit', 'Cement <bags> & "sand"'),
+                ('99.00', 'credit', 'Payment\x01 received'),
+                ('5.00', 'debit', None),
+            )
+        ]
+        other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+        theirs = Customer.objects.create(user=other, name='Ramesh', contact_number='2', address='x')
+        Transaction.objects.create(customer=theirs, amount=Decimal('1'), transaction_type='debit', date=date.today(),
+                                   description='Cement')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def export(self, file_format, **params):
+        response = self.client.get(self.url, {'file_format': file_format, **params})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content)
+
+    def xlsx_rows(self, body):
+        import io
+        import zipfile
+        from xml.etree import ElementTree
+
+        namespace = {'s': 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'}
+        with zipfile.ZipFile(io.BytesIO(body)) as archive:
+            self.assertIsNone(archive.testzip())
+            self.assertIn('xl/workbook.xml', archive.namelist())
+            sheet = ElementTree.fromstring(archive.read('xl/worksheets/sheet1.xml'))
+        return [
+            [''.join(cell.itertext()) for cell in row.findall('s:c', namespace)]
+            for row in sheet.findall('s:sheetData/s:row', namespace)
+        ]
+
+    def test_csv(self):
+        import csv
+        import io
+
+        lines = list(csv.reader(io.StringIO(self.export('csv').decode())))
+        self.assertEqual(lines[0], self.header)
+        self.assertEqual([int(line[0]) for line in lines[1:]], [row.id for row in reversed(self.rows)])
+        first = dict(zip(self.header, lines[-1]))
+        self.assertEqual((first['customer_name'], first['amount'], first['description']),
+                         ('Ramesh', '10.50', 'Cement <bags> & "sand"'))
+
+    def test_ndjson(self):
+        import json
+
+        records = [json.loads(line) for line in self.export('ndjson').decode().splitlines()]
+        self.assertEqual([record['id'] for record in records], [row.id for row in reversed(self.rows)])
+        self.assertEqual(set(records[0]), set(self.header))
+        self.assertEqual((records[-1]['amount'], records[0]['description']), ('10.50', None))
+
+    def test_xlsx_opens_as_a_workbook(self):
+        rows = self.xlsx_rows(self.export('xlsx'))
+        self.assertEqual(rows[0], self.header)
+        self.assertEqual([int(row[0]) for row in rows[1:]], [row.id for row in reversed(self.rows)])
+        by_id = {int(row[0]): dict(zip(self.header, row)) for row in rows[1:]}
+        self.assertEqual(by_id[self.rows[0].id]['description'], 'Cement <bags> & "sand"')
+        # Characters XML cannot hold are dropped
+        self.assertEqual(by_id[self.rows[1].id]['description'], 'Payment received')
+        self.assertEqual(by_id[self.rows[1].id]['amount'], '99.00')
+
+    def test_filters_search_and_ordering(self):
+        import json
+
+        def ids(**params):
+            return [json.loads(line)['id'] for line in self.export('ndjson', **params).decode().splitlines()]
+
+        self.assertEqual(ids(transaction_type='debit', ordering='amount'), [self.rows[2].id, self.rows[0].id])
+        self.assertEqual(ids(search='cement'), [self.rows[0].id])
+        self.assertEqual(ids(ordering='-amount'), [self.rows[1].id, self.rows[0].id, self.rows[2].id])
+        self.assertEqual(self.client.get(self.url, {'file_format': 'pdf'}).status_code, 400)
+
+
+class BulkImportTests(TestCase):
+    """/api/transactions/bulk/ reads every body format and reports invalid rows by number."""
+
+    url = '/api/transactions/bulk/'
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+        self.foreign = Customer.objects.create(user=other, name='B', contact_number='2', address='Elsewhere')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def row(self, amount='10', customer=None, **fields):
+        return {'customer': customer or self.customer.pk, 'amount': amount, 'transaction_type': 'debit',
+                'date': date.today().isoformat(), **fields}
+
+    def test_json_array_and_object(self):
+        for body in ([self.row(), self.row('20')], {'transactions': [self.row(), self.row('20')]}):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 201)
+            self.assertEqual((response.data['created'], response.data['failed']), (2, 0))
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.account_balance, Decimal('-60'))
+
+    def test_csv_body(self):
+        body = (
+            'customer,amount,transaction_type,date,payment_mode\n'
+            f'{self.customer.pk},10,debit,{date.today()},upi\n'
+            f'{self.customer.pk},not-a-number,debit,{date.today()},\n'
+            f'{self.customer.pk},5,credit,{date.today()},\n'
+        )
+        response = self.client.post(self.url, body, content_type='text/csv')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+        self.assertIn('amount', response.data['errors'][0]['errors'])
+        self.assertEqual(Transaction.objects.get(amount=Decimal('5')).payment_mode, 'cash')
+
+    def test_ndjson_body(self):
+        import json
+
+        body = '\n'.join([json.dumps(self.row()), '{not json', '', json.dumps(self.row('20'))])
+        response = self.client.post(self.url, body, content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual((response.data['created'], response.data['failed']), (2, 1))
+        self.assertEqual(response.data['errors'][0]['row'], 2)
+
+    def test_other_users_customers_are_rejected(self):
+        response = self.client.post(self.url, [self.row(), self.row(customer=self.foreign.pk)], format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['errors'], [{'row': 2, 'errors': {'customer': ['Customer Not Found.']}}])
+        self.assertFalse(Transaction.objects.filter(customer=self.foreign).exists())
+
+        response = self.client.post(self.url, [self.row(customer=self.foreign.pk)], format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_ownership_is_checked_once_per_batch(self):
+        from .imports import IMPORT_BATCH_SIZE
+
+        rows = [self.row() for _ in range(2 * IMPORT_BATCH_SIZE + 1)]
+        rows[IMPORT_BATCH_SIZE + 10] = self.row(customer=self.foreign.pk)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(self.url, rows, format='json')
+        self.assertEqual((response.data['created'], response.data['failed']), (2 * IMPORT_BATCH_SIZE, 1))
+        self.assertEqual(response.data['errors'][0]['row'], IMPORT_BATCH_SIZE + 11)
+        ownership = [q for q in queries if 'FROM "creditapp_customer"' in q['sql'] and '"user_id" = ' in q['sql']]
+        self.assertEqual(len(ownership), 3)
+
+    def test_object_without_transactions_is_rejected(self):
+        for body in ({'rows': [self.row()]}, {'transactions': 'nope'}):
+            response = self.client.post(self.url, body, format='json')
+            self.assertEqual(response.status_code, 400, body)
+        self.assertFalse(Transaction.objects.exists())
+
+
+@override_settings(REMINDER_NOTIFICATION_CHANNELS=['sms'])
+class ReminderDispatchTests(TestCase):
+    """Digests go out at most once per owner and day, and failed ones are retried."""
+
+    def setUp(self):
+        from .notifications import sms_gateway
+
+        self.outbox = sms_gateway.outbox
+        self.outbox.clear()
+        self.today = date.today()
+        self.owners = []
+        for i in range(3):
+            owner = User.objects.create_user(email=f'owner{i}@gmail.com', mobile_number=f'900000000{i}', password='secret')
+            customer = Customer.objects.create(user=owner, name=f'C{i}', contact_number='1', address='Market road')
+            PaymentReminder.objects.create(customer=customer, amount_due=Decimal('10'), reminder_date=self.today)
+            self.owners.append(owner)
+
+    def recipients(self):
+        return [message['to'] for message in self.outbox]
+
+    def test_second_run_sends_nothing(self):
+        from .notifications import dispatch_reminders
+
+        run = dispatch_reminders(today=self.today)
+        self.assertEqual(run.digests_sent, 3)
+        dispatch_reminders(today=self.today)
+        self.assertEqual(len(self.outbox), 3)
+
+    def test_failed_digest_is_retried(self):
+        from unittest import mock
+
+        from .models import ReminderDigest
+        from .notifications import dispatch_reminders, sms_gateway
+
+        failing = self.owners[1].mobile_number
+        real_send = sms_gateway.send
+
+        def send(to, body):
+            if to == failing:
+                raise ConnectionError('gateway down')
+            return real_send(to, body)
+
+        with mock.patch.object(sms_gateway, 'send', side_effect=send), self.assertLogs('creditapp.notifications', 'ERROR'):
+            run = dispatch_reminders(today=self.today)
+        self.assertEqual(run.digests_sent, 2)
+        digest = ReminderDigest.objects.get(user=self.owners[1], run_date=self.today)
+        self.assertEqual((digest.sent_at, digest.claimed_at, digest.attempts), (None, None, 1))
+
+        run = dispatch_reminders(today=self.today)
+        self.assertEqual(run.digests_sent, 3)
+        self.assertEqual(sorted(self.recipients()), sorted(owner.mobile_number for owner in self.owners))
+        self.assertIsNotNone(ReminderDigest.objects.get(pk=digest.pk).sent_at)
+
+    @override_settings(REMINDER_DIGEST_MAX_ATTEMPTS=1)
+    def test_failed_digest_gives_up_after_max_attempts(self):
+        from unittest import mock
+
+        from .notifications import dispatch_reminders, sms_gateway
+
+        with mock.patch.object(sms_gateway, 'send', side_effect=ConnectionError), self.assertLogs('creditapp.notifications', 'ERROR'):
+            dispatch_reminders(today=self.today)
+        dispatch_reminders(today=self.today)
+        self.assertEqual(self.outbox, [])
+
+    def test_resume_skips_finished_and_claimed_owners(self):
+        from django.utils import timezone
+
+        from .models import ReminderDigest, ReminderDispatchRun
+        from .notifications import dispatch_reminders
+
+        first, crashed, last = self.owners
+        # A worker sent the first digest, claimed the second and died
+        ReminderDispatchRun.objects.create(run_date=self.today, last_user_id=first.pk, digests_sent=1)
+        ReminderDigest.objects.create(user=first, run_date=self.today, attempts=1, sent_at=timezone.now())
+        ReminderDigest.objects.create(user=crashed, run_date=self.today, attempts=1, claimed_at=timezone.now())
+
+        run = dispatch_reminders(today=self.today)
+        self.assertEqual(self.recipients(), [last.mobile_number])
+        self.assertEqual((run.digests_sent, run.last_user_id), (2, last.pk))
+        self.assertIsNotNone(run.finished_at)
+
+
+    def test_expired_claim_is_retried(self):
+        from django.utils import timezone
+
+        from .models import ReminderDigest, ReminderDispatchRun
+        from .notifications import dispatch_reminders
+
+        first, crashed, last = self.owners
+        ReminderDispatchRun.objects.create(run_date=self.today, last_user_id=last.pk, finished_at=timezone.now())
+        for owner in (first, last):
+            ReminderDigest.objects.create(user=owner, run_date=self.today, attempts=1, sent_at=timezone.now())
+        # The worker holding this claim died two hours ago
+        ReminderDigest.objects.create(user=crashed, run_date=self.today, attempts=1,
+                                      claimed_at=timezone.now() - timedelta(hours=2))
+
+        dispatch_reminders(today=self.today)
+        self.assertEqual(self.recipients(), [crashed.mobile_number])
+        digest = ReminderDigest.objects.get(user=crashed, run_date=self.today)
+        self.assertEqual(digest.attempts, 2)
+        self.assertIsNotNone(digest.sent_at)
+
+
+class EmailChannelTests(TestCase):
+    """The reminder email channel opens a connection per batch and survives a dropped connection."""
+
+    class Connection:
+        def __init__(self, log, drop_after=None):
+            self.log = log
+            self.drop_after = drop_after
+            self.sent = 0
+
+        def open(self):
+            self.log.append('open')
+
+        def close(self):
+            self.log.append('close')
+
+        def send_messages(self, messages):
+            from smtplib import SMTPServerDisconnected
+
+            if self.drop_after is not None and self.sent >= self.drop_after:
+                raise SMTPServerDisconnected('Connection unexpectedly closed')
+            self.sent += len(messages)
+            return len(messages)
+
+    def setUp(self):
+        self.owner = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.log = []
+
+    def channel(self, *connections):
+        from unittest import mock
+
+        from .notifications import EmailChannel
+
+        patcher = mock.patch('creditapp.notifications.get_connection', side_effect=list(connections))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return EmailChannel()
+
+    @override_settings(EMAIL_DELIVERY_BATCH_SIZE=2)
+    def test_one_connection_per_batch(self):
+        channel = self.channel(*(self.Connection(self.log) for _ in range(3)))
+        self.assertTrue(all(channel.send(self.owner, 'Subject', 'Body') for _ in range(5)))
+        channel.close()
+        self.assertEqual(self.log, ['open', 'close'] * 3)
+
+    def test_reconnects_after_the_server_drops_the_connection(self):
+        channel = self.channel(self.Connection(self.log, drop_after=1), self.Connection(self.log))
+        self.assertTrue(channel.send(self.owner, 'Subject', 'Body'))
+        self.assertTrue(channel.send(self.owner, 'Subject', 'Body'))
+        self.assertTrue(channel.send(self.owner, 'Subject', 'Body'))
+        self.assertEqual(self.log, ['open', 'close', 'open'])
+
+
+class ReminderSweepTests(TestCase):
+    """The daily sweep moves stored buckets across the day boundary, and reads switch to them once it ran."""
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        self.reminders = {
+            name: PaymentReminder.objects.create(customer=self.customer, amount_due=Decimal('10'),
+                                                 reminder_date=self.today + timedelta(days=offset), status=status)
+            for name, offset, status in (
+                ('yesterday', -1, 'pending'), ('today', 0, 'pending'), ('tomorrow', 1, 'pending'),
+                ('later', 3, 'pending'), ('paid', -5, 'paid'),
+            )
+        }
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def buckets(self):
+        return {name: PaymentReminder.objects.get(pk=reminder.pk).bucket for name, reminder in self.reminders.items()}
+
+    def listed(self, payment_status):
+        response = self.client.get('/api/payment-reminders/', {'payment_status': payment_status})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.json()['results']}
+
+    def test_buckets_move_across_the_day_boundary(self):
+        from .models import ReminderSweep
+        from .reminders import sweep_reminders
+
+        self.assertEqual(self.buckets(), {'yesterday': 'overdue', 'today': 'due_today', 'tomorrow': 'upcoming',
+                                          'later': 'upcoming', 'paid': 'settled'})
+        tomorrow = self.today + timedelta(days=1)
+        result = sweep_reminders(today=tomorrow)
+
+        self.assertEqual(self.buckets(), {'yesterday': 'overdue', 'today': 'overdue', 'tomorrow': 'due_today',
+                                          'later': 'upcoming', 'paid': 'settled'})
+        self.assertEqual(result, {'overdue': 1, 'due_today': 1, 'upcoming': 0, 'settled': 0, 'newly_due': 1})
+        sweep = ReminderSweep.objects.get(run_date=tomorrow)
+        self.assertIsNotNone(sweep.finished_at)
+        self.assertEqual((sweep.overdue, sweep.due_today, sweep.newly_due), (1, 1, 1))
+
+        self.customer.refresh_from_db()
+        self.assertEqual(self.customer.overdue_reminder_count, 2)
+        summary = UserLedgerSummary.objects.get(user=self.user)
+        self.assertEqual((summary.overdue_reminders, summary.due_today_reminders, summary.upcoming_reminders), (2, 1, 1))
+
+        # A second run of the same day moves nothing
+        self.assertEqual(sweep_reminders(today=tomorrow)['newly_due'], 0)
+
+    def test_reads_use_stored_buckets_once_the_sweep_ran(self):
+        from .reminders import buckets_are_current, sweep_reminders
+
+        self.assertFalse(buckets_are_current(self.today))
+        self.assertEqual(self.listed('overdue'), {self.reminders['yesterday'].pk})
+        sweep_reminders(today=self.today)
+        self.assertTrue(buckets_are_current(self.today))
+
+        # Only the stored bucket says overdue, so only the bucket filter finds it
+        PaymentReminder.objects.filter(pk=self.reminders['later'].pk).update(bucket='overdue')
+        self.assertEqual(self.listed('overdue'), {self.reminders['yesterday'].pk, self.reminders['later'].pk})
+        self.assertEqual(self.listed('pending'), {self.reminders[name].pk for name in ('yesterday', 'today', 'tomorrow', 'later')})
+
+    def test_counts_endpoint(self):
+        from .reminders import sweep_reminders
+
+        expected = {'overdue': 1, 'due_today': 1, 'upcoming': 2}
+        # Before today's sweep the counts come from the dates
+        self.assertEqual(self.client.get('/api/payment-reminders/counts/').json(), expected)
+        sweep_reminders(today=self.today)
+        self.assertEqual(self.client.get('/api/payment-reminders/counts/').json(), expected)
+
+        # After it they are read from the stored summary
+        UserLedgerSummary.objects.filter(user=self.user).update(overdue_reminders=7)
+        self.assertEqual(self.client.get('/api/payment-reminders/counts/').json()['overdue'], 7)
+
+
+class LedgerSummaryTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        Transaction.objects.create(customer=customer, amount=Decimal('30'), transaction_type='debit', date=date.today())
+
+    def test_rebuild_upserts_existing_rows(self):
+        summary = UserLedgerSummary.objects.get(user=self.user)
+        UserLedgerSummary.objects.filter(pk=summary.pk).update(total_customers=7, total_debit_amount=0)
+        # A request that found no row rebuilds after another one created it
+        UserLedgerSummary.rebuild(user_ids=[self.user.pk])
+        rebuilt = UserLedgerSummary.objects.get(user=self.user)
+        self.assertEqual(rebuilt.pk, summary.pk)
+        self.assertEqual((rebuilt.total_customers, rebuilt.total_debit_amount), (1, Decimal('30')))
+
+    def test_negative_amount_matches_a_rebuild(self):
+        customer = Customer.objects.get(user=self.user)
+        Transaction.objects.create(customer=customer, amount=Decimal('-10'), transaction_type='debit', date=date.today())
+        fields = ['total_debit_transactions', 'total_debit_amount']
+        incremental = UserLedgerSummary.objects.values(*fields).get(user=self.user)
+        self.assertEqual(incremental['total_debit_amount'], Decimal('20'))
+        UserLedgerSummary.rebuild(user_ids=[self.user.pk])
+        self.assertEqual(UserLedgerSummary.objects.values(*fields).get(user=self.user), incremental)
+
+    def test_for_user_creates_a_missing_row(self):
+        UserLedgerSummary.objects.all().delete()
+        summary = UserLedgerSummary.for_user(self.user)
+        self.assertEqual((summary.total_customers, summary.total_debit_transactions), (1, 1))
+
+
+class ReminderSettlementTests(TestCase):
+    """Writes only queue a settlement when a non-negative balance has pending reminders to settle."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+
+    def add(self, amount, transaction_type):
+        """Write a transaction; returns how many settlements it queued (they still run)."""
+        from unittest import mock
+
+        from .tasks import settle_customer_reminders
+
+        run = lambda args, kwargs: settle_customer_reminders(*args, **kwargs)
+        with mock.patch.object(settle_customer_reminders, 'apply_async', side_effect=run) as queued, \
+                self.captureOnCommitCallbacks(execute=True):
+            Transaction.objects.create(customer=self.customer, amount=Decimal(amount),
+                                       transaction_type=transaction_type, date=date.today())
+        return queued.call_count
+
+    def test_settlement_is_queued_only_with_pending_reminders(self):
+        self.assertEqual(self.add('50', 'credit'), 0)
+        self.assertEqual(self.add('80', 'debit'), 0)
+        reminder = PaymentReminder.objects.create(customer=self.customer, amount_due=Decimal('30'), reminder_date=date.today())
+        # Still negative
+        self.assertEqual(self.add('10', 'credit'), 0)
+        self.assertEqual(self.add('20', 'credit'), 1)
+
+        reminder.refresh_from_db()
+        self.assertEqual((reminder.status, reminder.bucket), ('paid', 'settled'))
+        self.assertEqual(self.add('5', 'credit'), 0)
+
+
+class IncrementalBalanceTests(TestCase):
+    """Each write's delta leaves the stored balances equal to a full recompute."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.a = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        self.b = Customer.objects.create(user=self.user, name='B', contact_number='2', address='Market road')
+        self.row = Transaction.objects.create(customer=self.a, amount=Decimal('100'), transaction_type='debit', date=date.today())
+        Transaction.objects.create(customer=self.a, amount=Decimal('30'), transaction_type='credit', date=date.today())
+
+    def assertBalances(self, **expected):
+        stored = {name: Customer.objects.get(pk=getattr(self, name).pk) for name in expected}
+        self.assertEqual({name: customer.account_balance for name, customer in stored.items()}, expected)
+        # Same values as recomputing everything from the ledger
+        Customer.rebuild_aggregates(customer_ids=[self.a.pk, self.b.pk])
+        for name, customer in stored.items():
+            rebuilt = Customer.objects.get(pk=customer.pk)
+            self.assertEqual(
+                {field: getattr(customer, field) for field in Customer.AGGREGATE_FIELDS},
+                {field: getattr(rebuilt, field) for field in Customer.AGGREGATE_FIELDS},
+            )
+
+    def test_edit_amount(self):
+        self.row.amount = Decimal('140')
+        self.row.save()
+        self.assertBalances(a=Decimal('-110'), b=Decimal('0'))
+
+    def test_move_to_another_customer(self):
+        self.row.customer = self.b
+        self.row.save()
+        self.assertBalances(a=Decimal('30'), b=Decimal('-100'))
+
+    def test_flip_transaction_type(self):
+        self.row.transaction_type = 'credit'
+        self.row.save()
+        self.assertBalances(a=Decimal('130'))
+        self.row.transaction_type = 'debit'
+        self.row.save()
+        self.assertBalances(a=Decimal('-70'))
+
+    def test_delete(self):
+        self.row.delete()
+        self.assertBalances(a=Decimal('30'))
+        summary = UserLedgerSummary.objects.get(user=self.user)
+        self.assertEqual((summary.total_debit_transactions, summary.total_debit_amount), (0, Decimal('0')))
+
+    def test_deleting_the_same_row_twice(self):
+        stale = Transaction.objects.get(pk=self.row.pk)
+        self.row.delete()
+        stale.delete()
+        self.assertBalances(a=Decimal('30'))
+        summary = UserLedgerSummary.objects.get(user=self.user)
+        self.assertEqual((summary.total_debit_transactions, summary.total_debit_amount), (0, Decimal('0')))
+
+    def test_edit_of_a_stale_instance(self):
+        stale = Transaction.objects.get(pk=self.row.pk)
+        self.row.amount = Decimal('140')
+        self.row.save()
+        # Replaces what is stored now, not what the stale copy was loaded with
+        stale.amount = Decimal('120')
+        stale.save()
+        self.assertBalances(a=Decimal('-90'))
+
+
+class PaginationTests(TestCase):
+    """Walking every page returns each row once, also when rows tie on the ordering value."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        Customer.objects.bulk_create([
+            Customer(user=self.user, name=f'C{i}', contact_number=f'9{i:03d}', address='Market road') for i in range(24)
+        ])
+        Transaction.objects.bulk_create([
+            Transaction(customer=self.customer, amount=Decimal('10'), transaction_type='debit', date=date.today())
+            for _ in range(25)
+        ])
+        # Every row shares one created_at, so only the id breaks ties
+        same_moment = timezone.now()
+        Customer.objects.update(created_at=same_moment)
+        Transaction.objects.update(created_at=same_moment)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def walk(self, url, params):
+        ids = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            ids += [row['id'] for row in body['results']]
+            if not body['next']:
+                return ids
+            response = self.client.get(body['next'])
+
+    def assertEveryRowOnce(self, ids, model):
+        self.assertEqual(len(ids), len(set(ids)))
+        self.assertEqual(set(ids), set(model.objects.values_list('id', flat=True)))
+
+    def test_cursor_pages(self):
+        for url, model in (('/api/transactions/', Transaction), ('/api/customers/', Customer)):
+            ids = self.walk(url, {'cursor': '', 'page_size': 7})
+            self.assertEveryRowOnce(ids, model)
+            self.assertEqual(ids, sorted(ids, reverse=True))
+
+    def test_page_numbers_with_tied_ordering(self):
+        for url, model in (('/api/transactions/', Transaction), ('/api/customers/', Customer)):
+            for params in ({}, {'ordering': 'amount' if model is Transaction else 'account_balance'}, {'count': 'false'}):
+                self.assertEveryRowOnce(self.walk(url, {'page_size': 7, **params}), model)
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-a-cursor', 'eHw='):
+            response = self.client.get('/api/transactions/', {'cursor': cursor})
+            self.assertEqual(response.status_code, 404)
+
+
+class SearchTests(TestCase):
+    """Every search backend finds substrings of names and descriptions, and only the owner's rows."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.other = User.objects.create_user(email='other@gmail.com', mobile_number='9000000001', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='Ramesh Traders', contact_number='1', address='x')
+        self.mine = Transaction.objects.create(customer=self.customer, amount=Decimal('10'), transaction_type='debit',
+                                               date=date.today(), description='Cement bags')
+        # Same name and description under another user
+        theirs = Customer.objects.create(user=self.other, name='Ramesh Traders', contact_number='2', address='x')
+        Transaction.objects.create(customer=theirs, amount=Decimal('10'), transaction_type='debit',
+                                   date=date.today(), description='Cement bags')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def found(self, params):
+        response = self.client.get('/api/transactions/', params)
+        self.assertEqual(response.status_code, 200)
+        return [row['id'] for row in response.json()['results']]
+
+    def assertSearches(self):
+        for params in ({'search': 'mesh'}, {'search': 'ement ram'}, {'customer_name': 'trader'},
+                       {'description': 'ags'}, {'search': 'cement', 'customer_name': 'ramesh'}):
+            self.assertEqual(self.found(params), [self.mine.id], params)
+        for params in ({'search': 'gravel'}, {'customer_name': 'cement'}, {'description': 'ramesh'}):
+            self.assertEqual(self.found(params), [], params)
+
+    def test_fts_search(self):
+        if connection.vendor != 'sqlite' or not SQLiteFTSSearchBackend().is_available('default'):
+            self.skipTest('needs the SQLite FTS5 trigram table')
+        self.assertSearches()
+
+        # The triggers keep the table in step with renames, edits and deletes
+        self.customer.name = 'Suresh Stores'
+        self.customer.save()
+        self.mine.description = 'Steel rods'
+        self.mine.save()
+        self.assertEqual(self.found({'search': 'suresh rods'}), [self.mine.id])
+        self.assertEqual(self.found({'search': 'ramesh'}), [])
+        self.mine.delete()
+        self.assertEqual(self.found({'search': 'steel'}), [])
+
+    def test_fts_match_is_limited_to_the_owner(self):
+        if connection.vendor != 'sqlite' or not SQLiteFTSSearchBackend().is_available('default'):
+            self.skipTest('needs the SQLite FTS5 trigram table')
+        match = SQLiteFTSSearchBackend.match_expression(['cement'], ('description',), self.user.pk)
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT rowid FROM creditapp_transaction_search WHERE creditapp_transaction_search MATCH %s',
+                           [match])
+            self.assertEqual([row[0] for row in cursor.fetchall()], [self.mine.id])
+
+        # The rank is joined, not a subquery run for every row
+        queryset = search_transactions(Transaction.objects.filter(customer__user=self.user), 'cement', user_id=self.user.pk)
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+            plan = ' '.join(str(row[-1]) for row in cursor.fetchall())
+        self.assertNotIn('CORRELATED', plan)
+        self.assertEqual([t.id for t in queryset], [self.mine.id])
+
+    def test_short_words_fall_back_to_icontains(self):
+        self.assertEqual(self.found({'search': 'ra ce'}), [self.mine.id])
+        self.assertEqual(self.found({'search': 'cement zz'}), [])
+
+    @override_settings(LEDGER_SEARCH_BACKEND='creditapp.search.IContainsSearchBackend')
+    def test_icontains_backend(self):
+        self.assertSearches()
+
+    def test_postgres_trigram_backend(self):
+        if connection.vendor != 'postgresql':
+            self.skipTest('needs PostgreSQL with pg_trgm')
+        self.assertSearches()
+
+
+class StatementTests(TestCase):
+    """Running balances and checkpoints stay right across pages and back-dated writes."""
+
+    def setUp(self):
+        from .checkpoints import build_checkpoints, month_end
+
+        self.user = User.objects.create_user(email='owner@gmail.com', mobile_number='9000000000', password='secret')
+        self.customer = Customer.objects.create(user=self.user, name='A', contact_number='1', address='Market road')
+        # Two closed months, each with a checkpoint
+        self.first = (date.today().replace(day=1) - timedelta(days=70)).replace(day=1)
+        self.second = month_end(self.first) + timedelta(days=1)
+        self.period_ends = [month_end(self.first), month_end(self.second)]
+        self.rows = [
+            Transaction.objects.create(customer=self.customer, amount=Decimal(amount), transaction_type=kind, date=day)
+            for amount, kind, day in (
+                ('100', 'credit', self.first + timedelta(days=2)),
+                ('30', 'debit', self.first + timedelta(days=9)),
+                ('50', 'credit', self.second),
+                ('20', 'debit', self.second + timedelta(days=9)),
+                ('15', 'debit', self.second + timedelta(days=9)),
+                ('5', 'credit', self.second + timedelta(days=20)),
+                ('8', 'debit', date.today()),
+            )
+        ]
+        build_checkpoints(customer_ids=[self.customer.pk])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def balance_through(self, day):
+        rows = Transaction.objects.filter(customer=self.customer, date__lte=day)
+        return sum((row.amount if row.transaction_type == 'credit' else -row.amount for row in rows), Decimal('0'))
+
+    def walk(self, params):
+        balances = []
+        response = self.client.get(f'/api/customers/{self.customer.pk}/statement/', params)
+        while True:
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            balances += [(row['id'], Decimal(row['running_balance'])) for row in body['results']]
+            if not body['next']:
+                return balances
+            response = self.client.get(body['next'])
+
+    def test_running_balance_carries_across_pages(self):
+        for params, start in (({}, None), ({'start': self.second.isoformat()}, self.second)):
+            balance = self.balance_through(start - timedelta(days=1)) if start else Decimal('0')
+            expected = []
+            for row in sorted(self.rows, key=lambda row: (row.date, row.id)):
+                if start and row.date < start:
+                    continue
+                balance += row.amount if row.transaction_type == 'credit' else -row.amount
+                expected.append((row.id, balance))
+            self.assertEqual(self.walk({**params, 'page_size': 2}), expected)
+            self.assertEqual(self.walk({**params, 'page_size': 100}), expected)
+
+    def assertCheckpointsCurrent(self):
+        from .models import BalanceCheckpoint
+
+        for period_end in self.period_ends:
+            checkpoint = BalanceCheckpoint.objects.get(customer=self.customer, period_end=period_end)
+            self.assertEqual(checkpoint.balance, self.balance_through(period_end))
+
+    def test_back_dated_writes_invalidate_later_checkpoints(self):
+        self.assertCheckpointsCurrent()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/', {
+                'customer': self.customer.pk, 'amount': '40', 'transaction_type': 'debit',
+                'date': (self.first + timedelta(days=5)).isoformat(),
+            })
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertCheckpointsCurrent()
+
+        edited = self.rows[1]
+        with self.captureOnCommitCallbacks(execute=True):
+            edited.amount = Decimal('75')
+            edited.save()
+        self.assertCheckpointsCurrent()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.rows[0].delete()
+        self.assertCheckpointsCurrent()
+        self.assertEqual(self.walk({})[-1][1], self.balance_through(date.today()))
@@ -23,10 +23,15 @@ urlpatterns = [
     # Customer URLs
     path('customers/', CustomerListCreateView.as_view(), name='customer-list-create'),
     path('customers/<int:pk>/', CustomerDetailView.as_view(), name='customer-detail'),
+    path('customers/delete/<int:pk>/', DeleteCustomerView.as_view(), name='delete-customer'),
+    path('customers/<int:pk>/balance/', CustomerBalanceView.as_view(), name='customer-balance'),
+    path('customers/<int:pk>/statement/', CustomerStatementView.as_view(), name='customer-statement'),
 
 
     # Transaction URLs
     path('transactions/', TransactionListCreateView.as_view(), name='transaction-list-create'),
+    path('transactions/bulk/', TransactionBulkImportView.as_view(), name='transaction-bulk-import'),
+    path('transactions/export/', TransactionExportView.as_view(), name='transaction-export'),
     path('customers/<int:customer_id>/transactions/', CustomerTransactionsView.as_view(), name='customer-transactions'),
     path('transactions/<int:pk>/', TransactionDetailView.as_view(), name='transaction-detail'),
     path('transactions/delete/<int:pk>/', TransactionDeleteView.as_view(), name='delete-transaction'),
@@ -34,7 +39,11 @@ urlpatterns = [
 
     # Payment Reminder URLs
     path('payment-reminders/', PaymentReminderListCreateView.as_view(), name='payment-reminder-list-create'),
+    path('payment-reminders/counts/', PaymentReminderCountsView.as_view(), name='payment-reminder-counts'),
     path('payment-reminders/<int:pk>/', PaymentReminderDetailView.as_view(), name='payment-reminder-detail'),
+
+    # Monitoring
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
 
 
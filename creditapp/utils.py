@@ -1,39 +1,54 @@
 # utils.py
+import logging
 from django.core.mail import send_mail
-from threading import Thread
-from .models import EmailOTP
+from django.core.files.storage import default_storage
+from django.db import transaction
+from .images import variant_names
+from .mailer import deliver_email
+from .tasks import enqueue, delete_media_files as delete_media_files_task
+from .versions import bump_ledger_versions
+from .models import (
+    Customer, Transaction, PaymentReminder, UserLedgerSummary, balance_maintenance_suspended
+)
 import re
 from django.core.exceptions import ValidationError
 from django.core.mail import EmailMultiAlternatives
 
-def send_otp_email(email):
-    otp = EmailOTP.generate_otp()
-    EmailOTP.objects.create(email=email, otp=otp)
-
-    def _send():
-        subject = 'Your OTP Verification Code'
-        from_email = None  # Uses DEFAULT_FROM_EMAIL from settings
-        to = [email]
-        text_content = f'Your OTP is {otp}'
-        html_content = f'''
-            <html>
-            <body>
-                <p>Dear user,</p>
-                <p>Your OTP is: <code style="font-size: 16px;">{otp}</code></p>
-                <p>Your code expires in 10 minutes.</p>
-                <p>Notice: This email is automatically generated by the system, please do not reply to this email.</p>
-                <p>Use this code to verify your account. Do not share it with anyone.</p>
-                <br>
-                <p>Thanks You<br>Tempgmail.net</p>
-            </body>
-            </html>
-        '''
-
-        msg = EmailMultiAlternatives(subject, text_content, from_email, to)
-        msg.attach_alternative(html_content, "text/html")
-        msg.send(fail_silently=False)
-
-    Thread(target=_send).start()
+logger = logging.getLogger(__name__)
+
+
+def build_otp_email(email, otp):
+    subject = 'Your OTP Verification Code'
+    from_email = None  # Uses DEFAULT_FROM_EMAIL from settings
+    to = [email]
+    text_content = f'Your OTP is {otp}'
+    html_content = f'''
+        <html>
+        <body>
+            <p>Dear user,</p>
+            <p>Your OTP is: <code style="font-size: 16px;">{otp}</code></p>
+            <p>Your code expires in 10 minutes.</p>
+            <p>Notice: This email is automatically generated by the system, please do not reply to this email.</p>
+            <p>Use this code to verify your account. Do not share it with anyone.</p>
+            <br>
+            <p>Thanks You<br>Tempgmail.net</p>
+        </body>
+        </html>
+    '''
+
+    msg = EmailMultiAlternatives(subject, text_content, from_email, to)
+    msg.attach_alternative(html_content, "text/html")
+    return msg
+
+
+def send_otp_email(email, ip=None):
+    """Issue a new code for ``email`` and mail it; raises OTPRateLimited over the send limits."""
+    from .otp import get_otp_store
+
+    otp = get_otp_store().issue(email, ip=ip)
+
+    # Queued for the pooled delivery worker instead of a thread per message
+    deliver_email(build_otp_email(email, otp))
 
 
 
@@ -48,4 +63,51 @@ def validate_password(password):
     if not re.search(r'[0-9]', password):
         raise ValidationError("Password must contain a digit.")
     if not re.search(r'[!@#$%^&*]', password):
-        raise ValidationError("Password must contain a special character (!@#$%^&*).")
\ No newline at end of file
+        raise ValidationError("Password must contain a special character (!@#$%^&*).")
+
+
+def delete_media_files(names):
+    """Remove stored files by name, logging (not raising) on failures."""
+    deleted = 0
+    for name in names:
+        try:
+            default_storage.delete(name)
+            deleted += 1
+        except Exception:
+            logger.exception("Error deleting media file %s", name)
+    return deleted
+
+
+def delete_customers(customers):
+    """
+    Delete the given customer queryset together with its transactions and
+    reminders in one cascade. Per-row balance maintenance is switched off
+    while the ledger rows go (the customers are going too); the owners'
+    summaries are reduced once per user instead, and the attached bill images
+    (with their variants) are removed in one batch once the deletion has committed.
+
+    Returns the number of removed rows per model and the number of files.
+    """
+    bill_images = []
+    for name, variants in (
+        Transaction.objects.filter(customer__in=customers)
+        .exclude(bill_image='').exclude(bill_image__isnull=True)
+        .values_list('bill_image', 'bill_image_variants')
+    ):
+        bill_images.extend([name, *variant_names(variants).values()])
+
+    with transaction.atomic(), balance_maintenance_suspended():
+        removed_totals = UserLedgerSummary.totals_by_user(customers)
+        _, deleted = customers.delete()
+        for user_id, totals in removed_totals.items():
+            UserLedgerSummary.apply_changes(user_id, {field: -value for field, value in totals.items()})
+        bump_ledger_versions(removed_totals)
+        if bill_images:
+            enqueue(delete_media_files_task, bill_images)
+
+    return {
+        "customers": deleted.get(Customer._meta.label, 0),
+        "transactions": deleted.get(Transaction._meta.label, 0),
+        "payment_reminders": deleted.get(PaymentReminder._meta.label, 0),
+        "files": len(bill_images),
+    }
@@ -0,0 +1,144 @@
+"""
+Per-user ledger versions and conditional GETs.
+
+Every write to a user's customers, transactions or payment reminders (and to
+the user row itself) replaces the user's ledger version, a random token kept
+in the cache. Polled views that mix in ConditionalGetMixin derive a weak ETag
+from it, so a request whose If-None-Match still matches gets 304 Not
+Modified straight after authentication, without running the view's queries.
+
+Versions are replaced once the writing transaction has committed; bumping
+earlier would let a concurrent read tag the old rows with the new version.
+A version is a fresh random token rather than a counter, so a version lost
+from the cache (eviction, LEDGER_VERSION_TTL_SECONDS) never repeats an
+earlier one; the client just gets one full response. A bump also pins the
+user to the primary (creditapp.routers) so the next read tagged with the new
+version cannot come from a replica that is still behind. Like the replica
+pins this needs a cache shared by every process (Redis) when there are
+several.
+"""
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .routers import pin_to_primary
+
+
+def _version_key(user_id):
+    return f'ledger-version:{user_id}'
+
+
+def _version_ttl():
+    return getattr(settings, 'LEDGER_VERSION_TTL_SECONDS', 60 * 60 * 24)
+
+
+def _new_version():
+    return uuid.uuid4().hex[:16]
+
+
+def ledger_version(user_id):
+    """The current ledger version of a user (a new one if none is cached)."""
+    key = _version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        version = _new_version()
+        # Another request may have started one meanwhile; everyone uses the stored one
+        if not cache.add(key, version, timeout=_version_ttl()):
+            version = cache.get(key) or version
+    return version
+
+
+def bump_ledger_versions(user_ids):
+    """Give every user in ``user_ids`` a new ledger version once the current transaction commits."""
+    user_ids = {user_id for user_id in user_ids if user_id is not None}
+    if not user_ids:
+        return
+
+    def bump():
+        cache.set_many({_version_key(user_id): _new_version() for user_id in user_ids}, timeout=_version_ttl())
+        for user_id in user_ids:
+            pin_to_primary(user_id)
+
+    transaction.on_commit(bump)
+
+
+def ledger_etag(request, scope):
+    """
+    Weak ETag of a response of view ``scope`` to ``request``: the user's
+    ledger version plus everything else the body depends on (path and query
+    string, negotiated format, token, LEDGER_ETAG_SALT).
+    """
+    user_id = request.user.pk
+    parts = [
+        scope,
+        str(user_id),
+        ledger_version(user_id),
+        request.get_full_path(),
+        getattr(request, 'accepted_media_type', '') or '',
+        getattr(request.auth, 'key', '') or '',
+        getattr(settings, 'LEDGER_ETAG_SALT', ''),
+    ]
+    digest = hashlib.sha256('\n'.join(parts).encode()).hexdigest()[:32]
+    return 'W/' + quote_etag(digest)
+
+
+def etag_matches(request, etag):
+    """Weak comparison of ``etag`` against the request's If-None-Match."""
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    if candidates == ['*']:
+        return True
+    target = etag.removeprefix('W/')
+    return any(candidate.removeprefix('W/') == target for candidate in candidates)
+
+
+def add_validators(response, etag):
+    """ETag and Cache-Control (the client may store the body but must revalidate it)."""
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ['Authorization'])
+    return response
+
+
+def not_modified(etag):
+    return add_validators(HttpResponseNotModified(), etag)
+
+
+class NotModified(Exception):
+    pass
+
+
+class ConditionalGetMixin:
+    """
+    Answer GETs with 304 Not Modified while the client's copy is current;
+    otherwise run the view and tag its response. The check runs right after
+    authentication (and ReplicaReadMixin when listed after it), before the
+    handler.
+    """
+    etag = None
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in ('GET', 'HEAD'):
+            self.etag = ledger_etag(request, type(self).__name__)
+            if etag_matches(request, self.etag):
+                raise NotModified
+
+    def handle_exception(self, exc):
+        if isinstance(exc, NotModified):
+            return not_modified(self.etag)
+        return super().handle_exception(exc)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        if self.etag is not None and response.status_code == 200:
+            add_validators(response, self.etag)
+        return response
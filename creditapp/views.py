@@ -1,5 +1,4 @@
 from .models import *
-from django.core.exceptions import ObjectDoesNotExist
 from django.contrib.auth import authenticate
 from django.db import transaction
 from rest_framework import filters, generics, status, pagination
@@ -12,72 +11,260 @@ from rest_framework.generics import UpdateAPIView
 from django.shortcuts import get_object_or_404
 from django.http import Http404
 from datetime import date
+from django.utils import timezone
 from django.db.models import Sum, Count, Q
 from rest_framework.views import APIView
-import requests
+from rest_framework.exceptions import NotFound, ParseError
+from rest_framework.utils.urls import replace_query_param, remove_query_param
+from datetime import datetime
+import base64
+import logging
 from dotenv import load_dotenv
-from .utils import send_otp_email
+from .utils import send_otp_email, delete_customers
+from .search import LedgerSearchFilter, search_transactions
+from .reminders import buckets_are_current, reminder_counts
+from .imports import iter_import_rows, import_transactions, ImportTooLarge, InvalidImport
+from .exports import streaming_export, EXPORT_FORMATS, EXPORT_CHUNK_SIZE
+from .checkpoints import totals_as_of, statement_totals
+from .statements import STATEMENT_FIELDS, opening_balance, statement_queryset, with_running_balance
+from decimal import Decimal
+from django.conf import settings
+from django.http import HttpResponse
+from django.utils.crypto import constant_time_compare
+from rest_framework.permissions import BasePermission
+from .authentication import token_cache_stats
+from .metrics import registry as metrics_registry
+from .routers import ReplicaReadMixin
+from .versions import ConditionalGetMixin, etag_matches, ledger_etag, add_validators, not_modified
+from .otp import OTPRateLimited, get_otp_store
+from .google_auth import GoogleTokenError, fetch_userinfo, verify_id_token
+from rest_framework.throttling import BaseThrottle
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Custom pagination class
 class StandardResultsSetPagination(pagination.PageNumberPagination):
     page_size = 20
     page_size_query_param = 'page_size'
     max_page_size = 100
 
+
+class KeysetResultsSetPagination(StandardResultsSetPagination):
+    """
+    Page-number pagination with two opt-in fast paths:
+
+    * ``?cursor=`` pages on (created_at, id), newest first, with a keyset
+      filter instead of OFFSET and without COUNT(*). Send an empty cursor for
+      the first page and follow ``next`` afterwards. ``?count=true`` adds the
+      total count back.
+    * ``?count=false`` keeps page numbers but skips the COUNT(*) query.
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.count = None
+        count_param = request.query_params.get(self.count_query_param, '').lower()
+
+        if self.cursor_query_param in request.query_params:
+            self.mode = 'cursor'
+            return self._paginate_by_cursor(queryset, request, include_count=count_param == 'true')
+        if count_param == 'false':
+            self.mode = 'uncounted'
+            return self._paginate_without_count(queryset, request)
+
+        self.mode = 'page'
+        return super().paginate_queryset(queryset, request, view)
+
+    def _paginate_by_cursor(self, queryset, request, include_count):
+        page_size = self.get_page_size(request)
+        position = self.decode_cursor(request.query_params[self.cursor_query_param])
+
+        if include_count:
+            self.count = queryset.count()
+
+        queryset = queryset.order_by('-created_at', '-id')
+        if position:
+            created_at, pk = position
+            queryset = queryset.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+
+        rows = list(queryset[:page_size + 1])
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        return page
+
+    def _paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        try:
+            self.page_number = max(int(request.query_params.get(self.page_query_param, 1)), 1)
+        except ValueError:
+            raise NotFound(self.invalid_page_message.format(page_number=request.query_params.get(self.page_query_param), message=''))
+
+        offset = (self.page_number - 1) * page_size
+        rows = list(queryset[offset:offset + page_size + 1])
+        self.has_next_page = len(rows) > page_size
+        return rows[:page_size]
+
+    @staticmethod
+    def encode_cursor(instance):
+        position = f"{instance.created_at.isoformat()}|{instance.pk}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def decode_cursor(self, encoded):
+        if not encoded:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_paginated_response(self, data):
+        if self.mode == 'page':
+            return super().get_paginated_response(data)
+
+        url = self.request.build_absolute_uri()
+        if self.mode == 'cursor':
+            next_link = replace_query_param(url, self.cursor_query_param, self.next_cursor) if self.next_cursor else None
+            previous_link = None
+        else:
+            next_link = replace_query_param(url, self.page_query_param, self.page_number + 1) if self.has_next_page else None
+            if self.page_number == 1:
+                previous_link = None
+            elif self.page_number == 2:
+                previous_link = remove_query_param(url, self.page_query_param)
+            else:
+                previous_link = replace_query_param(url, self.page_query_param, self.page_number - 1)
+
+        body = {'next': next_link, 'previous': previous_link, 'results': data}
+        if self.count is not None:
+            body = {'count': self.count, **body}
+        return Response(body)
+
+
+class StatementPagination(StandardResultsSetPagination):
+    """
+    Keyset pagination for statements on (date, id), oldest first. The cursor
+    also carries the running balance of the last row sent, which becomes the
+    opening balance of the next page.
+    """
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def decode_cursor(self, request):
+        """Return ((date, id), balance) from ``?cursor=``, or None on the first page."""
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            day, pk, balance = base64.urlsafe_b64decode(encoded.encode()).decode().split('|')
+            return (date.fromisoformat(day), int(pk)), Decimal(balance)
+        except (TypeError, ValueError, ArithmeticError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def encode_cursor(row):
+        position = f"{row['date'].isoformat()}|{row['id']}|{row['running_balance']}"
+        return base64.urlsafe_b64encode(position.encode()).decode()
+
+    def paginate_rows(self, queryset, request, opening):
+        """Fetch one page of ``queryset`` and add running balances starting from ``opening``."""
+        self.request = request
+        self.opening = opening
+        page_size = self.get_page_size(request)
+        rows = list(with_running_balance(queryset[:page_size + 1], opening))
+        page = rows[:page_size]
+        self.next_cursor = self.encode_cursor(page[-1]) if len(rows) > page_size else None
+        self.closing = page[-1]['running_balance'] if page else opening
+        return page
+
+    def get_paginated_response(self, data, **extra):
+        url = self.request.build_absolute_uri()
+        next_link = replace_query_param(url, self.cursor_query_param, self.next_cursor) if self.next_cursor else None
+        return Response({
+            **extra,
+            'opening_balance': self.opening,
+            'closing_balance': self.closing,
+            'next': next_link,
+            'results': data,
+        })
+
+
+def parse_query_date(value, name):
+    try:
+        return date.fromisoformat(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a date in YYYY-MM-DD format.")
+
+
+class StableOrderingFilter(filters.OrderingFilter):
+    """OrderingFilter that breaks ties by id, so page boundaries don't move between requests."""
+
+    def get_ordering(self, request, queryset, view):
+        ordering = super().get_ordering(request, queryset, view)
+        if not ordering:
+            return ordering
+        fields = [field.lstrip('-') for field in ordering]
+        if 'id' in fields or 'pk' in fields:
+            return ordering
+        return [*ordering, '-id' if ordering[0].startswith('-') else 'id']
+
 #-----------------------------signup /signin view with google --------
 
 class GoogleLoginView(APIView):
     def post(self, request):
-        # Get token from request
+        # An ID token is verified locally (creditapp/google_auth.py); an access token needs a call to Google
+        id_token = request.data.get("id_token")
         access_token = request.data.get("access_token")
-        if not access_token:
-            return Response({"error": "Access token required"}, status=400)
-        
-        
-        try:
-            # Verify token with Google
-            idinfo = requests.get(
-                "https://www.googleapis.com/oauth2/v2/userinfo",
-                headers={"Authorization": f"Bearer {access_token}"}
-            ).json()  
+        if not id_token and not access_token:
+            return Response({"error": "id_token or access_token required"}, status=400)
 
-            email = idinfo.get('email')
-        
-            # Check if user exists - using only required fields
-            user = None
-            try:
-                # Only fetch fields we need
-                user = User.objects.get(email=email)
-            except User.DoesNotExist:
-                # Create a new user with minimal fields
-                user = User.objects.create_user(
-                    email=email,
-                    first_name=idinfo.get('given_name'),
-                    last_name=idinfo.get('family_name')
-                )
-                user.is_verified = True
-                user.save()
-            
-            # This depends on your auth solution (JWT, token, etc.)
-            token, _ = Token.objects.get_or_create(user=user)
-
-            # Only return necessary fields
-            return Response({
-                "email": user.email,
-                "address": user.address,
-                "category": user.category,  # Return ID instead of full object
-                "first_name": user.first_name,
-                "last_name": user.last_name,
-                "mobile_number": user.mobile_number,
-                'profile_picture': user.profile_picture.url if user.profile_picture else None,
-                'token': token.key
-            })
-        
-        except ValueError:
+        try:
+            idinfo = verify_id_token(id_token) if id_token else fetch_userinfo(access_token)
+        except GoogleTokenError as e:
+            logger.info("Google sign-in rejected: %s", e)
             return Response({'error': 'Invalid token'}, status=status.HTTP_400_BAD_REQUEST)
 
+        email = idinfo['email']
+        user = User.objects.filter(email=email).first()
+        if user is None:
+            user = User.objects.create_user(
+                email=email,
+                first_name=idinfo.get('given_name'),
+                last_name=idinfo.get('family_name'),
+                is_verified=True,
+            )
+
+        token, _ = Token.objects.get_or_create(user=user)
+
+        # Only return necessary fields
+        return Response({
+            "email": user.email,
+            "address": user.address,
+            "category": user.category,  # Return ID instead of full object
+            "first_name": user.first_name,
+            "last_name": user.last_name,
+            "mobile_number": user.mobile_number,
+            'profile_picture': user.profile_picture.url if user.profile_picture else None,
+            'token': token.key
+        })
+
+# ---------------------------- Email OTP ----------------------------
+def _client_ip(request):
+    # REMOTE_ADDR, or X-Forwarded-For behind REST_FRAMEWORK['NUM_PROXIES'] proxies
+    return BaseThrottle().get_ident(request)
+
+
+def _otp_rate_limited(exc):
+    response = Response({"message": "Too many OTP requests. Please try again later."}, status=429)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
 # ---------------------------- Signup View ----------------------------
 # @api_view(['POST'])
 # def SignupView(request):
@@ -102,7 +289,13 @@ def SignupView(request):
     
     data = serializer.validated_data
     email = data.get('email')
-    
+
+    # Rate limits are checked before anything is written
+    try:
+        send_otp_email(email, ip=_client_ip(request))
+    except OTPRateLimited as e:
+        return _otp_rate_limited(e)
+
     # Save user in PendingUser table
     PendingUser.objects.update_or_create(
         email=email,
@@ -114,8 +307,7 @@ def SignupView(request):
             'password': data.get('password', None),  # Consider hashing here
         }
     )
-    
-    send_otp_email(email)
+
     return Response({"message": "OTP sent to your email. Please verify to complete signup."}, status=200)
 
 # ---------------------------- Email OTP Verification View ----------------------------
@@ -129,20 +321,15 @@ def VerifyEmailOTPView(request):
         return Response({"message": "Email and OTP are required"}, status=400)
 
     try:
-        otp_obj = EmailOTP.objects.filter(email=email, otp=otp, is_used=False).latest('created_at')
-        if otp_obj.is_expired():
-            return Response({"message": "OTP expired"}, status=400)
-        if action == "signup":
-            return _process_signup_verification(email)
-        
-        return Response({"message": "otp verified successfully"}, status=200)
+        verified = get_otp_store().verify(email, otp, ip=_client_ip(request))
+    except OTPRateLimited as e:
+        return _otp_rate_limited(e)
+    if not verified:
+        return Response({"message": "Invalid, used or expired OTP"}, status=400)
 
-    except EmailOTP.DoesNotExist:
-        return Response({"message": "Invalid or used OTP"}, status=400)
-    except Exception as e:
-        return Response({"message": "An error occurred " }, status=500)
-    finally:
-        EmailOTP.objects.filter(email=email).delete()
+    if action == "signup":
+        return _process_signup_verification(email)
+    return Response({"message": "otp verified successfully"}, status=200)
 
 @transaction.atomic
 def _process_signup_verification(email):
@@ -186,11 +373,13 @@ def sendEmailOTPView(request):
             if user and user.is_verified:
                 return Response({"message": "Email is already verified."}, status=400)
 
-        send_otp_email(email)
+        send_otp_email(email, ip=_client_ip(request))
         return Response({"message": "OTP resent successfully."}, status=200)
 
     except User.DoesNotExist:
         return Response({"message": "No user with this email found."}, status=404)
+    except OTPRateLimited as e:
+        return _otp_rate_limited(e)
 
 # ---------------------------- Reset Password View ----------------------------
 
@@ -206,28 +395,26 @@ def ResetPasswordView(request):
     if not email:
         return Response({"message": "Authenticated user has no email"}, status=400)
 
+    # Check the new password first so a weak one doesn't use up the OTP
     try:
-        otp_obj = EmailOTP.objects.filter(email=email, otp=otp, is_used=False).latest('created_at')
-        if otp_obj.is_expired():
-            return Response({"message": "OTP has expired"}, status=400)
-
-        # Validate password
         validate_password(password)
-        # Reset password
-        user = User.objects.get(email=email)
-        user.set_password(password)
-        user.save()
-
-        return Response({"message": "Password reset successful."}, status=200)
     except ValidationError as e:
         return Response({"message": str(e)}, status=400)
-    except EmailOTP.DoesNotExist:
-        return Response({"message": "Invalid or used OTP."}, status=400)
-    finally:
-        EmailOTP.objects.filter(email=email).delete() 
-
 
+    try:
+        verified = get_otp_store().verify(email, otp, ip=_client_ip(request))
+    except OTPRateLimited as e:
+        return _otp_rate_limited(e)
+    if not verified:
+        return Response({"message": "Invalid, used or expired OTP."}, status=400)
+
+    user = User.objects.filter(email=email).first()
+    if user is None:
+        return Response({"message": "No user with this email found."}, status=404)
+    user.set_password(password)
+    user.save()
 
+    return Response({"message": "Password reset successful."}, status=200)
 
 
 # ---------------------------- Signin View ----------------------------
@@ -242,26 +429,17 @@ def user_login(request):
         if not password:
             return Response({'message': 'password field required'}, status=status.HTTP_400_BAD_REQUEST)
 
-        user = None
-        # Use select_related for category to avoid additional query
-        if '@' in username:
-            try:
-                user = User.objects.get(email=username)
-            except ObjectDoesNotExist:
-                pass
-
-        if not user:
-            user = authenticate(username=username, password=password)
-            if user:
-                # Fetch the category relationship to avoid an extra query later
-                user = User.objects.get(pk=user.pk)
+        # One query for the user (by email or mobile number) and one password hash
+        user = authenticate(request, username=username, password=password)
 
         if user:
-            # Use delete() with filter for efficiency
-            Token.objects.filter(user=user).delete()
-            
-            token, _ = Token.objects.get_or_create(user=user)
-            
+            if getattr(settings, 'AUTH_TOKEN_ROTATE_ON_LOGIN', False):
+                Token.objects.filter(user=user).delete()
+                token = Token.objects.create(user=user)
+            else:
+                # Keep the current token so the user's other devices stay logged in
+                token, _ = Token.objects.get_or_create(user=user)
+
             # Only return necessary data
             data = {
                 "email": user.email,
@@ -301,10 +479,15 @@ class UserEditAPIView(UpdateAPIView):
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
+    etag = ledger_etag(request, 'get_user_profile')
+    if etag_matches(request, etag):
+        return not_modified(etag)
+
     user = request.user
-    token = Token.objects.get(user=user).key  # Get the token
+    # The token the request authenticated with, no need to look it up again
+    token = request.auth.key if request.auth else Token.objects.get(user=user).key
 
-    return Response({
+    return add_validators(Response({
         "email": user.email,
         "address": user.address,
         "category": user.category,  # Return ID instead of object
@@ -313,7 +496,7 @@ def get_user_profile(request):
         "mobile_number": user.mobile_number,
         'profile_picture': user.profile_picture.url if user.profile_picture else None,
         'token': token
-    })
+    }), etag)
 
 
 # ---------------------------- Logout View ----------------------------
@@ -322,7 +505,7 @@ def get_user_profile(request):
 def user_logout(request):
     if request.method == 'POST':
         try:
-            # Delete the user's token to logout - no need to retrieve it first
+            # Delete the user's token to logout; its cached entry goes with it
             Token.objects.filter(user=request.user).delete()
             return Response({'message': 'Successfully logged out.'}, status=status.HTTP_200_OK)
         except Exception as e:
@@ -330,30 +513,20 @@ def user_logout(request):
 
 
 # ---------------------------- User Transaction Summary View ----------------------------
-class UserTransactionSummaryView(generics.GenericAPIView):
+class UserTransactionSummaryView(ConditionalGetMixin, ReplicaReadMixin, generics.GenericAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = UserTransactionSummarySerializer
 
     def get(self, request, *args, **kwargs):
-        user = request.user
-
-        # Get total customers for the user
-        total_customers = Customer.objects.filter(user=user).count()
-
-        # Get total transaction counts and amounts for credits and debits
-        transaction_summary = Transaction.objects.filter(customer__user=user).aggregate(
-            total_credit_transactions=Count('id', filter=Q(transaction_type='credit')),
-            total_debit_transactions=Count('id', filter=Q(transaction_type='debit')),
-            total_credit_amount=Sum('amount', filter=Q(transaction_type='credit')),
-            total_debit_amount=Sum('amount', filter=Q(transaction_type='debit')),
-        )
+        # Totals are maintained incrementally by the write path, so this is a single-row read
+        summary = UserLedgerSummary.for_user(request.user)
 
         data = {
-            "total_customers": total_customers,
-            "total_credit_transactions": transaction_summary['total_credit_transactions'],
-            "total_debit_transactions": transaction_summary['total_debit_transactions'],
-            "total_credit_amount": transaction_summary['total_credit_amount'] or 0,
-            "total_debit_amount": transaction_summary['total_debit_amount'] or 0,
+            "total_customers": summary.total_customers,
+            "total_credit_transactions": summary.total_credit_transactions,
+            "total_debit_transactions": summary.total_debit_transactions,
+            "total_credit_amount": summary.total_credit_amount,
+            "total_debit_amount": summary.total_debit_amount,
         }
 
         return Response(data)
@@ -364,21 +537,50 @@ class UserTransactionSummaryView(generics.GenericAPIView):
 
 
 # ---------------------------- Customer Views ----------------------------
-class CustomerListCreateView(generics.ListCreateAPIView):
+class CustomerListCreateView(ConditionalGetMixin, ReplicaReadMixin, generics.ListCreateAPIView):
     """
     API endpoint to list all customers or create a new customer.
     """
     permission_classes = [IsAuthenticated]
     serializer_class = CustomerSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
+    filter_backends = [StableOrderingFilter]
+    # Stored aggregates, each with a (user, field) index
+    ordering_fields = [
+        'created_at', 'name', 'account_balance', 'credit_total', 'debit_total', 'last_activity', 'overdue_reminder_count',
+    ]
+    ordering = ['-created_at']
 
     def get_queryset(self):
         """
-        Only return customers belonging to the authenticated user.
+        Only return customers belonging to the authenticated user, filtered by
+        ?active_since= / ?inactive_since= (last transaction date),
+        ?min_credit_total=, ?min_debit_total= and ?has_overdue=true|false.
         """
+        params = self.request.query_params
+        filters = Q(user=self.request.user)
+        try:
+            if params.get('active_since'):
+                filters &= Q(last_activity__gte=parse_query_date(params['active_since'], 'active_since'))
+            if params.get('inactive_since'):
+                # Nothing on or after the date, including customers without any transaction
+                inactive_since = parse_query_date(params['inactive_since'], 'inactive_since')
+                filters &= Q(last_activity__lt=inactive_since) | Q(last_activity__isnull=True)
+            for field in ('credit_total', 'debit_total'):
+                if params.get(f'min_{field}'):
+                    filters &= Q(**{f'{field}__gte': Decimal(params[f'min_{field}'])})
+        except ArithmeticError:
+            raise ParseError("Amounts must be numbers.")
+        except ValueError as e:
+            raise ParseError(str(e))
+        has_overdue = params.get('has_overdue', '').lower()
+        if has_overdue in ('true', 'false'):
+            filters &= Q(overdue_reminder_count__gt=0) if has_overdue == 'true' else Q(overdue_reminder_count=0)
+
         # Use only() to select specific fields
-        return Customer.objects.filter(user=self.request.user).only(
-            'id', 'name', 'contact_number', 'email', 'address', 'account_balance', 
+        return Customer.objects.filter(filters).only(
+            'id', 'name', 'contact_number', 'email', 'address', 'account_balance',
+            'credit_total', 'debit_total', 'last_activity', 'overdue_reminder_count',
             'created_at', 'updated_at'
         ).order_by('-created_at')  # Order by creation date
     
@@ -410,6 +612,9 @@ class CustomerDetailView(generics.RetrieveUpdateDestroyAPIView):
         """
         return Customer.objects.filter(user=self.request.user)
 
+    def perform_destroy(self, instance):
+        delete_customers(Customer.objects.filter(pk=instance.pk))
+
 # ---------------------------- Delete Customer Views ----------------------------
 class DeleteCustomerView(generics.DestroyAPIView):
     """
@@ -428,18 +633,113 @@ class DeleteCustomerView(generics.DestroyAPIView):
             customer = get_object_or_404(Customer, id=customer_id, user=self.request.user)
             # Store name before deletion for message
             customer_name = customer.name
-            self.perform_destroy(customer)
-            return Response({"message": f"Customer '{customer_name}' deleted successfully!"}, status=status.HTTP_200_OK)
+            deleted = delete_customers(Customer.objects.filter(pk=customer.pk))
+            return Response({
+                "message": f"Customer '{customer_name}' deleted successfully!",
+                "deleted": deleted,
+            }, status=status.HTTP_200_OK)
         except Http404:
             return Response({"message": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
         except Exception as e:
             return Response({"message": "An error occurred while deleting the customer."}, status=status.HTTP_400_BAD_REQUEST)
 
+# ---------------------------- Customer Balance View ----------------------------
+class CustomerBalanceView(ReplicaReadMixin, APIView):
+    """
+    Historical balance of a customer.
+
+    ``?as_of=YYYY-MM-DD`` (default today) returns the cumulative totals up to
+    that date; ``?start=...&end=...`` returns statement totals for the range.
+    Both read the nearest month-end checkpoint and sum only the rows after it.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        if not Customer.objects.filter(pk=pk, user=request.user).exists():
+            return Response({"message": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        try:
+            if 'start' in params or 'end' in params:
+                start = parse_query_date(params.get('start'), 'start')
+                end = parse_query_date(params.get('end'), 'end')
+                if start > end:
+                    raise ValueError("'start' must not be after 'end'.")
+                return Response({"customer_id": pk, **statement_totals(pk, start, end)})
+
+            as_of = parse_query_date(params['as_of'], 'as_of') if 'as_of' in params else timezone.localdate()
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        totals = totals_as_of(pk, as_of)
+        return Response({
+            "customer_id": pk,
+            "as_of": as_of,
+            "total_credit": totals['credit'],
+            "total_debit": totals['debit'],
+            "balance": totals['balance'],
+            "transaction_count": totals['transactions'],
+        })
+
+# ---------------------------- Customer Statement View ----------------------------
+class CustomerStatementView(ReplicaReadMixin, generics.GenericAPIView):
+    """
+    A customer's transactions oldest first, each with its running balance
+    computed by the database. Optional ``?start=`` / ``?end=`` limit the
+    period (the balance before ``start`` is carried in). Pages follow
+    ``next`` (keyset cursor); ``?file_format=csv|ndjson|xlsx`` streams the
+    whole statement as a download instead.
+    """
+    permission_classes = [IsAuthenticated]
+    serializer_class = StatementRowSerializer
+    pagination_class = StatementPagination
+    export_header = STATEMENT_FIELDS + ['running_balance']
+
+    def get(self, request, pk, *args, **kwargs):
+        if not Customer.objects.filter(pk=pk, user=request.user).exists():
+            return Response({"message": "Customer not found."}, status=status.HTTP_404_NOT_FOUND)
+
+        params = request.query_params
+        try:
+            start = parse_query_date(params['start'], 'start') if params.get('start') else None
+            end = parse_query_date(params['end'], 'end') if params.get('end') else None
+        except ValueError as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        if start and end and start > end:
+            return Response({"message": "'start' must not be after 'end'."}, status=status.HTTP_400_BAD_REQUEST)
+
+        if 'file_format' in params:
+            return self.export(pk, start, end, params['file_format'].lower())
+
+        position = self.paginator.decode_cursor(request)
+        if position is None:
+            after, opening = None, opening_balance(pk, start)
+        else:
+            after, opening = position
+
+        page = self.paginator.paginate_rows(statement_queryset(pk, start, end, after), request, opening)
+        serializer = self.get_serializer(page, many=True)
+        return self.paginator.get_paginated_response(serializer.data, customer_id=pk, start=start, end=end)
+
+    def export(self, pk, start, end, file_format):
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"message": f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        rows = with_running_balance(
+            statement_queryset(pk, start, end).iterator(chunk_size=EXPORT_CHUNK_SIZE),
+            opening_balance(pk, start),
+        )
+        values = ([row[field] for field in self.export_header] for row in rows)
+        return streaming_export(self.export_header, values, file_format, filename=f'statement-{pk}')
+
 # ---------------------------- Customer Transaction Views ----------------------------
-class CustomerTransactionsView(generics.ListAPIView):
+class CustomerTransactionsView(ConditionalGetMixin, ReplicaReadMixin, generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = TransactionSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
 
     def get_queryset(self):
         """
@@ -457,7 +757,8 @@ class CustomerTransactionsView(generics.ListAPIView):
         # Only select fields that are needed in the serializer response
         return Transaction.objects.filter(customer=customer).only(
             'id', 'customer_id', 'amount', 'transaction_type', 'payment_mode', 
-            'date', 'description', 'created_at'
+            'date', 'description', 'bill_image', 'bill_image_variants', 'created_at',
+            'customer__name', 'customer__account_balance'
         ).select_related('customer').order_by('-created_at')  # Optimize related customer lookups
 
     def list(self, request, *args, **kwargs):
@@ -477,14 +778,14 @@ class CustomerTransactionsView(generics.ListAPIView):
             return Response({"message": str(e)}, status=status.HTTP_404_NOT_FOUND)
 
 # ---------------------------- Transaction Views ----------------------------
-class TransactionListCreateView(generics.ListCreateAPIView):
+class TransactionListCreateView(ConditionalGetMixin, ReplicaReadMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = TransactionSerializer
-    filter_backends = [filters.OrderingFilter, filters.SearchFilter]
+    filter_backends = [StableOrderingFilter, LedgerSearchFilter]
     ordering_fields = ['date', 'amount']
     ordering = ['-created_at']
     search_fields = ['customer__name', 'description']
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
 
     def get_queryset(self):
         """
@@ -508,10 +809,6 @@ class TransactionListCreateView(generics.ListCreateAPIView):
         # Build filters incrementally to prevent unnecessary query complexity
         filters = Q()
 
-        # Filter by customer name (case-insensitive)
-        if customer_name:
-            filters &= Q(customer__name__icontains=customer_name)
-
         # Filter by customer ID
         if customer_id:
             filters &= Q(customer__id=customer_id)
@@ -536,18 +833,23 @@ class TransactionListCreateView(generics.ListCreateAPIView):
         if amount:
             filters &= Q(amount=amount)
 
-        # Filter by description keyword
-        if description_keyword:
-            filters &= Q(description__icontains=description_keyword)
-
         # Apply all filters at once
         if filters:
             queryset = queryset.filter(filters)
 
+        # Text filters go through the search backend so they can use its index
+        if customer_name:
+            queryset = search_transactions(queryset, customer_name, fields=('customer_name',), user_id=user.pk, rank=False)
+        if description_keyword:
+            queryset = search_transactions(queryset, description_keyword, fields=('description',), user_id=user.pk, rank=False)
+
         # Select only needed fields for optimization
+        # Everything TransactionSerializer reads, including customer_details,
+        # so no row falls back to a deferred-field query
         return queryset.select_related('customer').only(
             'id', 'customer_id', 'amount', 'transaction_type', 'payment_mode',
-            'date', 'description', 'created_at', 'customer__name'
+            'date', 'description', 'bill_image', 'bill_image_variants', 'created_at',
+            'customer__name', 'customer__account_balance'
         )
 
     def paginate_queryset(self, queryset):
@@ -571,6 +873,57 @@ class TransactionListCreateView(generics.ListCreateAPIView):
     def perform_create(self, serializer):
         serializer.save()
 
+# ---------------------------- Transaction Export View ----------------------------
+class TransactionExportView(TransactionListCreateView):
+    """
+    Stream the user's transactions as CSV, NDJSON or XLSX (?file_format=).
+    Takes the same filters, search and ordering as the transaction list; rows
+    are read with a server-side cursor and written as they arrive.
+    """
+    http_method_names = ['get', 'head', 'options']
+    pagination_class = None
+    export_fields = [
+        'id', 'customer_id', 'customer__name', 'amount', 'transaction_type',
+        'payment_mode', 'date', 'description', 'created_at'
+    ]
+    export_header = [
+        'id', 'customer_id', 'customer_name', 'amount', 'transaction_type',
+        'payment_mode', 'date', 'description', 'created_at'
+    ]
+
+    def list(self, request, *args, **kwargs):
+        file_format = request.query_params.get('file_format', 'csv').lower()
+        if file_format not in EXPORT_FORMATS:
+            return Response(
+                {"message": f"file_format must be one of: {', '.join(EXPORT_FORMATS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        queryset = self.filter_queryset(self.get_queryset())
+        rows = queryset.values_list(*self.export_fields).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        return streaming_export(self.export_header, rows, file_format, filename='transactions')
+
+# ---------------------------- Transaction Bulk Import View ----------------------------
+class TransactionBulkImportView(APIView):
+    """
+    Import many transactions in one request. Accepts a JSON array (or
+    {"transactions": [...]}), a CSV body with a header row, or NDJSON.
+    Valid rows are inserted in batches; invalid rows are reported per row.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            result = import_transactions(request.user, iter_import_rows(request))
+        except ImportTooLarge as e:
+            return Response({"message": str(e)}, status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+        except InvalidImport as e:
+            return Response({"message": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        if result["created"] or not result["failed"]:
+            return Response(result, status=status.HTTP_201_CREATED)
+        return Response(result, status=status.HTTP_400_BAD_REQUEST)
+
 # ---------------------------- Transaction Views ----------------------------
 class TransactionDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
@@ -602,10 +955,10 @@ class TransactionDeleteView(generics.DestroyAPIView):
         return Response({"message": "Transaction deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
 
 # ---------------------------- Payment Reminder Views ----------------------------
-class PaymentReminderListCreateView(generics.ListCreateAPIView):
+class PaymentReminderListCreateView(ReplicaReadMixin, generics.ListCreateAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentReminderSerializer
-    pagination_class = StandardResultsSetPagination
+    pagination_class = KeysetResultsSetPagination
 
     def get_queryset(self):
         """
@@ -622,12 +975,16 @@ class PaymentReminderListCreateView(generics.ListCreateAPIView):
         queryset = queryset.only(
             'id', 'customer_id', 'transaction_id', 'amount_due', 
             'reminder_date', 'status', 'created_at',
-            'customer__name', 'transaction__amount', 'transaction__date',
-            'transaction__transaction_type'
+            'customer__name', 'customer__account_balance',
+            'transaction__amount', 'transaction__date', 'transaction__transaction_type'
         )
 
         payment_status = self.request.query_params.get('payment_status')
-        today = date.today()
+        today = timezone.localdate()
+
+        # Stored buckets are exact once today's sweep has run
+        if payment_status in ("overdue", "upcoming", "due_today") and buckets_are_current(today):
+            return queryset.filter(status="pending", bucket=payment_status)
 
         # Apply filters as needed
         if payment_status == "overdue":
@@ -647,6 +1004,15 @@ class PaymentReminderListCreateView(generics.ListCreateAPIView):
         """
         serializer.save()
 
+class PaymentReminderCountsView(ReplicaReadMixin, APIView):
+    """
+    Badge counts of pending reminders per bucket (overdue, due_today, upcoming).
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, *args, **kwargs):
+        return Response(reminder_counts(request.user))
+
 class PaymentReminderDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticated]
     serializer_class = PaymentReminderSerializer
@@ -658,4 +1024,30 @@ class PaymentReminderDetailView(generics.RetrieveUpdateDestroyAPIView):
         return PaymentReminder.objects.filter(
             Q(customer__user=self.request.user) | 
             Q(transaction__customer__user=self.request.user)
-        ).select_related('customer', 'transaction')
\ No newline at end of file
+        ).select_related('customer', 'transaction')
+
+# ---------------------------- Metrics View ----------------------------
+class MetricsPermission(BasePermission):
+    """Prometheus authenticates with ``Authorization: Bearer <METRICS_TOKEN>``; staff users may also look."""
+
+    def has_permission(self, request, view):
+        expected = getattr(settings, 'METRICS_TOKEN', '')
+        header = request.META.get('HTTP_AUTHORIZATION', '')
+        if expected and header.startswith('Bearer ') and constant_time_compare(header[len('Bearer '):], expected):
+            return True
+        return bool(request.user and request.user.is_staff)
+
+class MetricsView(APIView):
+    """
+    Per-view request metrics of this process in the Prometheus text format,
+    plus the token cache hit/miss counters.
+    """
+    permission_classes = [MetricsPermission]
+
+    def get(self, request, *args, **kwargs):
+        token_cache = token_cache_stats.snapshot()
+        body = metrics_registry.render(extra=[
+            ('creditapp_token_cache_hits_total', 'Token lookups served from the cache.', 'counter', token_cache['hits']),
+            ('creditapp_token_cache_misses_total', 'Token lookups that hit the database.', 'counter', token_cache['misses']),
+        ])
+        return HttpResponse(body, content_type='text/plain; version=0.0.4; charset=utf-8')